@@ -5,3 +5,6 @@ class AiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ai'
 
+    def ready(self):
+        from . import signals  # noqa: F401
+
@@ -0,0 +1,83 @@
+"""
+Per-provider circuit breakers for AI calls
+
+After AI_BREAKER_FAILURES consecutive failures (errors or timeouts) a
+provider's breaker opens and AIService skips the provider, so a degraded
+vendor does not add its timeout to every request. After AI_BREAKER_RESET
+seconds one trial call is let through (half-open): success closes the
+breaker, failure opens it again.
+
+Breakers are per process and shared by all AIService instances.
+"""
+import threading
+import time
+from decouple import config
+
+DEFAULT_FAILURE_THRESHOLD = 3
+DEFAULT_RESET_TIMEOUT = 30.0
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker for one provider"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, failure_threshold=DEFAULT_FAILURE_THRESHOLD, reset_timeout=DEFAULT_RESET_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a call may be made now (claims the trial call when half-open)"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    print(f"AI provider {self.name} circuit opened after {self.failures} failures")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def release(self):
+        """Give back a claimed trial call whose outcome is unknown (e.g. it was cancelled)"""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.OPEN
+
+
+def get_circuit_breaker(provider: str) -> CircuitBreaker:
+    """Process-wide breaker of a provider, created on first use"""
+    breaker = _breakers.get(provider)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(provider)
+            if breaker is None:
+                breaker = CircuitBreaker(
+                    provider,
+                    failure_threshold=config('AI_BREAKER_FAILURES', default=DEFAULT_FAILURE_THRESHOLD, cast=int),
+                    reset_timeout=config('AI_BREAKER_RESET', default=DEFAULT_RESET_TIMEOUT, cast=float),
+                )
+                _breakers[provider] = breaker
+    return breaker
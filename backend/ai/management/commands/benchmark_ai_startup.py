@@ -0,0 +1,79 @@
+"""
+Management command to benchmark AI service startup
+Measures, in fresh interpreters, the cost of loading the AI app and of its
+first provider use (when the provider SDKs are imported)
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+SDK_MODULES = ('openai', 'anthropic', 'google.generativeai')
+
+# Runs in a fresh interpreter: Django setup, loading the AI views, then the step
+SCRIPT = '''
+import json, sys, time
+start = time.perf_counter()
+import django
+django.setup()
+import ai.views
+from ai.services import ai_service
+loaded = time.perf_counter()
+{step}
+done = time.perf_counter()
+print(json.dumps({{
+    'load': loaded - start,
+    'step': done - loaded,
+    'sdks': [name for name in {sdks!r} if name in sys.modules],
+}}))
+'''
+
+STEPS = (
+    ('startup (no provider use)', 'pass', False),
+    ('first provider use', 'ai_service.providers', True),
+)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark AI service startup (cold import and first provider use, in fresh processes)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=5,
+            help='Fresh processes per measurement (default: 5)',
+        )
+
+    def handle(self, *args, **options):
+        iterations = max(1, options['iterations'])
+        self.stdout.write(f'Benchmarking AI startup, {iterations} processes per step (median)')
+
+        for label, step, with_keys in STEPS:
+            env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'food_diary.settings'))
+            if with_keys:
+                # Placeholder keys make every installed SDK load; no request is sent
+                for name in ('OPENAI_API_KEY', 'GEMINI_API_KEY', 'ANTHROPIC_API_KEY'):
+                    env.setdefault(name, 'benchmark')
+            runs = [self.run_step(step, env) for _ in range(iterations)]
+            load = statistics.median(run['load'] for run in runs)
+            step_time = statistics.median(run['step'] for run in runs)
+            sdks = ', '.join(runs[-1]['sdks']) or 'none'
+            self.stdout.write(
+                f'  {label:<26} load {load * 1000:7.1f} ms, step {step_time * 1000:7.1f} ms, SDKs imported: {sdks}'
+            )
+
+    def run_step(self, step, env):
+        script = SCRIPT.format(step=step, sdks=SDK_MODULES)
+        result = subprocess.run(
+            [sys.executable, '-c', script],
+            cwd=settings.BASE_DIR,
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        return json.loads(result.stdout.strip().splitlines()[-1])
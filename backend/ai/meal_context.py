@@ -0,0 +1,122 @@
+"""
+Compact meal history for AI prompts
+
+Instead of one JSON object per logged meal, the behavior analysis prompt
+gets per-day totals and the user's top foods as dense pipe-separated
+tables. The rows come from one grouped query over the meals of the period
+(plus one lookup of recipe nutrition when recipe meals are present), and
+the encoded text is capped by a token budget. The prompt size, and with it
+the LLM latency, therefore stays flat however many meals the user logs.
+"""
+from collections import defaultdict
+from django.db.models import Count, F, FloatField, Sum
+from django.db.models.functions import Coalesce
+from api.export import recipe_per_serving
+from api.models import Meal
+
+DEFAULT_TOKEN_BUDGET = 400
+
+# Foods listed at most, before the token budget applies
+MAX_TOP_FOODS = 15
+
+MEAL_TYPE_CODES = {'breakfast': 'З', 'lunch': 'О', 'dinner': 'У', 'snack': 'П'}
+
+NUTRIENTS = ('calories', 'protein', 'carbs', 'fat')
+
+
+def build_meal_context(user, start_date, end_date) -> dict:
+    """
+    Per-day totals and top foods of a user's meals between two dates
+
+    Returns {'days': [...], 'top_foods': [...]}: days in date order with
+    date, calories, protein, carbs, fat, meals (count) and meal_types;
+    foods by calories, with name, count, calories and protein.
+    """
+    meals = Meal.objects.filter(user=user, date__gte=start_date, date__lte=end_date)
+    rows = meals.order_by().values(
+        'date', 'meal_type', 'food_id', 'recipe_id', name=Coalesce('food__name', 'recipe__name'),
+    ).annotate(
+        count=Count('id'),
+        quantity_sum=Sum('quantity'),
+        calories=Sum(F('food__calories') * F('quantity') / 100, output_field=FloatField()),
+        protein=Sum(F('food__protein') * F('quantity') / 100, output_field=FloatField()),
+        carbs=Sum(F('food__carbs') * F('quantity') / 100, output_field=FloatField()),
+        fat=Sum(F('food__fat') * F('quantity') / 100, output_field=FloatField()),
+    )
+
+    per_serving = None
+    days = defaultdict(lambda: {'calories': 0.0, 'protein': 0.0, 'carbs': 0.0, 'fat': 0.0, 'meals': 0, 'meal_types': set()})
+    foods = defaultdict(lambda: {'count': 0, 'calories': 0.0, 'protein': 0.0})
+    for row in rows:
+        if row['recipe_id']:
+            if per_serving is None:
+                per_serving = recipe_per_serving(meals)
+            # Recipe meal quantities are servings
+            recipe_nutrients = per_serving.get(row['recipe_id'], (0.0, 0.0, 0.0, 0.0))
+            nutrients = {key: value * row['quantity_sum'] for key, value in zip(NUTRIENTS, recipe_nutrients)}
+        else:
+            nutrients = {key: row[key] or 0.0 for key in NUTRIENTS}
+
+        day = days[row['date']]
+        for key in NUTRIENTS:
+            day[key] += nutrients[key]
+        day['meals'] += row['count']
+        day['meal_types'].add(row['meal_type'])
+
+        food = foods[row['name'] or 'Unknown']
+        food['count'] += row['count']
+        food['calories'] += nutrients['calories']
+        food['protein'] += nutrients['protein']
+
+    top_foods = sorted(foods.items(), key=lambda item: (-item[1]['calories'], item[0]))[:MAX_TOP_FOODS]
+    return {
+        'days': [
+            {'date': str(day_date), **{key: round(day[key], 1) for key in NUTRIENTS},
+             'meals': day['meals'], 'meal_types': sorted(day['meal_types'])}
+            for day_date, day in sorted(days.items())
+        ],
+        'top_foods': [
+            {'name': name, 'count': food['count'],
+             'calories': round(food['calories'], 1), 'protein': round(food['protein'], 1)}
+            for name, food in top_foods
+        ],
+    }
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about three characters per token for mixed Cyrillic text and numbers)"""
+    return len(text) // 3 + 1
+
+
+def encode_meal_context(context: dict, token_budget: int = DEFAULT_TOKEN_BUDGET) -> str:
+    """
+    Dense text tables of a meal context, within token_budget
+
+    Day rows take priority over food rows; when even they do not fit, the
+    oldest days are dropped.
+    """
+    days_header = 'ДНИ (дата|ккал|белки г|углеводы г|жиры г|приемы пищи: З=завтрак О=обед У=ужин П=перекус)'
+    foods_header = 'ЧАСТЫЕ ПРОДУКТЫ (название|раз|ккал всего|белки г всего)'
+
+    day_lines = [
+        f"{day['date']}|{day['calories']:.0f}|{day['protein']:.0f}|{day['carbs']:.0f}|{day['fat']:.0f}|"
+        + ''.join(MEAL_TYPE_CODES.get(meal_type, '?') for meal_type in day['meal_types'])
+        for day in context['days']
+    ]
+    food_lines = [
+        f"{food['name'][:40].replace('|', '/')}|{food['count']}|{food['calories']:.0f}|{food['protein']:.0f}"
+        for food in context['top_foods']
+    ]
+
+    lines = [days_header] + day_lines
+    while len(lines) > 2 and estimate_tokens('\n'.join(lines)) > token_budget:
+        del lines[1]
+    if food_lines:
+        lines.append(foods_header)
+        for line in food_lines:
+            if estimate_tokens('\n'.join(lines + [line])) > token_budget:
+                break
+            lines.append(line)
+        if lines[-1] == foods_header:
+            lines.pop()
+    return '\n'.join(lines)
@@ -0,0 +1,86 @@
+"""
+Cache of AI responses for prompts fully determined by user data
+
+analyze_behavior and generate_meal_plan build their prompts from the
+user's goals, recent meals and the food list only, so an identical request
+would bill the provider again for the same answer. Their AI results are
+stored in the shared response store of api.usda_cache (namespace 'ai', same
+backend as the USDA cache), keyed by a hash of the canonical JSON of the
+prompt inputs, and expire after settings.AI_CACHE_TTL seconds.
+
+Keys are prefixed with the user id and the user's cache generation; when
+the user's meals or nutrition goals change (see ai/signals.py) a new
+generation is stored, so the old entries are never read again and simply
+expire. Since the inputs are part of the key, a change made without
+signals (e.g. QuerySet.update()) still misses the old entry. Cache errors
+are logged and treated as misses.
+"""
+import hashlib
+import json
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from api.usda_cache import cache_get as store_get, cache_set as store_set, get_usda_cache
+
+NAMESPACE = 'ai'
+
+DEFAULT_TTL = 12 * 3600
+
+
+def make_key(kind: str, *inputs) -> str:
+    """Key of a response: kind plus the SHA-256 of the canonical JSON of the prompt inputs"""
+    canonical = json.dumps(inputs, sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str)
+    return f"{kind}:{hashlib.sha256(canonical.encode('utf-8')).hexdigest()}"
+
+
+def _ttl():
+    return getattr(settings, 'AI_CACHE_TTL', DEFAULT_TTL)
+
+
+def _enabled():
+    """Whether caching is on; creates the namespace store with the AI TTL on first use"""
+    if not _ttl():
+        return False
+    get_usda_cache(NAMESPACE, ttl=_ttl(), stale_ttl=0)
+    return True
+
+
+def _user_key(user_id, key):
+    # A missing generation reads as 0: it can only have expired after every
+    # entry stored before the invalidation that created it
+    generation, fresh = store_get(f'generation:{user_id}', NAMESPACE)
+    return f"{user_id}:{generation if fresh else 0}:{key}"
+
+
+def cache_get(user_id, key):
+    """Cached response of a user for key, or None"""
+    if not _enabled():
+        return None
+    value, fresh = store_get(_user_key(user_id, key), NAMESPACE)
+    return value if fresh else None
+
+
+def cache_set(user_id, key, value):
+    if _enabled():
+        store_set(_user_key(user_id, key), value, NAMESPACE)
+
+
+async def acache_get(user_id, key):
+    """cache_get for async code, off the event loop"""
+    return await sync_to_async(cache_get, thread_sensitive=False)(user_id, key)
+
+
+async def acache_set(user_id, key, value):
+    """cache_set for async code, off the event loop"""
+    await sync_to_async(cache_set, thread_sensitive=False)(user_id, key, value)
+
+
+def invalidate_user(user_id):
+    """Drop all cached responses of a user (by starting a new key generation)"""
+    if _enabled():
+        store_set(f'generation:{user_id}', time.time_ns(), NAMESPACE)
+
+
+def clear():
+    if _enabled():
+        get_usda_cache(NAMESPACE).clear()
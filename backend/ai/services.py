@@ -1,177 +1,440 @@
 """
 AI services for food diary analysis and recommendations
-Multi-provider support with automatic fallback
+Multi-provider support with hedged requests and automatic fallback
+
+Provider calls are async (the SDKs' async clients), so the async AI views
+wait on the network without holding a worker thread.
 """
 import os
 import json
 import re
+import threading
+import weakref
+import asyncio
+from functools import lru_cache
 from typing import Dict, List, Optional, Tuple
+from asgiref.sync import sync_to_async
 from decouple import config
+from . import response_cache
+from .meal_context import DEFAULT_TOKEN_BUDGET, encode_meal_context
+from .circuit_breaker import get_circuit_breaker
 
-# Try to import AI providers
-OPENAI_AVAILABLE = False
-GEMINI_AVAILABLE = False
-ANTHROPIC_AVAILABLE = False
+# The provider SDKs (openai, google.generativeai, anthropic) take about a
+# second to import, so they are imported when the providers are first used
+# (AIService.providers), not when this module is loaded: manage.py commands
+# and processes that never call a provider do not pay for them. Async code
+# goes through AIService.aproviders(), which does that first import in a
+# worker thread instead of on the event loop.
 
-try:
-    from openai import OpenAI
-    OPENAI_AVAILABLE = True
-except ImportError:
-    pass
+# Gemini models to try, in order (GEMINI_MODEL overrides)
+GEMINI_MODEL_NAMES = [
+    'models/gemini-2.5-flash',  # Быстрая и бесплатная
+    'models/gemini-flash-latest',  # Последняя версия flash
+    'models/gemini-pro-latest',  # Последняя версия pro
+    'models/gemini-2.0-flash',  # Альтернатива
+]
 
-try:
-    import google.generativeai as genai
-    GEMINI_AVAILABLE = True
-except ImportError:
-    pass
 
-try:
-    import anthropic
-    ANTHROPIC_AVAILABLE = True
-except ImportError:
-    pass
+@lru_cache(maxsize=None)
+def gemini_model_name() -> Optional[str]:
+    """First usable Gemini model name, probed once per process"""
+    import google.generativeai as genai
+    
+    configured = config('GEMINI_MODEL', default=None)
+    for model_name in ([configured] if configured else GEMINI_MODEL_NAMES):
+        try:
+            genai.GenerativeModel(model_name)
+            print(f"Gemini initialized with model: {model_name}")
+            return model_name
+        except Exception:
+            continue
+    return None
 
 
 class AIService:
     """Service for AI-powered food analysis with multi-provider support"""
     
-    def __init__(self):
-        # Initialize OpenAI
-        self.openai_client = None
-        openai_key = config('OPENAI_API_KEY', default=None)
-        if OPENAI_AVAILABLE and openai_key:
+    def __init__(self, stream_providers: Dict = None):
+        # Async SDK clients per event loop, see _async_clients()
+        self._loop_clients = weakref.WeakKeyDictionary()
+        self._providers = None
+        self._providers_lock = threading.Lock()
+        
+        self.openai_key = config('OPENAI_API_KEY', default=None)
+        self.gemini_key = config('GEMINI_API_KEY', default=None)
+        self.anthropic_key = config('ANTHROPIC_API_KEY', default=None)
+        self.gemini_model_name = None
+        
+        # Hedged requests: seconds to wait for a provider before also starting the next
+        self.hedging = config('AI_HEDGING', default=True, cast=bool)
+        self.hedge_delay = config('AI_HEDGE_DELAY', default=2.5, cast=float)
+        self.provider_timeout = config('AI_PROVIDER_TIMEOUT', default=10.0, cast=float)
+        
+        # Approximate tokens of meal history in the behavior analysis prompt
+        self.meal_context_budget = config('AI_MEAL_CONTEXT_TOKENS', default=DEFAULT_TOKEN_BUDGET, cast=int)
+        
+        # Extra streaming providers by name, tried by stream_chat before the SDK
+        # ones (e.g. a fake provider in tests): callables (prompt, system_message)
+        # returning an async iterator of text chunks
+        self.stream_providers = dict(stream_providers or {})
+    
+    @property
+    def providers(self) -> List[str]:
+        """Providers with an API key and an installed SDK, in priority order (imports the SDKs on first access)"""
+        if self._providers is None:
+            with self._providers_lock:
+                if self._providers is None:
+                    self._providers = self._init_providers()
+        return self._providers
+    
+    @providers.setter
+    def providers(self, providers: List[str]):
+        self._providers = providers
+    
+    async def aproviders(self) -> List[str]:
+        """providers for async code: the first access runs in a worker thread"""
+        if self._providers is None:
+            await sync_to_async(lambda: self.providers, thread_sensitive=False)()
+        return self._providers
+    
+    def _init_providers(self) -> List[str]:
+        # Provider priority order (most stable first)
+        providers = []
+        
+        # Anthropic Claude
+        if self.anthropic_key:
             try:
-                self.openai_client = OpenAI(api_key=openai_key)
-            except:
+                import anthropic  # noqa: F401
+                providers.append('anthropic')
+            except ImportError:
                 pass
         
-        # Initialize Gemini
-        self.gemini_client = None
-        self.gemini_model_name = None
-        gemini_key = config('GEMINI_API_KEY', default=None)
-        if GEMINI_AVAILABLE and gemini_key:
+        # Gemini
+        if self.gemini_key:
             try:
-                genai.configure(api_key=gemini_key)
-                # Используем актуальные модели (с префиксом models/)
-                model_names = [
-                    'models/gemini-2.5-flash',  # Быстрая и бесплатная
-                    'models/gemini-flash-latest',  # Последняя версия flash
-                    'models/gemini-pro-latest',  # Последняя версия pro
-                    'models/gemini-2.0-flash',  # Альтернатива
-                ]
-                for model_name in model_names:
-                    try:
-                        self.gemini_client = genai.GenerativeModel(model_name)
-                        self.gemini_model_name = model_name
-                        print(f"Gemini initialized with model: {model_name}")
-                        break
-                    except Exception as e:
-                        continue
+                import google.generativeai as genai
+                genai.configure(api_key=self.gemini_key)
+                self.gemini_model_name = gemini_model_name()
+                if self.gemini_model_name:
+                    providers.append('gemini')
+            except ImportError:
+                pass
             except Exception as e:
                 print(f"Gemini initialization error: {e}")
-                pass
         
-        # Initialize Anthropic Claude
-        self.anthropic_client = None
-        anthropic_key = config('ANTHROPIC_API_KEY', default=None)
-        if ANTHROPIC_AVAILABLE and anthropic_key:
+        # OpenAI
+        if self.openai_key:
             try:
-                self.anthropic_client = anthropic.Anthropic(api_key=anthropic_key)
-            except:
+                import openai  # noqa: F401
+                providers.append('openai')
+            except ImportError:
                 pass
         
-        # Provider priority order (most stable first)
-        self.providers = []
-        if self.anthropic_client:
-            self.providers.append('anthropic')
-        if self.gemini_client:
-            self.providers.append('gemini')
-        if self.openai_client:
-            self.providers.append('openai')
+        return providers
+    
+    def _async_clients(self) -> Dict:
+        """
+        Async SDK clients for the running event loop
+        
+        The clients pool connections bound to the loop they were first used
+        on, so one set is kept per loop: under ASGI that is one per process.
+        """
+        loop = asyncio.get_running_loop()
+        clients = self._loop_clients.get(loop)
+        if clients is None:
+            clients = {}
+            for provider in self.providers:
+                try:
+                    clients[provider] = self._create_async_client(provider)
+                except Exception as e:
+                    print(f"Provider {provider} client initialization error: {e}")
+            self._loop_clients[loop] = clients
+        return clients
     
-    def _call_ai_provider(self, prompt: str, system_message: str = None, max_retries: int = 2) -> Optional[str]:
+    def _create_async_client(self, provider: str):
+        if provider == 'anthropic':
+            import anthropic
+            return anthropic.AsyncAnthropic(api_key=self.anthropic_key)
+        elif provider == 'gemini':
+            import google.generativeai as genai
+            return genai.GenerativeModel(self.gemini_model_name)
+        elif provider == 'openai':
+            from openai import AsyncOpenAI
+            return AsyncOpenAI(api_key=self.openai_key)
+        raise ValueError(f"Unknown AI provider: {provider}")
+    
+    async def _call_ai_provider(self, prompt: str, system_message: str = None, max_retries: int = 2) -> Optional[str]:
         """
-        Call AI provider with automatic fallback
+        Call AI providers with hedging and automatic fallback
+        
+        The first provider is called; if it has not answered within
+        AI_HEDGE_DELAY seconds the next one is started alongside it, and so
+        on. The first valid response wins and the other calls are cancelled.
+        A failed call starts the next provider at once, and is retried later
+        while it has attempts left. Providers whose circuit breaker is open
+        are skipped. With AI_HEDGING=False providers are tried one at a time.
         
         Args:
             prompt: User prompt
             system_message: System message (optional)
-            max_retries: Maximum retries per provider
+            max_retries: Maximum attempts per provider
             
         Returns:
             AI response or None if all providers fail
         """
-        # Try each provider in order
-        for provider in self.providers:
-            for attempt in range(max_retries):
-                try:
-                    if provider == 'anthropic' and self.anthropic_client:
-                        full_prompt = prompt
-                        if system_message:
-                            full_prompt = f"{system_message}\n\n{prompt}"
-                        
-                        response = self.anthropic_client.messages.create(
-                            model="claude-3-haiku-20240307",  # Fast and cheap
-                            max_tokens=2000,
-                            messages=[{"role": "user", "content": full_prompt}],
-                            timeout=10.0,
-                        )
-                        return response.content[0].text
-                    
-                    elif provider == 'gemini' and self.gemini_client:
-                        full_prompt = prompt
-                        if system_message:
-                            full_prompt = f"{system_message}\n\n{prompt}"
-                        
-                        try:
-                            # Простой вызов без generation_config для совместимости
-                            response = self.gemini_client.generate_content(full_prompt)
-                            if hasattr(response, 'text'):
-                                return response.text
-                            elif hasattr(response, 'candidates') and len(response.candidates) > 0:
-                                return response.candidates[0].content.parts[0].text
-                            else:
-                                return str(response)
-                        except Exception as e:
-                            # Если ошибка, пробуем без system_message
-                            try:
-                                response = self.gemini_client.generate_content(prompt)
-                                if hasattr(response, 'text'):
-                                    return response.text
-                                elif hasattr(response, 'candidates') and len(response.candidates) > 0:
-                                    return response.candidates[0].content.parts[0].text
-                                else:
-                                    return str(response)
-                            except:
-                                raise e
-                    
-                    elif provider == 'openai' and self.openai_client:
-                        messages = []
-                        if system_message:
-                            messages.append({"role": "system", "content": system_message})
-                        messages.append({"role": "user", "content": prompt})
-                        
-                        response = self.openai_client.chat.completions.create(
-                            model="gpt-4o-mini",
-                            messages=messages,
-                            temperature=0.7,
-                            timeout=10.0,
+        await self.aproviders()
+        clients = self._async_clients()
+        hedge_delay = self.hedge_delay if self.hedging else None
+        
+        # Attempts in launch order: each provider once, then the retries
+        queue = [provider for _ in range(max_retries) for provider in self.providers if clients.get(provider)]
+        running = {}
+        try:
+            while queue or running:
+                # Start the next provider that is not already running (retries wait their turn)
+                index = 0
+                while index < len(queue):
+                    provider = queue[index]
+                    if provider in running.values():
+                        index += 1
+                        continue
+                    del queue[index]
+                    if get_circuit_breaker(provider).allow():
+                        task = asyncio.ensure_future(
+                            self._call_provider(provider, clients[provider], prompt, system_message)
                         )
-                        return response.choices[0].message.content
-                    
-                except Exception as e:
-                    print(f"Provider {provider} attempt {attempt + 1} failed: {e}")
-                    if attempt < max_retries - 1:
+                        running[task] = provider
+                        break
+                if not running:
+                    break
+                
+                # Wait for a response, or until it is time to hedge
+                done, _ = await asyncio.wait(
+                    running,
+                    timeout=hedge_delay if queue else None,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                for task in done:
+                    provider = running.pop(task)
+                    try:
+                        response = task.result()
+                    except Exception as e:
+                        print(f"Provider {provider} failed: {str(e) or type(e).__name__}")
+                        get_circuit_breaker(provider).record_failure()
                         continue
-                    else:
-                        break  # Try next provider
+                    if response and response.strip():
+                        get_circuit_breaker(provider).record_success()
+                        return response
+                    get_circuit_breaker(provider).record_failure()
+        finally:
+            # Cancel the calls that lost the race
+            for task, provider in running.items():
+                task.cancel()
+                get_circuit_breaker(provider).release()
         
         return None  # All providers failed
     
-    def chat_with_ai(self, user_message: str, conversation_history: List[Dict], user_profile: Dict) -> str:
+    async def _call_provider(self, provider: str, client, prompt: str, system_message: str = None) -> str:
+        """One call to a provider, bounded by AI_PROVIDER_TIMEOUT"""
+        return await asyncio.wait_for(
+            self._request_provider(provider, client, prompt, system_message),
+            timeout=self.provider_timeout,
+        )
+    
+    async def _request_provider(self, provider: str, client, prompt: str, system_message: str = None) -> str:
+        if provider == 'anthropic':
+            full_prompt = prompt
+            if system_message:
+                full_prompt = f"{system_message}\n\n{prompt}"
+            
+            response = await client.messages.create(
+                model="claude-3-haiku-20240307",  # Fast and cheap
+                max_tokens=2000,
+                messages=[{"role": "user", "content": full_prompt}],
+                timeout=self.provider_timeout,
+            )
+            return response.content[0].text
+        
+        elif provider == 'gemini':
+            full_prompt = prompt
+            if system_message:
+                full_prompt = f"{system_message}\n\n{prompt}"
+            
+            try:
+                # Простой вызов без generation_config для совместимости
+                response = await client.generate_content_async(full_prompt)
+                return self._gemini_text(response)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Если ошибка, пробуем без system_message
+                try:
+                    response = await client.generate_content_async(prompt)
+                    return self._gemini_text(response)
+                except:
+                    raise e
+        
+        elif provider == 'openai':
+            messages = []
+            if system_message:
+                messages.append({"role": "system", "content": system_message})
+            messages.append({"role": "user", "content": prompt})
+            
+            response = await client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=messages,
+                temperature=0.7,
+                timeout=self.provider_timeout,
+            )
+            return response.choices[0].message.content
+        
+        raise ValueError(f"Unknown AI provider: {provider}")
+    
+    @staticmethod
+    def _gemini_text(response) -> str:
+        """Text of a Gemini generate_content response"""
+        if hasattr(response, 'text'):
+            return response.text
+        elif hasattr(response, 'candidates') and len(response.candidates) > 0:
+            return response.candidates[0].content.parts[0].text
+        else:
+            return str(response)
+    
+    async def chat_with_ai(self, user_message: str, conversation_history: List[Dict], user_profile: Dict) -> str:
         """
         Chat with AI nutrition assistant (works 24/7 with multi-provider fallback)
         """
+        system_message, full_prompt = self._chat_prompt(user_message, conversation_history, user_profile)
+        
+        # Try AI providers first
+        ai_response = await self._call_ai_provider(full_prompt, system_message)
+        
+        if ai_response:
+            # Clean up response (remove markdown, extra formatting)
+            ai_response = re.sub(r'```json\s*', '', ai_response)
+            ai_response = re.sub(r'```\s*', '', ai_response)
+            ai_response = ai_response.strip()
+            return ai_response
+        
+        # Fallback to rule-based (always works)
+        return self._rule_based_chat_response(user_message, user_profile)
+    
+    async def stream_chat(self, user_message: str, conversation_history: List[Dict], user_profile: Dict):
+        """
+        Streaming chat_with_ai: yields (source, text) chunks as the provider generates them
+        
+        source is the provider name, or 'rule_based' for the fallback answer,
+        which is yielded at once when no provider starts answering. Providers
+        are tried in order (skipping open circuit breakers) until one sends
+        its first chunk within AI_PROVIDER_TIMEOUT; after that the answer
+        comes from that provider only, and a failure of the provider raises
+        once part of the answer has been yielded.
+        """
+        system_message, full_prompt = self._chat_prompt(user_message, conversation_history, user_profile)
+        
+        providers = list(self.stream_providers) + await self.aproviders()
+        clients = {**self._async_clients(), **self.stream_providers}
+        for provider in providers:
+            client = clients.get(provider)
+            breaker = get_circuit_breaker(provider)
+            if not client or not breaker.allow():
+                continue
+            
+            chunks = self._stream_provider(provider, client, full_prompt, system_message).__aiter__()
+            try:
+                # Wait for the first non-empty chunk; a slow or failing provider is skipped
+                first = ''
+                while not first.strip():
+                    first = self._clean_chunk(
+                        await asyncio.wait_for(chunks.__anext__(), timeout=self.provider_timeout)
+                    )
+            except StopAsyncIteration:
+                breaker.record_failure()
+                continue
+            except asyncio.CancelledError:
+                breaker.release()
+                await chunks.aclose()
+                raise
+            except Exception as e:
+                print(f"Provider {provider} stream failed: {str(e) or type(e).__name__}")
+                breaker.record_failure()
+                await chunks.aclose()
+                continue
+            
+            try:
+                yield provider, first.lstrip()
+                async for chunk in chunks:
+                    chunk = self._clean_chunk(chunk)
+                    if chunk:
+                        yield provider, chunk
+            except Exception as e:
+                # Part of the answer is already sent: no fallback, let the caller report it
+                print(f"Provider {provider} stream failed: {str(e) or type(e).__name__}")
+                breaker.record_failure()
+                raise
+            else:
+                breaker.record_success()
+            finally:
+                await chunks.aclose()
+            return
+        
+        # Fallback to rule-based (always works)
+        yield 'rule_based', self._rule_based_chat_response(user_message, user_profile)
+    
+    @staticmethod
+    def _clean_chunk(chunk: str) -> str:
+        """Remove markdown code fences from a streamed chunk"""
+        chunk = re.sub(r'```json\s*', '', chunk)
+        return re.sub(r'```\s*', '', chunk)
+    
+    async def _stream_provider(self, provider: str, client, prompt: str, system_message: str = None):
+        """Text chunks of a provider's streamed completion"""
+        if provider in self.stream_providers:
+            async for chunk in client(prompt, system_message):
+                yield chunk
+        
+        elif provider == 'anthropic':
+            full_prompt = f"{system_message}\n\n{prompt}" if system_message else prompt
+            stream = await client.messages.create(
+                model="claude-3-haiku-20240307",
+                max_tokens=2000,
+                messages=[{"role": "user", "content": full_prompt}],
+                timeout=self.provider_timeout,
+                stream=True,
+            )
+            async for event in stream:
+                if event.type == 'content_block_delta' and getattr(event.delta, 'text', None):
+                    yield event.delta.text
+        
+        elif provider == 'gemini':
+            full_prompt = f"{system_message}\n\n{prompt}" if system_message else prompt
+            response = await client.generate_content_async(full_prompt, stream=True)
+            async for chunk in response:
+                text = self._gemini_text(chunk)
+                if text:
+                    yield text
+        
+        elif provider == 'openai':
+            messages = []
+            if system_message:
+                messages.append({"role": "system", "content": system_message})
+            messages.append({"role": "user", "content": prompt})
+            stream = await client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=messages,
+                temperature=0.7,
+                timeout=self.provider_timeout,
+                stream=True,
+            )
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        
+        else:
+            raise ValueError(f"Unknown AI provider: {provider}")
+    
+    def _chat_prompt(self, user_message: str, conversation_history: List[Dict], user_profile: Dict) -> Tuple[str, str]:
+        """System message and prompt of a chat turn"""
         # Build system message with user context
         goal_text = 'похудение' if user_profile.get('goal') == 'weight_loss' else 'набор веса' if user_profile.get('goal') == 'weight_gain' else 'поддержание веса'
         
@@ -206,19 +469,7 @@ class AIService:
                 context += f"{role}: {msg.get('content', '')}\n"
         
         full_prompt = f"{context}\nПользователь: {user_message}\nАссистент:"
-        
-        # Try AI providers first
-        ai_response = self._call_ai_provider(full_prompt, system_message)
-        
-        if ai_response:
-            # Clean up response (remove markdown, extra formatting)
-            ai_response = re.sub(r'```json\s*', '', ai_response)
-            ai_response = re.sub(r'```\s*', '', ai_response)
-            ai_response = ai_response.strip()
-            return ai_response
-        
-        # Fallback to rule-based (always works)
-        return self._rule_based_chat_response(user_message, user_profile)
+        return system_message, full_prompt
     
     def _rule_based_chat_response(self, user_message: str, user_profile: Dict) -> str:
         """
@@ -342,15 +593,27 @@ class AIService:
         
         return f"Хороший вопрос! Я могу помочь с:\n- Расчетом норм калорий и БЖУ\n- Рекомендациями по продуктам\n- Планированием рациона\n- Советами по питанию\n\nПопробуйте спросить:\n" + "\n".join([f"- {s}" for s in suggestions[:3]]) + "\n\nИли заполните профиль для персональных рекомендаций."
 
-    def analyze_behavior(self, meals_data: List[Dict], user_profile: Dict) -> Dict:
-        """Analyze user's eating behavior patterns"""
+    async def analyze_behavior(self, meal_context: Dict, user_profile: Dict, user_id: int = None) -> Dict:
+        """
+        Analyze user's eating behavior patterns
+        
+        meal_context is the per-day totals and top foods of build_meal_context().
+        
+        With user_id, AI-enhanced results are cached per user (see ai.response_cache).
+        """
         # Always use rule-based analysis first
-        rule_based_analysis = self._mock_behavior_analysis(meals_data, user_profile)
+        rule_based_analysis = self._mock_behavior_analysis(meal_context, user_profile)
         
         # Try to enhance with AI
-        if not self.providers:
+        if not await self.aproviders():
             return rule_based_analysis
         
+        cache_key = response_cache.make_key('behavior', meal_context, user_profile)
+        if user_id is not None:
+            cached = await response_cache.acache_get(user_id, cache_key)
+            if cached:
+                return cached
+        
         try:
             goal_text = 'похудение' if user_profile.get('goal') == 'weight_loss' else 'набор веса' if user_profile.get('goal') == 'weight_gain' else 'поддержание веса'
             
@@ -363,7 +626,7 @@ class AIService:
 - Целевой белок: {user_profile.get('goal_protein', 'не установлено')} г/день
 
 ДАННЫЕ О ПИТАНИИ:
-{json.dumps(meals_data, indent=2, ensure_ascii=False)}
+{encode_meal_context(meal_context, self.meal_context_budget)}
 
 Верни ТОЛЬКО JSON:
 {{
@@ -374,20 +637,23 @@ class AIService:
 }}
 """
             
-            ai_response = self._call_ai_provider(prompt, "Ты - эксперт-диетолог. Анализируй объективно, давай конкретные рекомендации на русском.")
+            ai_response = await self._call_ai_provider(prompt, "Ты - эксперт-диетолог. Анализируй объективно, давай конкретные рекомендации на русском.")
             
             if ai_response:
                 # Try to extract JSON
                 json_match = re.search(r'\{.*\}', ai_response, re.DOTALL)
                 if json_match:
                     ai_result = json.loads(json_match.group())
-                    return {
+                    analysis = {
                         "patterns": rule_based_analysis.get("patterns", []) + ai_result.get("patterns", []),
                         "issues": rule_based_analysis.get("issues", []) + ai_result.get("issues", []),
                         "recommendations": rule_based_analysis.get("recommendations", []) + ai_result.get("recommendations", []),
                         "summary": ai_result.get("summary", rule_based_analysis.get("summary", "")),
                         "ai_enhanced": True
                     }
+                    if user_id is not None:
+                        await response_cache.acache_set(user_id, cache_key, analysis)
+                    return analysis
         except Exception as e:
             print(f"AI enhancement failed: {e}")
         
@@ -417,10 +683,20 @@ class AIService:
         
         return recommendations
 
-    def generate_meal_plan(self, requirements: Dict, days: int = 7) -> Dict:
-        """Generate personalized meal plan"""
+    async def generate_meal_plan(self, requirements: Dict, days: int = 7, user_id: int = None) -> Dict:
+        """
+        Generate personalized meal plan
+        
+        With user_id, AI-generated plans are cached per user (see ai.response_cache).
+        """
         # Try AI first
-        if self.providers:
+        if await self.aproviders():
+            cache_key = response_cache.make_key('meal_plan', requirements, days)
+            if user_id is not None:
+                cached = await response_cache.acache_get(user_id, cache_key)
+                if cached:
+                    return cached
+            
             try:
                 available_foods = requirements.get('available_foods', [])
                 foods_context = f"\nДоступные продукты: {', '.join(available_foods[:50])}" if available_foods else ""
@@ -449,21 +725,25 @@ class AIService:
     ]
 }}
 """
-                ai_response = self._call_ai_provider(prompt, "Ты - эксперт-диетолог. Создавай практичные планы питания.")
+                ai_response = await self._call_ai_provider(prompt, "Ты - эксперт-диетолог. Создавай практичные планы питания.")
                 
                 if ai_response:
                     json_match = re.search(r'\{.*\}', ai_response, re.DOTALL)
                     if json_match:
-                        return json.loads(json_match.group())
+                        meal_plan = json.loads(json_match.group())
+                        if user_id is not None:
+                            await response_cache.acache_set(user_id, cache_key, meal_plan)
+                        return meal_plan
             except Exception as e:
                 print(f"AI meal plan failed: {e}")
         
         # Fallback to mock
         return self._mock_meal_plan()
     
-    def _mock_behavior_analysis(self, meals_data: List[Dict], user_profile: Dict = None) -> Dict:
+    def _mock_behavior_analysis(self, meal_context: Dict, user_profile: Dict = None) -> Dict:
         """Rule-based behavior analysis"""
-        if not meals_data:
+        days = meal_context.get('days', [])
+        if not days:
             return {
                 "patterns": [],
                 "issues": ["Недостаточно данных для анализа. Добавьте приемы пищи за последние 7 дней."],
@@ -477,8 +757,8 @@ class AIService:
         recommendations = []
         
         # Check breakfast
-        days_with_breakfast = sum(1 for m in meals_data if m.get('meal_type') == 'breakfast')
-        total_days = len(set(m.get('date') for m in meals_data))
+        days_with_breakfast = sum(1 for day in days if 'breakfast' in day['meal_types'])
+        total_days = len(days)
         if total_days > 0:
             breakfast_rate = (days_with_breakfast / total_days) * 100
             if breakfast_rate < 70:
@@ -490,14 +770,7 @@ class AIService:
         # Check calories vs goal
         if user_profile and user_profile.get('goal_calories'):
             goal_calories = user_profile.get('goal_calories')
-            daily_calories = {}
-            for meal in meals_data:
-                date = meal.get('date')
-                if date not in daily_calories:
-                    daily_calories[date] = 0
-                daily_calories[date] += meal.get('calories', 0)
-            
-            over_days = sum(1 for cal in daily_calories.values() if cal > goal_calories * 1.1)
+            over_days = sum(1 for day in days if day['calories'] > goal_calories * 1.1)
             if over_days > 0:
                 issues.append(f"Превышение калорий: превышали норму ({goal_calories} ккал) в {over_days} днях.")
                 recommendations.append(f"Старайтесь не превышать {goal_calories} ккал в день.")
@@ -505,16 +778,9 @@ class AIService:
         # Check protein
         if user_profile and user_profile.get('goal_protein'):
             goal_protein = user_profile.get('goal_protein')
-            daily_protein = {}
-            for meal in meals_data:
-                date = meal.get('date')
-                if date not in daily_protein:
-                    daily_protein[date] = 0
-                daily_protein[date] += meal.get('protein', 0)
-            
-            low_protein_days = sum(1 for prot in daily_protein.values() if prot < goal_protein * 0.7)
+            low_protein_days = sum(1 for day in days if day['protein'] < goal_protein * 0.7)
             if low_protein_days > 0:
-                avg_protein = sum(daily_protein.values()) / len(daily_protein) if daily_protein else 0
+                avg_protein = sum(day['protein'] for day in days) / len(days)
                 issues.append(f"Нехватка белка: белок ниже нормы ({goal_protein}г) в {low_protein_days} днях. Среднее потребление: {avg_protein:.0f}г")
                 recommendations.append(f"Увеличьте потребление белка до {goal_protein}г в день.")
         
@@ -0,0 +1,15 @@
+"""
+Drop a user's cached AI responses when their meals or nutrition goals change
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from api.models import Meal, NutritionGoal
+from . import response_cache
+
+
+@receiver(post_save, sender=Meal)
+@receiver(post_delete, sender=Meal)
+@receiver(post_save, sender=NutritionGoal)
+@receiver(post_delete, sender=NutritionGoal)
+def invalidate_ai_cache(sender, instance, **kwargs):
+    response_cache.invalidate_user(instance.user_id)
@@ -0,0 +1,71 @@
+import json
+from unittest import mock
+from django.test import TestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+from ai.services import AIService
+from users.models import User
+
+
+async def fake_provider(prompt, system_message):
+    for chunk in ['Ешьте ', 'больше ', 'овощей.']:
+        yield chunk
+
+
+async def failing_provider(prompt, system_message):
+    yield 'Начало ответа'
+    raise ConnectionError('connection reset')
+
+
+def parse_events(body):
+    """(event, data) pairs of a text/event-stream body"""
+    events = []
+    for block in body.split('\n\n'):
+        if not block:
+            continue
+        event = 'message'
+        for line in block.split('\n'):
+            if line.startswith('event: '):
+                event = line[len('event: '):]
+            else:
+                assert line.startswith('data: '), line
+                events.append((event, json.loads(line[len('data: '):])))
+    return events
+
+
+class ChatStreamTests(TestCase):
+    """Server-sent events of chat/stream/ with injected streaming providers"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='stream_test', email='stream@example.com', password='secret')
+
+    async def stream(self, stream_providers):
+        service = AIService(stream_providers=stream_providers)
+        service.providers = []
+        token = str(RefreshToken.for_user(self.user).access_token)
+        with mock.patch('ai.views.ai_service', service):
+            response = await self.async_client.post(
+                '/api/ai/chat/stream/', {'message': 'Что есть на ужин?'},
+                content_type='application/json', headers={'Authorization': f'Bearer {token}'},
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response['Content-Type'].startswith('text/event-stream'))
+            body = b''.join([chunk async for chunk in response.streaming_content])
+        return parse_events(body.decode('utf-8'))
+
+    async def test_chunks_then_done(self):
+        events = await self.stream({'fake': fake_provider})
+        self.assertEqual(events, [
+            ('message', {'delta': 'Ешьте '}),
+            ('message', {'delta': 'больше '}),
+            ('message', {'delta': 'овощей.'}),
+            ('done', {'source': 'fake'}),
+        ])
+
+    async def test_error_event_when_provider_fails_mid_stream(self):
+        events = await self.stream({'failing': failing_provider, 'fake': fake_provider})
+        self.assertEqual(events[0], ('message', {'delta': 'Начало ответа'}))
+        # No fallback to the next provider once part of the answer is sent
+        self.assertEqual([event for event, _ in events[1:]], ['error', 'done'])
+        self.assertIn('error', events[1][1])
+        self.assertEqual(events[2][1], {'source': 'failing'})
@@ -7,5 +7,6 @@ urlpatterns = [
     path('parse-meal-text/', views.parse_meal_text, name='parse-meal-text'),
     path('generate-meal-plan/', views.generate_meal_plan, name='generate-meal-plan'),
     path('chat/', views.chat_with_ai, name='chat'),
+    path('chat/stream/', views.chat_with_ai_stream, name='chat-stream'),
 ]
 
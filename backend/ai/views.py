@@ -1,68 +1,64 @@
 """
 AI API endpoints
+
+The endpoints are async views (see api.async_api): they await the AI
+providers without holding a worker thread, and read the database in
+sync_to_async helpers.
 """
-from rest_framework.decorators import api_view, permission_classes
+import json
+from asgiref.sync import sync_to_async
+from django.http import StreamingHttpResponse
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
 from django.utils import timezone
 from datetime import date, timedelta
+from api.async_api import async_api_view
 from api.models import Meal
 from api.utils import calculate_age_from_birthdate
 from users.models import User, PsychFoodProfile
+from .meal_context import build_meal_context
 from .services import ai_service
 
 
-@api_view(['POST'])
-@permission_classes([IsAuthenticated])
-def analyze_behavior(request):
+def _behavior_context(user):
+    """Meal totals of the last 7 days and profile of a user, for analyze_behavior"""
+    # Get last 7 days of meals
+    end_date = date.today()
+    start_date = end_date - timedelta(days=7)
+    
+    meal_context = build_meal_context(user, start_date, end_date)
+    
+    # Get user's nutrition goals for comparison
+    try:
+        goals = user.nutrition_goal
+        goal_calories = goals.daily_calories
+        goal_protein = goals.daily_protein
+    except:
+        goal_calories = None
+        goal_protein = None
+    
+    # Build comprehensive user profile
+    user_profile = {
+        'goal': user.goal or 'maintenance',
+        'activity_level': user.activity_level,
+        'weight': user.weight,
+        'height': user.height,
+        'gender': user.gender,
+        'age': calculate_age_from_birthdate(user.date_of_birth) if user.date_of_birth else None,
+        'goal_calories': goal_calories,
+        'goal_protein': goal_protein,
+    }
+    return meal_context, user_profile
+
+
+@async_api_view(['POST'], permission_classes=[IsAuthenticated])
+async def analyze_behavior(request):
     """Analyze user's eating behavior using AI"""
     try:
-        # Get last 7 days of meals
-        end_date = date.today()
-        start_date = end_date - timedelta(days=7)
-        
-        meals = Meal.objects.filter(
-            user=request.user,
-            date__gte=start_date,
-            date__lte=end_date
-        ).order_by('date', 'meal_type')
-        
-        meals_data = []
-        for meal in meals:
-            meals_data.append({
-                'date': str(meal.date),
-                'meal_type': meal.meal_type,
-                'food': meal.food.name,
-                'quantity': meal.quantity,
-                'calories': meal.total_calories,
-                'protein': meal.total_protein,
-                'carbs': meal.total_carbs,
-                'fat': meal.total_fat,
-            })
-        
-        # Get user's nutrition goals for comparison
-        try:
-            goals = request.user.nutrition_goal
-            goal_calories = goals.daily_calories
-            goal_protein = goals.daily_protein
-        except:
-            goal_calories = None
-            goal_protein = None
-        
-        # Build comprehensive user profile
-        user_profile = {
-            'goal': request.user.goal or 'maintenance',
-            'activity_level': request.user.activity_level,
-            'weight': request.user.weight,
-            'height': request.user.height,
-            'gender': request.user.gender,
-            'age': calculate_age_from_birthdate(request.user.date_of_birth) if request.user.date_of_birth else None,
-            'goal_calories': goal_calories,
-            'goal_protein': goal_protein,
-        }
+        meal_context, user_profile = await sync_to_async(_behavior_context)(request.user)
         
-        analysis = ai_service.analyze_behavior(meals_data, user_profile)
+        analysis = await ai_service.analyze_behavior(meal_context, user_profile, user_id=request.user.id)
         
         return Response(analysis)
     except Exception as e:
@@ -74,38 +70,43 @@ def analyze_behavior(request):
         )
 
 
-@api_view(['POST'])
-@permission_classes([IsAuthenticated])
-def get_recommendations(request):
-    """Get AI-powered nutrition recommendations"""
+def _recommendation_context(user):
+    """Today's nutrition totals and goals of a user, for get_recommendations"""
+    today = date.today()
+    meals = Meal.objects.filter(user=user, date=today)
+    
+    current_nutrition = {
+        'calories': sum(m.total_calories for m in meals) or 0,
+        'protein': sum(m.total_protein for m in meals) or 0,
+        'carbs': sum(m.total_carbs for m in meals) or 0,
+        'fat': sum(m.total_fat for m in meals) or 0,
+    }
+    
     try:
-        today = date.today()
-        meals = Meal.objects.filter(user=request.user, date=today)
-        
-        current_nutrition = {
-            'calories': sum(m.total_calories for m in meals) or 0,
-            'protein': sum(m.total_protein for m in meals) or 0,
-            'carbs': sum(m.total_carbs for m in meals) or 0,
-            'fat': sum(m.total_fat for m in meals) or 0,
+        goals = user.nutrition_goal
+        user_data = {
+            'goal': user.goal or 'maintenance',
+            'daily_calories': goals.daily_calories,
+            'daily_protein': goals.daily_protein,
+            'daily_carbs': goals.daily_carbs,
+            'daily_fat': goals.daily_fat,
         }
-        
-        try:
-            goals = request.user.nutrition_goal
-            user_data = {
-                'goal': request.user.goal or 'maintenance',
-                'daily_calories': goals.daily_calories,
-                'daily_protein': goals.daily_protein,
-                'daily_carbs': goals.daily_carbs,
-                'daily_fat': goals.daily_fat,
-            }
-        except:
-            user_data = {
-                'goal': request.user.goal or 'maintenance',
-                'daily_calories': 2000,
-                'daily_protein': 150,
-                'daily_carbs': 200,
-                'daily_fat': 65,
-            }
+    except:
+        user_data = {
+            'goal': user.goal or 'maintenance',
+            'daily_calories': 2000,
+            'daily_protein': 150,
+            'daily_carbs': 200,
+            'daily_fat': 65,
+        }
+    return user_data, current_nutrition
+
+
+@async_api_view(['POST'], permission_classes=[IsAuthenticated])
+async def get_recommendations(request):
+    """Get AI-powered nutrition recommendations"""
+    try:
+        user_data, current_nutrition = await sync_to_async(_recommendation_context)(request.user)
         
         recommendations = ai_service.get_recommendations(user_data, current_nutrition)
         
@@ -117,9 +118,8 @@ def get_recommendations(request):
         )
 
 
-@api_view(['POST'])
-@permission_classes([IsAuthenticated])
-def parse_meal_text(request):
+@async_api_view(['POST'], permission_classes=[IsAuthenticated])
+async def parse_meal_text(request):
     """Parse meal from natural language text"""
     try:
         text = request.data.get('text', '')
@@ -138,42 +138,46 @@ def parse_meal_text(request):
         )
 
 
-@api_view(['POST'])
-@permission_classes([IsAuthenticated])
-def generate_meal_plan(request):
+def _meal_plan_requirements(user, data):
+    """Meal plan requirements from the request data and a user's goals, for generate_meal_plan"""
+    # Get user's goals
+    try:
+        goals = user.nutrition_goal
+        default_calories = goals.daily_calories
+        default_protein = goals.daily_protein
+        default_carbs = goals.daily_carbs
+        default_fat = goals.daily_fat
+    except:
+        default_calories = 2000
+        default_protein = 150
+        default_carbs = 200
+        default_fat = 65
+    
+    # Get available foods from database
+    from api.models import Food
+    available_foods = list(Food.objects.values_list('name', flat=True)[:100])
+    
+    return {
+        'calories': data.get('calories', default_calories),
+        'protein': data.get('protein', default_protein),
+        'carbs': data.get('carbs', default_carbs),
+        'fat': data.get('fat', default_fat),
+        'dietary_preference': user.dietary_preference or 'none',
+        'budget': data.get('budget', 'medium'),
+        'cooking_time': data.get('cooking_time', 'medium'),
+        'available_foods': available_foods,
+    }
+
+
+@async_api_view(['POST'], permission_classes=[IsAuthenticated])
+async def generate_meal_plan(request):
     """Generate personalized meal plan for multiple days with specific products"""
     try:
-        # Get user's goals
-        try:
-            goals = request.user.nutrition_goal
-            default_calories = goals.daily_calories
-            default_protein = goals.daily_protein
-            default_carbs = goals.daily_carbs
-            default_fat = goals.daily_fat
-        except:
-            default_calories = 2000
-            default_protein = 150
-            default_carbs = 200
-            default_fat = 65
-        
-        # Get available foods from database
-        from api.models import Food
-        available_foods = list(Food.objects.values_list('name', flat=True)[:100])
-        
         days = int(request.data.get('days', 7))
         
-        requirements = {
-            'calories': request.data.get('calories', default_calories),
-            'protein': request.data.get('protein', default_protein),
-            'carbs': request.data.get('carbs', default_carbs),
-            'fat': request.data.get('fat', default_fat),
-            'dietary_preference': request.user.dietary_preference or 'none',
-            'budget': request.data.get('budget', 'medium'),
-            'cooking_time': request.data.get('cooking_time', 'medium'),
-            'available_foods': available_foods,
-        }
+        requirements = await sync_to_async(_meal_plan_requirements)(request.user, request.data)
         
-        meal_plan = ai_service.generate_meal_plan(requirements, days=days)
+        meal_plan = await ai_service.generate_meal_plan(requirements, days=days, user_id=request.user.id)
         return Response(meal_plan)
     except Exception as e:
         import traceback
@@ -184,9 +188,31 @@ def generate_meal_plan(request):
         )
 
 
-@api_view(['POST'])
-@permission_classes([IsAuthenticated])
-def chat_with_ai(request):
+def _chat_profile(user):
+    """Profile of a user for the chat assistant"""
+    try:
+        goals = user.nutrition_goal
+        goal_calories = goals.daily_calories
+        goal_protein = goals.daily_protein
+    except:
+        goal_calories = None
+        goal_protein = None
+    
+    return {
+        'goal': user.goal or 'maintenance',
+        'activity_level': user.activity_level,
+        'weight': user.weight,
+        'height': user.height,
+        'gender': user.gender,
+        'age': calculate_age_from_birthdate(user.date_of_birth) if user.date_of_birth else None,
+        'goal_calories': goal_calories,
+        'goal_protein': goal_protein,
+        'dietary_preference': user.dietary_preference or 'none',
+    }
+
+
+@async_api_view(['POST'], permission_classes=[IsAuthenticated])
+async def chat_with_ai(request):
     """Chat with AI nutrition assistant (works 24/7 with fallback)"""
     try:
         user_message = request.data.get('message', '')
@@ -199,28 +225,10 @@ def chat_with_ai(request):
         conversation_history = request.data.get('history', [])
         
         # Build user profile
-        try:
-            goals = request.user.nutrition_goal
-            goal_calories = goals.daily_calories
-            goal_protein = goals.daily_protein
-        except:
-            goal_calories = None
-            goal_protein = None
-        
-        user_profile = {
-            'goal': request.user.goal or 'maintenance',
-            'activity_level': request.user.activity_level,
-            'weight': request.user.weight,
-            'height': request.user.height,
-            'gender': request.user.gender,
-            'age': calculate_age_from_birthdate(request.user.date_of_birth) if request.user.date_of_birth else None,
-            'goal_calories': goal_calories,
-            'goal_protein': goal_protein,
-            'dietary_preference': request.user.dietary_preference or 'none',
-        }
+        user_profile = await sync_to_async(_chat_profile)(request.user)
         
         # Chat always works (with fallback if OpenAI unavailable)
-        ai_response = ai_service.chat_with_ai(user_message, conversation_history, user_profile)
+        ai_response = await ai_service.chat_with_ai(user_message, conversation_history, user_profile)
         
         return Response({
             'response': ai_response,
@@ -239,3 +247,53 @@ def chat_with_ai(request):
             'role': 'assistant'
         }, status=status.HTTP_200_OK)  # Return 200 to keep chat working
 
+
+def _sse_event(data, event=None):
+    """One server-sent event"""
+    payload = json.dumps(data, ensure_ascii=False)
+    return f"event: {event}\ndata: {payload}\n\n" if event else f"data: {payload}\n\n"
+
+
+@async_api_view(['POST'], permission_classes=[IsAuthenticated])
+async def chat_with_ai_stream(request):
+    """
+    Chat with AI nutrition assistant, streamed as server-sent events
+    
+    Each text chunk is sent as `data: {"delta": "..."}` as soon as the
+    provider produces it, followed by `event: done` with the answer's
+    source (provider name or rule_based). When the answer fails part way,
+    `event: error` comes before `done`. Takes the same body as chat/.
+    
+    Chunks reach the client as they are produced only under ASGI
+    (food_diary/asgi.py): a WSGI server consumes the async generator in
+    full before sending it, so the client gets the whole answer at once.
+    """
+    user_message = request.data.get('message', '')
+    if not user_message:
+        return Response(
+            {'error': 'Message is required'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    conversation_history = request.data.get('history', [])
+    user_profile = await sync_to_async(_chat_profile)(request.user)
+    
+    async def events():
+        source = None
+        try:
+            async for source, chunk in ai_service.stream_chat(user_message, conversation_history, user_profile):
+                yield _sse_event({'delta': chunk})
+        except Exception:
+            import traceback
+            traceback.print_exc()
+            if source is None:
+                source = 'error'
+                yield _sse_event({'delta': "Извините, произошла техническая ошибка. Попробуйте переформулировать вопрос или обратитесь позже."})
+            yield _sse_event({'error': "Ответ прерван из-за технической ошибки. Попробуйте еще раз."}, event='error')
+        yield _sse_event({'source': source}, event='done')
+    
+    response = StreamingHttpResponse(events(), content_type='text/event-stream; charset=utf-8')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
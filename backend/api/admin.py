@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Food, Meal, NutritionGoal, WeightEntry, Notification, MealReminderSettings, Recipe, RecipeIngredient, FastingSession, FastingSettings
+from .models import Food, Meal, NutritionGoal, WeightEntry, Notification, MealReminderSettings, Recipe, RecipeIngredient, FastingSession, FastingSettings, ReportJob, USDAImportCheckpoint
 
 
 @admin.register(Food)
@@ -103,3 +103,19 @@ class FastingSettingsAdmin(admin.ModelAdmin):
     search_fields = ['user__username']
     readonly_fields = ['created_at', 'updated_at']
 
+
+
+@admin.register(ReportJob)
+class ReportJobAdmin(admin.ModelAdmin):
+    list_display = ['user', 'start_date', 'end_date', 'status', 'created_at', 'completed_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['user__username']
+    readonly_fields = ['file_path', 'error', 'created_at', 'updated_at', 'completed_at']
+
+
+@admin.register(USDAImportCheckpoint)
+class USDAImportCheckpointAdmin(admin.ModelAdmin):
+    list_display = ['source', 'member', 'status', 'record_index', 'created_count', 'updated_count', 'updated_at']
+    list_filter = ['status']
+    search_fields = ['source', 'member', 'content_hash']
+    readonly_fields = ['content_hash', 'offset', 'record_index', 'created_at', 'updated_at', 'completed_at']
@@ -0,0 +1,79 @@
+"""
+Native async API views with DRF authentication, permissions and rendering
+
+DRF 3.14 only dispatches synchronous views. async_api_view turns an async
+handler into a plain Django async view: request setup (authentication,
+permission and throttle checks, body parsing) and response rendering go
+through DRF's APIView machinery in a worker thread, while the handler
+awaits its outbound HTTP calls on the event loop. Under ASGI
+(food_diary/asgi.py) a slow upstream then no longer holds a worker thread.
+
+Handlers run on the event loop, so ORM access must use the async queryset
+API (afirst(), acreate(), ...) or sync_to_async.
+"""
+from functools import wraps
+from asgiref.sync import sync_to_async
+from rest_framework import exceptions
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView
+
+
+def async_api_view(http_method_names, permission_classes=None):
+    """
+    Decorator for async function-based API views, like api_view() for sync ones
+
+    Usage:
+        @async_api_view(['POST'], permission_classes=[IsAuthenticated])
+        async def my_view(request):
+            ...
+            return Response(...)
+    """
+    allowed_methods = [method.upper() for method in http_method_names]
+
+    def decorator(func):
+        view_class = type(func.__name__, (APIView,), {
+            'http_method_names': [method.lower() for method in allowed_methods] + ['options'],
+            'permission_classes': permission_classes or api_settings.DEFAULT_PERMISSION_CLASSES,
+        })
+
+        def initial(django_request, args, kwargs):
+            view = view_class()
+            view.args = args
+            view.kwargs = kwargs
+            view.headers = view.default_response_headers
+            request = view.initialize_request(django_request, *args, **kwargs)
+            view.request = request
+            try:
+                view.initial(request, *args, **kwargs)
+                if request.method == 'OPTIONS':
+                    return view, request, view.options(request, *args, **kwargs)
+                if request.method not in allowed_methods:
+                    raise exceptions.MethodNotAllowed(request.method)
+                # Parse the body here rather than on the event loop
+                request.data
+            except Exception as exc:
+                return view, request, view.handle_exception(exc)
+            return view, request, None
+
+        def finalize(view, request, response, args, kwargs):
+            response = view.finalize_response(request, response, *args, **kwargs)
+            if hasattr(response, 'render'):
+                response.render()
+            return response
+
+        @wraps(func)
+        async def view(django_request, *args, **kwargs):
+            view_instance, request, response = await sync_to_async(initial)(django_request, args, kwargs)
+            if response is None:
+                try:
+                    response = await func(request, *args, **kwargs)
+                except Exception as exc:
+                    response = await sync_to_async(view_instance.handle_exception)(exc)
+            return await sync_to_async(finalize)(view_instance, request, response, args, kwargs)
+
+        # DRF enforces CSRF itself for session authentication, as for APIView
+        view.csrf_exempt = True
+        view.cls = view_class
+        return view
+
+    return decorator
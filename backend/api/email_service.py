@@ -1,111 +1,131 @@
 """
 Email notification service for meal reminders
 """
-from django.core.mail import send_mail
+import logging
+from datetime import date
+from typing import Iterable, Optional
+from django.core.mail import EmailMultiAlternatives, get_connection
 from django.conf import settings
-from django.template.loader import render_to_string
-from django.utils.html import strip_tags
-from datetime import datetime, time
-from .models import MealReminderSettings, Meal
+from .models import MealReminderSettings, Meal, NutritionGoal
+from .email_templates import (
+    MEAL_LABELS, MEAL_REMINDER_TEMPLATE, DAILY_SUMMARY_TEMPLATE,
+    REMINDER_LOGGED_HTML, REMINDER_NOT_LOGGED_HTML,
+    REMINDER_LOGGED_TEXT, REMINDER_NOT_LOGGED_TEXT,
+    summary_context,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _email_enabled(user) -> bool:
+    """Check if user has email notifications enabled"""
+    try:
+        reminder_settings = user.meal_reminder_settings
+    except MealReminderSettings.DoesNotExist:
+        return False
+    return bool(reminder_settings.email_notifications and user.email)
+
+
+def _build_message(user, subject, text_body, html_body, connection=None) -> EmailMultiAlternatives:
+    """Build a multipart (plain text + HTML) email message"""
+    from_email = getattr(settings, 'DEFAULT_FROM_EMAIL', 'noreply@fooddiary.com')
+    message = EmailMultiAlternatives(
+        subject=subject,
+        body=text_body,
+        from_email=from_email,
+        to=[user.email],
+        connection=connection,
+    )
+    message.attach_alternative(html_body, 'text/html')
+    return message
+
+
+def build_meal_reminder_message(user, meal_type, meal_time, connection=None) -> Optional[EmailMultiAlternatives]:
+    """
+    Build meal reminder email for a user
+
+    Returns:
+        EmailMultiAlternatives or None if user has email notifications disabled
+    """
+    if not _email_enabled(user):
+        return None
+
+    meal_label = MEAL_LABELS.get(meal_type, meal_type)
+
+    # Check if user has already logged this meal today
+    has_logged = Meal.objects.filter(user=user, date=date.today(), meal_type=meal_type).exists()
+
+    subject, text_body, html_body = MEAL_REMINDER_TEMPLATE.render(
+        meal_label=meal_label,
+        meal_label_lower=meal_label.lower(),
+        user_name=user.get_full_name() or user.username,
+        meal_time=meal_time.strftime('%H:%M'),
+        logged_note_html=REMINDER_LOGGED_HTML if has_logged else REMINDER_NOT_LOGGED_HTML,
+        logged_note_text=REMINDER_LOGGED_TEXT if has_logged else REMINDER_NOT_LOGGED_TEXT,
+    )
+    return _build_message(user, subject, text_body, html_body, connection)
+
+
+def build_daily_summary_message(user, connection=None) -> Optional[EmailMultiAlternatives]:
+    """
+    Build daily nutrition summary email for a user
+
+    Returns:
+        EmailMultiAlternatives or None if user has email notifications disabled
+    """
+    if not _email_enabled(user):
+        return None
+
+    today = date.today()
+    meals_today = Meal.objects.filter(user=user, date=today).select_related('food', 'recipe').prefetch_related('recipe__ingredients__food')
+
+    # Calculate totals
+    totals = {'calories': 0, 'protein': 0, 'carbs': 0, 'fat': 0}
+    for meal in meals_today:
+        totals['calories'] += meal.total_calories
+        totals['protein'] += meal.total_protein
+        totals['carbs'] += meal.total_carbs
+        totals['fat'] += meal.total_fat
+
+    # Get goals
+    try:
+        goal = user.nutrition_goal
+        goals = {
+            'calories': goal.daily_calories,
+            'protein': goal.daily_protein,
+            'carbs': goal.daily_carbs,
+            'fat': goal.daily_fat,
+        }
+    except NutritionGoal.DoesNotExist:
+        goals = None
+
+    subject, text_body, html_body = DAILY_SUMMARY_TEMPLATE.render(
+        user_name=user.get_full_name() or user.username,
+        date=today.strftime('%d.%m.%Y'),
+        **summary_context(totals, goals),
+    )
+    return _build_message(user, subject, text_body, html_body, connection)
 
 
 def send_meal_reminder_email(user, meal_type, meal_time):
     """
     Send email reminder for a meal
-    
+
     Args:
         user: User object
         meal_type: Type of meal (breakfast, lunch, dinner, snack)
         meal_time: Time for the meal (time object)
-    
+
     Returns:
         bool: True if email was sent successfully, False otherwise
     """
     try:
-        # Check if user has email notifications enabled
-        try:
-            reminder_settings = user.meal_reminder_settings
-            if not reminder_settings.email_notifications:
-                return False
-            if not user.email:
-                return False
-        except MealReminderSettings.DoesNotExist:
+        message = build_meal_reminder_message(user, meal_type, meal_time)
+        if message is None:
             return False
-        
-        # Meal type labels
-        meal_labels = {
-            'breakfast': 'Завтрак',
-            'lunch': 'Обед',
-            'dinner': 'Ужин',
-            'snack': 'Перекус',
-        }
-        
-        meal_label = meal_labels.get(meal_type, meal_type)
-        
-        # Check if user has already logged this meal today
-        from datetime import date
-        today = date.today()
-        meals_today = Meal.objects.filter(user=user, date=today, meal_type=meal_type)
-        has_logged = meals_today.exists()
-        
-        # Prepare email content
-        subject = f'Напоминание: {meal_label}'
-        
-        # Simple HTML email
-        html_message = f"""
-        <html>
-        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
-            <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
-                <h2 style="color: #1976D2;">Напоминание о приеме пищи</h2>
-                <p>Здравствуйте, {user.get_full_name() or user.username}!</p>
-                <p>Напоминаем вам о времени <strong>{meal_label.lower()}</strong> в {meal_time.strftime('%H:%M')}.</p>
-                """
-        
-        if has_logged:
-            html_message += """
-                <p style="color: #4CAF50; font-weight: bold;">✓ Вы уже добавили этот прием пищи сегодня. Отлично!</p>
-            """
-        else:
-            html_message += """
-                <p>Не забудьте добавить прием пищи в ваш дневник питания.</p>
-            """
-        
-        html_message += f"""
-                <p style="margin-top: 30px;">
-                    <a href="http://localhost:3000/diary" 
-                       style="background-color: #1976D2; color: white; padding: 10px 20px; 
-                              text-decoration: none; border-radius: 5px; display: inline-block;">
-                        Открыть дневник питания
-                    </a>
-                </p>
-                <p style="margin-top: 20px; font-size: 12px; color: #666;">
-                    Вы получили это письмо, потому что включили email-уведомления в настройках.
-                    Вы можете отключить их в любое время в настройках приложения.
-                </p>
-            </div>
-        </body>
-        </html>
-        """
-        
-        plain_message = strip_tags(html_message)
-        
-        # Send email
-        from_email = getattr(settings, 'DEFAULT_FROM_EMAIL', 'noreply@fooddiary.com')
-        
-        send_mail(
-            subject=subject,
-            message=plain_message,
-            from_email=from_email,
-            recipient_list=[user.email],
-            html_message=html_message,
-            fail_silently=False,
-        )
-        
+        message.send(fail_silently=False)
         return True
-        
     except Exception as e:
-        import logging
-        logger = logging.getLogger(__name__)
         logger.error(f"Error sending meal reminder email to {user.email}: {e}", exc_info=True)
         return False
 
@@ -113,115 +133,62 @@ def send_meal_reminder_email(user, meal_type, meal_time):
 def send_daily_summary_email(user):
     """
     Send daily nutrition summary email
-    
+
     Args:
         user: User object
-    
+
     Returns:
         bool: True if email was sent successfully, False otherwise
     """
     try:
-        # Check if user has email notifications enabled
-        try:
-            reminder_settings = user.meal_reminder_settings
-            if not reminder_settings.email_notifications:
-                return False
-            if not user.email:
-                return False
-        except MealReminderSettings.DoesNotExist:
+        message = build_daily_summary_message(user)
+        if message is None:
             return False
-        
-        from datetime import date
-        from .models import NutritionGoal
-        
-        today = date.today()
-        meals_today = Meal.objects.filter(user=user, date=today).select_related('food')
-        
-        # Calculate totals
-        total_calories = sum(meal.total_calories for meal in meals_today)
-        total_protein = sum(meal.total_protein for meal in meals_today)
-        total_carbs = sum(meal.total_carbs for meal in meals_today)
-        total_fat = sum(meal.total_fat for meal in meals_today)
-        
-        # Get goals
-        try:
-            goals = user.nutrition_goal
-            goal_calories = goals.daily_calories
-            goal_protein = goals.daily_protein
-            goal_carbs = goals.daily_carbs
-            goal_fat = goals.daily_fat
-        except NutritionGoal.DoesNotExist:
-            goal_calories = goal_protein = goal_carbs = goal_fat = None
-        
-        # Prepare email
-        subject = f'Итоги дня: {today.strftime("%d.%m.%Y")}'
-        
-        html_message = f"""
-        <html>
-        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
-            <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
-                <h2 style="color: #1976D2;">Итоги дня</h2>
-                <p>Здравствуйте, {user.get_full_name() or user.username}!</p>
-                <p>Вот ваша статистика питания за {today.strftime('%d.%m.%Y')}:</p>
-                
-                <table style="width: 100%; border-collapse: collapse; margin: 20px 0;">
-                    <tr style="background-color: #1976D2; color: white;">
-                        <th style="padding: 10px; text-align: left;">Показатель</th>
-                        <th style="padding: 10px; text-align: right;">Получено</th>
-                        <th style="padding: 10px; text-align: right;">Цель</th>
-                    </tr>
-                    <tr style="background-color: #f5f5f5;">
-                        <td style="padding: 10px;">Калории</td>
-                        <td style="padding: 10px; text-align: right; font-weight: bold;">{total_calories:.0f} ккал</td>
-                        <td style="padding: 10px; text-align: right;">{goal_calories:.0f} ккал</td>
-                    </tr>
-                    <tr>
-                        <td style="padding: 10px;">Белки</td>
-                        <td style="padding: 10px; text-align: right; font-weight: bold;">{total_protein:.1f} г</td>
-                        <td style="padding: 10px; text-align: right;">{goal_protein:.1f} г</td>
-                    </tr>
-                    <tr style="background-color: #f5f5f5;">
-                        <td style="padding: 10px;">Углеводы</td>
-                        <td style="padding: 10px; text-align: right; font-weight: bold;">{total_carbs:.1f} г</td>
-                        <td style="padding: 10px; text-align: right;">{goal_carbs:.1f} г</td>
-                    </tr>
-                    <tr>
-                        <td style="padding: 10px;">Жиры</td>
-                        <td style="padding: 10px; text-align: right; font-weight: bold;">{total_fat:.1f} г</td>
-                        <td style="padding: 10px; text-align: right;">{goal_fat:.1f} г</td>
-                    </tr>
-                </table>
-                
-                <p style="margin-top: 30px;">
-                    <a href="http://localhost:3000/diary" 
-                       style="background-color: #1976D2; color: white; padding: 10px 20px; 
-                              text-decoration: none; border-radius: 5px; display: inline-block;">
-                        Открыть дневник питания
-                    </a>
-                </p>
-            </div>
-        </body>
-        </html>
-        """
-        
-        plain_message = strip_tags(html_message)
-        
-        from_email = getattr(settings, 'DEFAULT_FROM_EMAIL', 'noreply@fooddiary.com')
-        
-        send_mail(
-            subject=subject,
-            message=plain_message,
-            from_email=from_email,
-            recipient_list=[user.email],
-            html_message=html_message,
-            fail_silently=False,
-        )
-        
+        message.send(fail_silently=False)
         return True
-        
     except Exception as e:
-        import logging
-        logger = logging.getLogger(__name__)
         logger.error(f"Error sending daily summary email to {user.email}: {e}", exc_info=True)
         return False
 
+
+def send_daily_summary_emails(users: Iterable, batch_size: int = 100) -> int:
+    """
+    Send daily summary emails to many users over a single mail connection
+
+    Messages are built and sent in batches so a nightly digest job keeps one
+    SMTP session open instead of reconnecting per recipient.
+
+    Args:
+        users: Iterable of User objects
+        batch_size: Number of messages sent per send_messages() call
+
+    Returns:
+        int: Number of emails sent
+    """
+    sent = 0
+    connection = get_connection(fail_silently=False)
+    batch = []
+    with connection:
+        for user in users:
+            try:
+                message = build_daily_summary_message(user, connection=connection)
+            except Exception as e:
+                logger.error(f"Error building daily summary email for {user.email}: {e}", exc_info=True)
+                continue
+            if message is None:
+                continue
+            batch.append(message)
+            if len(batch) >= batch_size:
+                sent += _send_batch(connection, batch)
+                batch = []
+        if batch:
+            sent += _send_batch(connection, batch)
+    return sent
+
+
+def _send_batch(connection, messages) -> int:
+    try:
+        return connection.send_messages(messages) or 0
+    except Exception as e:
+        logger.error(f"Error sending daily summary batch of {len(messages)} emails: {e}", exc_info=True)
+        return 0
@@ -0,0 +1,215 @@
+"""
+Precompiled email templates for meal reminders and daily summaries
+
+Templates are compiled once per process: the shared layout, inline styles
+and static copy are merged into a single template at import time and split
+into literal chunks and field names, so rendering a message only joins the
+per-user values into the precomputed chunks.
+"""
+from string import Formatter
+from typing import Dict, List, Tuple
+from django.utils.html import escape
+from decouple import config
+
+FRONTEND_URL = config('FRONTEND_URL', default='http://localhost:3000')
+DIARY_URL = f'{FRONTEND_URL}/diary'
+
+# Meal type labels
+MEAL_LABELS = {
+    'breakfast': 'Завтрак',
+    'lunch': 'Обед',
+    'dinner': 'Ужин',
+    'snack': 'Перекус',
+}
+
+# Inline styles shared by all templates
+BODY_STYLE = 'font-family: Arial, sans-serif; line-height: 1.6; color: #333;'
+CONTAINER_STYLE = 'max-width: 600px; margin: 0 auto; padding: 20px;'
+HEADING_STYLE = 'color: #1976D2;'
+BUTTON_STYLE = (
+    'background-color: #1976D2; color: white; padding: 10px 20px; '
+    'text-decoration: none; border-radius: 5px; display: inline-block;'
+)
+FOOTER_STYLE = 'margin-top: 20px; font-size: 12px; color: #666;'
+HEADER_CELL_STYLE = 'padding: 10px; text-align: {align};'
+CELL_STYLE = 'padding: 10px;'
+VALUE_CELL_STYLE = 'padding: 10px; text-align: right; font-weight: bold;'
+GOAL_CELL_STYLE = 'padding: 10px; text-align: right;'
+STRIPE_STYLE = 'background-color: #f5f5f5;'
+
+
+def _literal(text: str) -> str:
+    """Escape braces so static text survives template compilation"""
+    return text.replace('{', '{{').replace('}', '}}')
+
+
+def _layout(heading: str, content: str, footer: str = '') -> str:
+    """Wrap template content in the shared HTML layout"""
+    footer_html = f'\n        <p style="{FOOTER_STYLE}">{footer}</p>' if footer else ''
+    return _literal(f"""<html>
+<body style="{BODY_STYLE}">
+    <div style="{CONTAINER_STYLE}">
+        <h2 style="{HEADING_STYLE}">{heading}</h2>
+""") + content + _literal(f"""
+        <p style="margin-top: 30px;">
+            <a href="{DIARY_URL}" style="{BUTTON_STYLE}">Открыть дневник питания</a>
+        </p>{footer_html}
+    </div>
+</body>
+</html>
+""")
+
+
+class EmailTemplate:
+    """
+    Email template compiled once into literal chunks and field names
+
+    Subject and plain-text bodies are rendered with raw values, the HTML body
+    with HTML-escaped values. Fields listed in ``safe_fields`` hold markup
+    produced by this module and are inserted into the HTML body unescaped.
+    """
+
+    def __init__(self, subject: str, html: str, text: str, safe_fields: Tuple[str, ...] = ()):
+        self.subject = self._compile(subject)
+        self.html = self._compile(html)
+        self.text = self._compile(text)
+        self.safe_fields = frozenset(safe_fields)
+
+    @staticmethod
+    def _compile(template: str) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+        """Split a str.format template into literal chunks and field names"""
+        literals: List[str] = []
+        fields: List[str] = []
+        pending = ''
+        for literal, field, format_spec, conversion in Formatter().parse(template):
+            if format_spec or conversion:
+                raise ValueError(f'Format specs are not supported in email templates: {field}')
+            pending += literal
+            if field is not None:
+                literals.append(pending)
+                fields.append(field)
+                pending = ''
+        literals.append(pending)
+        return tuple(literals), tuple(fields)
+
+    @staticmethod
+    def _join(compiled, values: Dict[str, str]) -> str:
+        literals, fields = compiled
+        parts = []
+        for literal, field in zip(literals, fields):
+            parts.append(literal)
+            parts.append(values[field])
+        parts.append(literals[-1])
+        return ''.join(parts)
+
+    def render(self, **context) -> Tuple[str, str, str]:
+        """
+        Render the template for one recipient
+
+        Returns:
+            Tuple of (subject, plain-text body, HTML body)
+        """
+        values = {key: str(value) for key, value in context.items()}
+        html_values = {
+            key: value if key in self.safe_fields else escape(value)
+            for key, value in values.items()
+        }
+        return (
+            self._join(self.subject, values),
+            self._join(self.text, values),
+            self._join(self.html, html_values),
+        )
+
+
+# Meal reminder
+REMINDER_LOGGED_HTML = '<p style="color: #4CAF50; font-weight: bold;">✓ Вы уже добавили этот прием пищи сегодня. Отлично!</p>'
+REMINDER_NOT_LOGGED_HTML = '<p>Не забудьте добавить прием пищи в ваш дневник питания.</p>'
+REMINDER_LOGGED_TEXT = '✓ Вы уже добавили этот прием пищи сегодня. Отлично!'
+REMINDER_NOT_LOGGED_TEXT = 'Не забудьте добавить прием пищи в ваш дневник питания.'
+REMINDER_FOOTER = (
+    'Вы получили это письмо, потому что включили email-уведомления в настройках. '
+    'Вы можете отключить их в любое время в настройках приложения.'
+)
+
+MEAL_REMINDER_TEMPLATE = EmailTemplate(
+    subject='Напоминание: {meal_label}',
+    html=_layout(
+        'Напоминание о приеме пищи',
+        """        <p>Здравствуйте, {user_name}!</p>
+        <p>Напоминаем вам о времени <strong>{meal_label_lower}</strong> в {meal_time}.</p>
+        {logged_note_html}""",
+        footer=REMINDER_FOOTER,
+    ),
+    text=_literal('Напоминание о приеме пищи\n\n') + """Здравствуйте, {user_name}!
+
+Напоминаем вам о времени {meal_label_lower} в {meal_time}.
+{logged_note_text}
+
+""" + _literal(f'Открыть дневник питания: {DIARY_URL}\n\n{REMINDER_FOOTER}\n'),
+    safe_fields=('logged_note_html',),
+)
+
+
+# Daily summary
+SUMMARY_ROWS = (
+    ('calories', 'Калории', 'ккал'),
+    ('protein', 'Белки', 'г'),
+    ('carbs', 'Углеводы', 'г'),
+    ('fat', 'Жиры', 'г'),
+)
+
+
+def _summary_table() -> str:
+    header = _literal(
+        '        <table style="width: 100%; border-collapse: collapse; margin: 20px 0;">\n'
+        '            <tr style="background-color: #1976D2; color: white;">\n'
+        f'                <th style="{HEADER_CELL_STYLE.format(align="left")}">Показатель</th>\n'
+        f'                <th style="{HEADER_CELL_STYLE.format(align="right")}">Получено</th>\n'
+        f'                <th style="{HEADER_CELL_STYLE.format(align="right")}">Цель</th>\n'
+        '            </tr>\n'
+    )
+    rows = []
+    for index, (key, label, _unit) in enumerate(SUMMARY_ROWS):
+        row_style = f' style="{STRIPE_STYLE}"' if index % 2 == 0 else ''
+        rows.append(
+            _literal(f'            <tr{row_style}>\n'
+                     f'                <td style="{CELL_STYLE}">{label}</td>\n'
+                     f'                <td style="{VALUE_CELL_STYLE}">')
+            + f'{{{key}_total}}'
+            + _literal(f'</td>\n                <td style="{GOAL_CELL_STYLE}">')
+            + f'{{{key}_goal}}'
+            + _literal('</td>\n            </tr>\n')
+        )
+    return header + ''.join(rows) + _literal('        </table>')
+
+
+def _summary_text() -> str:
+    lines = [f'{label}: {{{key}_total}} (цель: {{{key}_goal}})' for key, label, _unit in SUMMARY_ROWS]
+    return '\n'.join(lines)
+
+
+DAILY_SUMMARY_TEMPLATE = EmailTemplate(
+    subject='Итоги дня: {date}',
+    html=_layout(
+        'Итоги дня',
+        """        <p>Здравствуйте, {user_name}!</p>
+        <p>Вот ваша статистика питания за {date}:</p>
+""" + _summary_table(),
+    ),
+    text=_literal('Итоги дня\n\n') + """Здравствуйте, {user_name}!
+
+Вот ваша статистика питания за {date}:
+
+""" + _summary_text() + _literal(f'\n\nОткрыть дневник питания: {DIARY_URL}\n'),
+)
+
+
+def summary_context(totals: Dict[str, float], goals: Dict[str, float] = None) -> Dict[str, str]:
+    """Format nutrient totals and goals into daily summary template fields"""
+    context = {}
+    for key, _label, unit in SUMMARY_ROWS:
+        precision = 0 if key == 'calories' else 1
+        context[f'{key}_total'] = f'{totals.get(key, 0):.{precision}f} {unit}'
+        goal = goals.get(key) if goals else None
+        context[f'{key}_goal'] = f'{goal:.{precision}f} {unit}' if goal is not None else '-'
+    return context
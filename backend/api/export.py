@@ -0,0 +1,166 @@
+"""
+Streaming export of a user's diary as CSV or NDJSON
+
+Rows are read with values_list().iterator(chunk_size=...) and written to the
+response one at a time, so exporting a multi-year history keeps memory
+constant instead of loading every model instance.
+
+Under ASGI Django consumes a sync streaming_content with sync_to_async(list),
+building the whole export before the first byte is sent; the view then wraps
+the lines in aiter_lines, which pulls them EXPORT_CHUNK_SIZE at a time in a
+worker thread.
+"""
+import csv
+import json
+from itertools import islice
+from asgiref.sync import sync_to_async
+from django.db.models import F, FloatField, Sum
+from django.db.models.functions import Coalesce
+from .models import Meal, WeightEntry, WaterIntake, FastingSession, RecipeIngredient, Recipe
+
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_DATASETS = ('meals', 'weight', 'water', 'fasting')
+
+# Unified CSV columns shared by all record types
+CSV_COLUMNS = [
+    'record_type', 'date', 'meal_type', 'name', 'quantity', 'calories', 'protein', 'carbs', 'fat',
+    'weight_kg', 'amount_ml', 'start_time', 'end_time', 'duration_minutes', 'is_active', 'notes',
+]
+
+
+def recipe_per_serving(meals):
+    """
+    Per-serving (calories, protein, carbs, fat) of recipes referenced by a Meal queryset
+
+    One aggregate query; the result size is bounded by the number of recipes.
+    """
+    recipe_ids = meals.filter(recipe__isnull=False).values('recipe_id')
+    servings = dict(Recipe.objects.filter(id__in=recipe_ids).values_list('id', 'servings'))
+    totals = RecipeIngredient.objects.filter(recipe_id__in=recipe_ids).values('recipe_id').annotate(
+        calories=Sum(F('food__calories') * F('quantity') / 100, output_field=FloatField()),
+        protein=Sum(F('food__protein') * F('quantity') / 100, output_field=FloatField()),
+        carbs=Sum(F('food__carbs') * F('quantity') / 100, output_field=FloatField()),
+        fat=Sum(F('food__fat') * F('quantity') / 100, output_field=FloatField()),
+    )
+    per_serving = {recipe_id: (0.0, 0.0, 0.0, 0.0) for recipe_id in servings}
+    for row in totals:
+        count = servings.get(row['recipe_id']) or 0
+        if count > 0:
+            per_serving[row['recipe_id']] = tuple(
+                (row[key] or 0) / count for key in ('calories', 'protein', 'carbs', 'fat')
+            )
+    return per_serving
+
+
+def iter_meals(user):
+    per_serving = None
+    rows = Meal.objects.filter(user=user).order_by('date', 'meal_type', 'id').values_list(
+        'date', 'meal_type', 'quantity', 'notes', 'recipe_id',
+        Coalesce('food__name', 'recipe__name'),
+        'food__calories', 'food__protein', 'food__carbs', 'food__fat',
+    )
+    for (meal_date, meal_type, quantity, notes, recipe_id, name,
+         calories, protein, carbs, fat) in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        if recipe_id:
+            if per_serving is None:
+                per_serving = recipe_per_serving(Meal.objects.filter(user=user))
+            nutrients = [value * quantity for value in per_serving.get(recipe_id, (0.0, 0.0, 0.0, 0.0))]
+        else:
+            nutrients = [(value or 0) * quantity / 100 for value in (calories, protein, carbs, fat)]
+        yield {
+            'record_type': 'meal',
+            'date': meal_date.isoformat(),
+            'meal_type': meal_type,
+            'name': name or 'Unknown',
+            'quantity': quantity,
+            'calories': round(nutrients[0], 2),
+            'protein': round(nutrients[1], 2),
+            'carbs': round(nutrients[2], 2),
+            'fat': round(nutrients[3], 2),
+            'notes': notes,
+        }
+
+
+def iter_weight(user):
+    rows = WeightEntry.objects.filter(user=user).order_by('date').values_list('date', 'weight', 'notes')
+    for entry_date, weight, notes in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield {
+            'record_type': 'weight',
+            'date': entry_date.isoformat(),
+            'weight_kg': weight,
+            'notes': notes,
+        }
+
+
+def iter_water(user):
+    rows = WaterIntake.objects.filter(user=user).order_by('date').values_list('date', 'amount_ml')
+    for entry_date, amount_ml in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield {
+            'record_type': 'water',
+            'date': entry_date.isoformat(),
+            'amount_ml': amount_ml,
+        }
+
+
+def iter_fasting(user):
+    rows = FastingSession.objects.filter(user=user).order_by('start_time').values_list(
+        'start_time', 'end_time', 'duration_minutes', 'is_active', 'notes'
+    )
+    for start_time, end_time, duration_minutes, is_active, notes in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield {
+            'record_type': 'fasting',
+            'date': start_time.date().isoformat(),
+            'start_time': start_time.isoformat(),
+            'end_time': end_time.isoformat() if end_time else None,
+            'duration_minutes': duration_minutes,
+            'is_active': is_active,
+            'notes': notes,
+        }
+
+
+DATASET_ITERATORS = {
+    'meals': iter_meals,
+    'weight': iter_weight,
+    'water': iter_water,
+    'fasting': iter_fasting,
+}
+
+
+def iter_records(user, datasets=EXPORT_DATASETS):
+    for dataset in datasets:
+        yield from DATASET_ITERATORS[dataset](user)
+
+
+class _Echo:
+    """File-like object whose write() returns the value instead of buffering it"""
+    def write(self, value):
+        return value
+
+
+def stream_csv(records):
+    writer = csv.DictWriter(_Echo(), fieldnames=CSV_COLUMNS, extrasaction='ignore')
+    yield writer.writeheader()
+    for record in records:
+        yield writer.writerow(record)
+
+
+def stream_ndjson(records):
+    for record in records:
+        yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+async def aiter_lines(lines, batch_size=EXPORT_CHUNK_SIZE):
+    """Async iterator over a sync line generator, batch_size lines per chunk read in the sync thread"""
+    def next_batch():
+        return ''.join(islice(lines, batch_size))
+
+    try:
+        while True:
+            chunk = await sync_to_async(next_batch)()
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        # Close the database cursor in the thread that opened it
+        await sync_to_async(lines.close)()
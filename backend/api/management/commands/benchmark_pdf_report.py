@@ -0,0 +1,84 @@
+"""
+Management command to benchmark nutrition PDF report rendering
+Measures per-report CPU and wall time of build_nutrition_report
+"""
+import time
+from datetime import date, timedelta
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from api import pdf_generator
+
+
+class Command(BaseCommand):
+    help = 'Benchmark nutrition PDF report rendering (per-report CPU time)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=str,
+            help='Username whose diary is rendered (default: user with most meals)',
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            nargs='+',
+            default=[7, 30, 90],
+            help='Report lengths in days to benchmark (default: 7 30 90)',
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=10,
+            help='Reports rendered per report length (default: 10)',
+        )
+        parser.add_argument(
+            '--cold',
+            action='store_true',
+            help='Rebuild fonts and styles for every report, as before the shared render context',
+        )
+
+    def handle(self, *args, **options):
+        user = self.get_user(options.get('user'))
+        iterations = max(1, options['iterations'])
+        cold = options['cold']
+        end_date = date.today()
+
+        mode = 'cold (per-report setup)' if cold else 'warm (shared render context)'
+        self.stdout.write(f'Benchmarking reports for {user.username}, {iterations} iterations, {mode}')
+
+        # Warm up the render context and database connection
+        pdf_generator.build_nutrition_report(user, end_date, end_date)
+
+        for days in options['days']:
+            start_date = end_date - timedelta(days=days)
+            cpu_total = 0.0
+            wall_total = 0.0
+            size = 0
+            for _ in range(iterations):
+                if cold:
+                    pdf_generator._render_context = None
+                cpu_start = time.process_time()
+                wall_start = time.perf_counter()
+                pdf = pdf_generator.build_nutrition_report(user, start_date, end_date)
+                cpu_total += time.process_time() - cpu_start
+                wall_total += time.perf_counter() - wall_start
+                size = len(pdf)
+
+            self.stdout.write(
+                f'  {days:>3} days: {cpu_total / iterations * 1000:8.1f} ms CPU/report, '
+                f'{wall_total / iterations * 1000:8.1f} ms wall/report, {size} bytes'
+            )
+
+    def get_user(self, username):
+        User = get_user_model()
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f'User not found: {username}')
+
+        from django.db.models import Count
+        user = User.objects.annotate(meal_count=Count('meals')).order_by('-meal_count').first()
+        if not user:
+            raise CommandError('No users found. Create a user with diary entries or pass --user')
+        return user
@@ -0,0 +1,67 @@
+"""
+Management command to benchmark USDA food parsing
+Measures per-food time of the shared nutrient mapping over a dataset file
+"""
+import time
+from pathlib import Path
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from api.usda_parser import extract_nutrients, parse_usda_food
+from api.usda_stream import iter_dataset_streams, iter_json_array
+
+DEFAULT_FILE = Path('data') / 'usda' / 'foundation_foods.zip'
+
+
+class Command(BaseCommand):
+    help = 'Benchmark USDA food parsing (per-food CPU time of the nutrient mapping)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--file',
+            type=str,
+            help=f'USDA JSON dataset (.json, .json.gz or .zip) to parse (default: {DEFAULT_FILE})',
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=20,
+            help='Passes over the dataset (default: 20)',
+        )
+
+    def handle(self, *args, **options):
+        path = Path(options.get('file') or Path(settings.BASE_DIR) / DEFAULT_FILE)
+        if not path.exists():
+            raise CommandError(f'File not found: {path}')
+        iterations = max(1, options['iterations'])
+
+        # Decode once up front: only the parsing is measured
+        foods = [food for _, stream in iter_dataset_streams(path) for food in iter_json_array(stream)]
+        if not foods:
+            raise CommandError(f'No foods found in {path}')
+        nutrient_count = sum(len(food.get('foodNutrients') or []) for food in foods)
+        self.stdout.write(
+            f'Benchmarking {len(foods)} foods ({nutrient_count} nutrient entries), {iterations} iterations'
+        )
+
+        for label, parse in (
+            ('extract_nutrients', lambda food: extract_nutrients(food.get('foodNutrients') or [])),
+            ('parse_usda_food', parse_usda_food),
+        ):
+            cpu_start = time.process_time()
+            for _ in range(iterations):
+                for food in foods:
+                    parse(food)
+            cpu_total = time.process_time() - cpu_start
+            per_food = cpu_total / (iterations * len(foods))
+            self.stdout.write(
+                f'  {label:<18} {per_food * 1e6:8.1f} us/food, '
+                f'{per_food * len(foods) * 1000:8.1f} ms/pass'
+            )
+
+        # Mapping coverage, so a broken mapping shows up next to the timings
+        parsed = [parse_usda_food(food) for food in foods]
+        parsed = [fields for fields in parsed if fields]
+        self.stdout.write(f'  parsed {len(parsed)}/{len(foods)} foods')
+        for field in ('calories', 'protein', 'fat', 'carbs', 'fiber', 'sugar', 'sodium'):
+            found = sum(1 for fields in parsed if fields.get(field))
+            self.stdout.write(f'    {field:<9} {found:>6} foods')
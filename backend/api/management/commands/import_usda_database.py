@@ -3,24 +3,66 @@ Management command to download and import USDA FoodData Central database
 Downloads Foundation Foods and SR Legacy datasets and imports them into local database
 """
 import os
+import csv
 import json
-import zipfile
+import time
 import requests
-from io import BytesIO
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
-from api.models import Food
+from django.utils import timezone
+from api.models import Food, USDAImportCheckpoint
+from api.usda_csv import bundle_content_hash, is_csv_bundle, iter_csv_foods
+from api.usda_parser import iter_parsed_foods_parallel, parse_usda_food
+from api.usda_stream import file_content_hash, iter_dataset_streams, iter_json_array_items
 
-# Try to import tqdm for progress bar, but make it optional
-try:
-    from tqdm import tqdm
-    HAS_TQDM = True
-except ImportError:
-    HAS_TQDM = False
-    # Simple progress function if tqdm is not available
-    def tqdm(iterable, desc=''):
-        print(f'{desc}...')
-        return iterable
+# Foods written per INSERT ... ON CONFLICT statement and per transaction
+DEFAULT_BATCH_SIZE = 1000
+
+# Columns overwritten when an imported food already exists (created_at is kept)
+UPSERT_FIELDS = [
+    'name', 'brand', 'description', 'data_source',
+    'calories', 'protein', 'carbs', 'fat', 'fiber', 'sugar', 'sodium',
+    'usda_data_type', 'content_hash', 'updated_at',
+]
+
+# Seconds between progress lines
+PROGRESS_INTERVAL = 10
+
+
+class ImportProgress:
+    """Counters, stage timings and resume position of one import run"""
+
+    def __init__(self, checkpoint):
+        # Counts continue from the checkpoint when an import is resumed
+        self.created = checkpoint.created_count
+        self.updated = checkpoint.updated_count
+        self.skipped = checkpoint.skipped_count
+        self.errors = checkpoint.error_count
+        self.failed_ids = list(checkpoint.failed_fdc_ids)
+        self.start_index = checkpoint.record_index
+        self.offset = checkpoint.offset
+        self.record_index = checkpoint.record_index
+        self.records = 0  # read in this run
+        self.parse_time = 0.0  # waiting for parsed foods: read, decode and parse
+        self.write_time = 0.0  # batch upserts and checkpoint commits
+        self.started = time.perf_counter()
+
+    def advance(self, offset):
+        """Count a record read; offset (when known) is where it ends in the input"""
+        self.records += 1
+        if offset is not None:
+            self.offset = offset
+            self.record_index = self.start_index + self.records
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.started
+        rate = self.records / elapsed if elapsed > 0 else 0
+        return (
+            f'{self.start_index + self.records:,} records ({rate:,.0f} rows/s) | '
+            f'parse {self.parse_time:.1f} s, write {self.write_time:.1f} s | '
+            f'created {self.created:,}, updated {self.updated:,}, '
+            f'skipped {self.skipped:,}, errors {self.errors:,}'
+        )
 
 
 class Command(BaseCommand):
@@ -35,37 +77,70 @@ class Command(BaseCommand):
         parser.add_argument(
             '--file',
             type=str,
-            help='Path to local USDA JSON file to import (skips download)',
+            help='Path to local USDA JSON file (.json, .json.gz or .zip) or CSV bundle '
+                 '(directory or .zip with food.csv) to import (skips download)',
         )
         parser.add_argument(
             '--limit',
             type=int,
             default=None,
-            help='Limit number of foods to import (for testing)',
+            help='Limit number of foods to import (for testing); with parser workers '
+                 'the import stops at the end of the piece holding the last one',
         )
         parser.add_argument(
             '--skip-existing',
             action='store_true',
             help='Skip foods that already exist in database',
         )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f'Foods upserted and committed per batch (default: {DEFAULT_BATCH_SIZE})',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Parser processes; 1 parses in this process, 0 uses one per CPU (default: 1)',
+        )
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            help='Continue an interrupted import of the same file from its last checkpoint',
+        )
+        parser.add_argument(
+            '--sync',
+            action='store_true',
+            help='Apply a new release as a diff: write only new and changed foods, '
+                 'delete foods of the same datasets that are no longer in the release',
+        )
 
     def handle(self, *args, **options):
         download = options['download']
         file_path = options.get('file')
         limit = options.get('limit')
         skip_existing = options['skip_existing']
+        batch_size = max(1, options['batch_size'])
+        workers = options['workers'] if options['workers'] > 0 else (os.cpu_count() or 1)
+        resume = options['resume']
+        sync = options['sync']
+
+        if sync and skip_existing:
+            self.stdout.write(self.style.ERROR('--sync cannot be combined with --skip-existing'))
+            return
 
         if file_path:
             # Import from local file
             self.stdout.write(f'Importing from local file: {file_path}')
-            self.import_from_file(file_path, limit, skip_existing)
+            self.import_from_file(file_path, limit, skip_existing, batch_size, workers, resume, sync)
         elif download:
             # Download and import
             self.stdout.write('Downloading USDA database...')
             downloaded_files = self.download_usda_database()
             for file_path in downloaded_files:
                 self.stdout.write(f'Importing from: {file_path}')
-                self.import_from_file(file_path, limit, skip_existing)
+                self.import_from_file(file_path, limit, skip_existing, batch_size, workers, resume, sync)
         else:
             self.stdout.write(
                 self.style.ERROR(
@@ -76,13 +151,13 @@ class Command(BaseCommand):
                 'Example: python manage.py import_usda_database --download'
             )
             self.stdout.write(
-                'Or: python manage.py import_usda_database --file /path/to/foundation_foods.json'
+                'Or: python manage.py import_usda_database --file data/usda/foundation_foods.zip'
             )
 
     def download_usda_database(self):
         """
         Download USDA FoodData Central database files
-        Returns list of downloaded file paths
+        Returns list of downloaded archive paths (imported without extraction)
         """
         # USDA download URLs (these may need to be updated)
         # Foundation Foods - smaller, more curated dataset
@@ -101,8 +176,7 @@ class Command(BaseCommand):
             self.stdout.write('Downloading Foundation Foods dataset...')
             file_path = self.download_file(foundation_url, download_dir, 'foundation_foods.zip')
             if file_path:
-                extracted = self.extract_zip(file_path, download_dir)
-                downloaded_files.extend(extracted)
+                downloaded_files.append(file_path)
         except Exception as e:
             self.stdout.write(
                 self.style.WARNING(f'Failed to download Foundation Foods: {e}')
@@ -148,215 +222,368 @@ class Command(BaseCommand):
             )
             return None
 
-    def extract_zip(self, zip_path, extract_dir):
-        """Extract ZIP file and return list of extracted JSON files"""
-        extracted_files = []
-        try:
-            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                zip_ref.extractall(extract_dir)
-                for file_info in zip_ref.namelist():
-                    if file_info.endswith('.json'):
-                        extracted_files.append(os.path.join(extract_dir, file_info))
-            self.stdout.write(self.style.SUCCESS(f'Extracted: {len(extracted_files)} JSON files'))
-        except Exception as e:
-            self.stdout.write(
-                self.style.ERROR(f'Error extracting {zip_path}: {e}')
-            )
-        return extracted_files
+    def import_from_file(self, file_path, limit=None, skip_existing=False, batch_size=DEFAULT_BATCH_SIZE,
+                         workers=1, resume=False, sync=False):
+        """
+        Import foods from a USDA JSON file, gzip file or zip archive
 
-    def import_from_file(self, file_path, limit=None, skip_existing=False):
-        """Import foods from USDA JSON file"""
+        Progress is checkpointed per batch, keyed by the file's content hash,
+        so a run with resume=True continues after the last committed batch.
+        With sync=True the file is applied as a diff against the catalog.
+        """
         if not os.path.exists(file_path):
             self.stdout.write(
                 self.style.ERROR(f'File not found: {file_path}')
             )
             return
+
+        if is_csv_bundle(file_path):
+            self.import_csv_bundle(file_path, limit, skip_existing, batch_size, resume, sync)
+            return
         
         self.stdout.write(f'Reading file: {file_path}')
+        content_hash = file_content_hash(file_path)
         
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            # USDA JSON structure: {"FoundationFoods": [...]} or {"SRLegacyFoods": [...]}
-            foods_data = []
-            if 'FoundationFoods' in data:
-                foods_data = data['FoundationFoods']
-            elif 'SRLegacyFoods' in data:
-                foods_data = data['SRLegacyFoods']
-            elif isinstance(data, list):
-                foods_data = data
-            else:
-                # Try to find any array in the data
-                for key, value in data.items():
-                    if isinstance(value, list):
-                        foods_data = value
-                        break
-            
-            if not foods_data:
-                self.stdout.write(
-                    self.style.ERROR('No food data found in file')
-                )
-                return
-            
-            total = len(foods_data)
-            if limit:
-                foods_data = foods_data[:limit]
-                self.stdout.write(f'Limited to {limit} foods (out of {total} total)')
-            else:
-                self.stdout.write(f'Found {total} foods to import')
-            
-            created_count = 0
-            updated_count = 0
-            skipped_count = 0
-            error_count = 0
-            
-            with transaction.atomic():
-                for food_data in tqdm(foods_data, desc='Importing foods'):
-                    try:
-                        parsed = self.parse_usda_food(food_data)
-                        if not parsed:
-                            skipped_count += 1
-                            continue
-                        
-                        fdc_id = parsed.get('usda_fdc_id')
-                        if not fdc_id:
-                            skipped_count += 1
-                            continue
-                        
-                        # Check if food already exists
-                        if skip_existing:
-                            existing = Food.objects.filter(usda_fdc_id=fdc_id).first()
-                            if existing:
-                                skipped_count += 1
-                                continue
-                        
-                        food, created = Food.objects.update_or_create(
-                            usda_fdc_id=fdc_id,
-                            defaults=parsed
-                        )
-                        
-                        if created:
-                            created_count += 1
-                        else:
-                            updated_count += 1
-                    
-                    except Exception as e:
-                        error_count += 1
-                        if error_count <= 5:  # Show first 5 errors
-                            self.stdout.write(
-                                self.style.WARNING(f'Error importing food: {e}')
-                            )
-            
-            self.stdout.write('')
-            self.stdout.write(
-                self.style.SUCCESS(
-                    f'\nImport complete! Created: {created_count}, Updated: {updated_count}, '
-                    f'Skipped: {skipped_count}, Errors: {error_count}'
-                )
-            )
+            # Zip members and gzip files are decompressed on the fly
+            for member, f in iter_dataset_streams(file_path):
+                if member:
+                    self.stdout.write(f'Reading archive member: {member}')
+
+                checkpoint = self.get_checkpoint(file_path, member, content_hash, resume)
+                if checkpoint.status == 'completed':
+                    self.stdout.write(f'Already imported ({checkpoint.record_index} records), skipping')
+                    continue
+                if checkpoint.record_index:
+                    self.stdout.write(f'Resuming after record {checkpoint.record_index}')
+
+                # Foods are decoded incrementally from the top-level array
+                # ({"FoundationFoods": [...]}, {"SRLegacyFoods": [...]}, a bare list, ...)
+                if workers > 1:
+                    # Reader -> parser processes -> this process as the only writer
+                    self.stdout.write(f'Parsing with {workers} worker processes')
+                    parsed_foods = iter_parsed_foods_parallel(f, workers, resume_offset=checkpoint.offset)
+                else:
+                    parsed_foods = (
+                        (end, parse_usda_food(food))
+                        for end, food in iter_json_array_items(f, resume_offset=checkpoint.offset)
+                    )
+                if limit:
+                    self.stdout.write(f'Limited to {limit} foods')
+                else:
+                    self.stdout.write('Streaming foods from file')
+                try:
+                    self.import_foods(parsed_foods, checkpoint, skip_existing, batch_size, limit, sync)
+                finally:
+                    parsed_foods.close()
         
         except json.JSONDecodeError as e:
             self.stdout.write(
                 self.style.ERROR(f'Invalid JSON file: {e}')
             )
+        except CommandError:
+            raise
         except Exception as e:
             self.stdout.write(
                 self.style.ERROR(f'Error reading file: {e}')
             )
 
-    def parse_usda_food(self, usda_food):
-        """Parse USDA food data into our Food model format"""
+    def import_csv_bundle(self, path, limit=None, skip_existing=False, batch_size=DEFAULT_BATCH_SIZE,
+                          resume=False, sync=False):
+        """
+        Import foods from a USDA CSV bundle (food.csv, food_nutrient.csv, nutrient.csv)
+
+        The nutrient table is pivoted into columns up front (see api.usda_csv);
+        batching, checkpoints and sync work as for JSON files, with the number
+        of foods read as the resume position.
+        """
+        self.stdout.write(f'Reading CSV bundle: {path}')
+        checkpoint = self.get_checkpoint(path, 'food.csv', bundle_content_hash(path), resume)
+        if checkpoint.status == 'completed':
+            self.stdout.write(f'Already imported ({checkpoint.record_index} records), skipping')
+            return
+        if checkpoint.record_index:
+            self.stdout.write(f'Resuming after record {checkpoint.record_index}')
+        if limit:
+            self.stdout.write(f'Limited to {limit} foods')
+
+        parsed_foods = iter_csv_foods(path, resume_offset=checkpoint.offset)
         try:
-            fdc_id = usda_food.get('fdcId')
-            description = usda_food.get('description', '')
-            
-            if not fdc_id or not description:
-                return None
-            
-            # Extract nutrients
-            nutrients = {}
-            food_nutrients = usda_food.get('foodNutrients', [])
-            
-            for nutrient in food_nutrients:
-                if isinstance(nutrient, dict):
-                    nutrient_info = nutrient.get('nutrient', {})
-                    if not nutrient_info:
-                        nutrient_info = nutrient
-                    
-                    nutrient_id = (
-                        nutrient_info.get('id') or 
-                        nutrient_info.get('number') or 
-                        nutrient_info.get('nutrientId') or
-                        nutrient.get('nutrientId') or
-                        nutrient.get('id')
-                    )
-                    
-                    amount = (
-                        nutrient.get('amount') or 
-                        nutrient.get('value') or
-                        nutrient_info.get('amount') or
-                        nutrient_info.get('value')
-                    )
-                    
-                    if not nutrient_id or amount is None:
-                        continue
-                    
-                    try:
-                        amount = float(amount)
-                    except (ValueError, TypeError):
-                        continue
-                    
-                    # Map USDA nutrient IDs
-                    if nutrient_id == 208 or nutrient_id == '208':
-                        nutrients['calories'] = amount
-                    elif nutrient_id == 203 or nutrient_id == '203':
-                        nutrients['protein'] = amount
-                    elif nutrient_id == 204 or nutrient_id == '204':
-                        nutrients['fat'] = amount
-                    elif nutrient_id == 205 or nutrient_id == '205':
-                        nutrients['carbs'] = amount
-                    elif nutrient_id == 291 or nutrient_id == '291':
-                        nutrients['fiber'] = amount
-                    elif nutrient_id == 269 or nutrient_id == '269':
-                        nutrients['sugar'] = amount
-                    elif nutrient_id == 307 or nutrient_id == '307':
-                        nutrients['sodium'] = amount
-            
-            # Set defaults for missing nutrients
-            if 'calories' not in nutrients:
-                nutrients['calories'] = 0
-            if 'protein' not in nutrients:
-                nutrients['protein'] = 0
-            if 'carbs' not in nutrients:
-                nutrients['carbs'] = 0
-            if 'fat' not in nutrients:
-                nutrients['fat'] = 0
-            if 'fiber' not in nutrients:
-                nutrients['fiber'] = 0
-            
-            # Clean description
-            name = description.split(',')[0].strip() if ',' in description else description.strip()
-            brand = ''
-            if ',' in description:
-                parts = description.split(',')
-                if len(parts) > 1:
-                    brand = parts[-1].strip()
-            
-            return {
-                'name': name[:200],
-                'brand': brand[:100] if brand else '',
-                'description': description[:500] if description else '',
-                'usda_fdc_id': fdc_id,
-                'data_source': 'usda',
-                'calories': max(0, nutrients.get('calories', 0)),
-                'protein': max(0, nutrients.get('protein', 0)),
-                'carbs': max(0, nutrients.get('carbs', 0)),
-                'fat': max(0, nutrients.get('fat', 0)),
-                'fiber': max(0, nutrients.get('fiber', 0)),
-                'sugar': nutrients.get('sugar') if nutrients.get('sugar') else None,
-                'sodium': nutrients.get('sodium') if nutrients.get('sodium') else None,
+            self.import_foods(parsed_foods, checkpoint, skip_existing, batch_size, limit, sync)
+        except (csv.Error, ValueError) as e:
+            self.stdout.write(
+                self.style.ERROR(f'Invalid CSV bundle: {e}')
+            )
+        except CommandError:
+            raise
+        except Exception as e:
+            self.stdout.write(
+                self.style.ERROR(f'Error reading file: {e}')
+            )
+        finally:
+            parsed_foods.close()
+
+    def get_checkpoint(self, file_path, member, content_hash, resume=False):
+        """Return the checkpoint to continue from, or a fresh one"""
+        if resume:
+            checkpoint = USDAImportCheckpoint.objects.filter(content_hash=content_hash, member=member).first()
+            if checkpoint:
+                return checkpoint
+            self.stdout.write('No checkpoint found for this file, starting from the beginning')
+
+        checkpoint, _ = USDAImportCheckpoint.objects.update_or_create(
+            content_hash=content_hash,
+            member=member,
+            defaults={
+                'source': str(file_path),
+                'offset': 0,
+                'record_index': 0,
+                'created_count': 0,
+                'updated_count': 0,
+                'skipped_count': 0,
+                'error_count': 0,
+                'failed_fdc_ids': [],
+                'status': 'running',
+                'completed_at': None,
             }
+        )
+        return checkpoint
+
+    def import_foods(self, parsed_foods, checkpoint, skip_existing=False, batch_size=DEFAULT_BATCH_SIZE, limit=None,
+                     sync=False):
+        """
+        Import (end offset, parsed food) pairs; None foods are counted as skipped
+
+        Foods are collected into batches keyed by usda_fdc_id and each batch is
+        upserted and committed on its own (see write_batch), so the database
+        sees a few queries per batch instead of several per food. The
+        checkpoint is advanced in the same transaction as each batch.
+
+        The checkpoint only ever points at a record boundary: batches are
+        flushed, and --limit stops, where the input position is known (every
+        record when parsing in-process, the end of each piece with parser
+        workers), so a resumed run never writes or counts a record twice.
+
+        In sync mode unchanged foods are counted as skipped, and after a
+        complete pass over the release the foods it no longer contains are
+        deleted (see delete_retired_foods).
+        """
+        progress = ImportProgress(checkpoint)
+        batch = {}
+        seen_ids = set()
+        data_types = set()
+        exhausted = True
+        last_report = time.perf_counter()
+
+        parse_started = time.perf_counter()
+        for offset, parsed in parsed_foods:
+            progress.parse_time += time.perf_counter() - parse_started
+            progress.advance(offset)
+
+            if not parsed or not parsed.get('usda_fdc_id'):
+                progress.skipped += 1
+            else:
+                # A later duplicate within the batch wins, as with sequential updates
+                batch[parsed['usda_fdc_id']] = parsed
+                if sync:
+                    seen_ids.add(parsed['usda_fdc_id'])
+                    data_types.add(parsed['usda_data_type'])
+            # Flush only where the input position is known so the checkpoint
+            # covers exactly the committed records
+            if len(batch) >= batch_size and offset is not None:
+                self.flush_batch(batch, checkpoint, progress, skip_existing, sync=sync)
+
+            if time.perf_counter() - last_report >= PROGRESS_INTERVAL:
+                self.stdout.write(progress.summary())
+                last_report = time.perf_counter()
+            if limit and progress.records >= limit and offset is not None:
+                exhausted = False
+                break
+            parse_started = time.perf_counter()
+
+        self.flush_batch(batch, checkpoint, progress, skip_existing, completed=exhausted, sync=sync)
+
+        if not progress.start_index and not progress.records:
+            self.stdout.write(
+                self.style.ERROR('No food data found in file')
+            )
+            return
+
+        self.stdout.write(progress.summary())
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'\nImport complete! Created: {progress.created}, Updated: {progress.updated}, '
+                f'Skipped: {progress.skipped}, Errors: {progress.errors}'
+            )
+        )
+        if not exhausted:
+            self.stdout.write('Stopped at --limit; continue with --resume')
+
+        if sync:
+            if exhausted and not progress.start_index:
+                deleted, kept = self.delete_retired_foods(seen_ids, data_types, batch_size)
+                self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} foods no longer in the release'))
+                if kept:
+                    self.stdout.write(
+                        self.style.WARNING(f'Kept {kept} retired foods that are still used by meals or recipes')
+                    )
+            else:
+                # Ids seen before a resume point are not known to this run
+                self.stdout.write(
+                    self.style.WARNING('Deletions skipped: the release was not read in one complete pass')
+                )
+
+    def flush_batch(self, batch, checkpoint, progress, skip_existing=False, completed=False, sync=False):
+        """
+        Write a batch and advance the checkpoint in the same transaction
+
+        If the batch fails, its foods are retried one at a time; foods that
+        still fail are counted as errors and their FDC ids are kept on the
+        checkpoint. If none of them can be written (e.g. the database is
+        unavailable) the import is aborted with the checkpoint left at the
+        last committed batch, so --resume retries it.
+        """
+        started = time.perf_counter()
+        try:
+            with transaction.atomic():
+                created, updated, skipped = self.write_batch(batch, skip_existing, sync) if batch else (0, 0, 0)
+                self.save_checkpoint(
+                    checkpoint, progress, completed,
+                    created=progress.created + created,
+                    updated=progress.updated + updated,
+                    skipped=progress.skipped + skipped,
+                )
         except Exception as e:
-            return None
+            if not batch:
+                raise CommandError(f'Could not save the import checkpoint: {e}')
+            self.stdout.write(
+                self.style.WARNING(f'Error importing batch of {len(batch)} foods: {e}; retrying one food at a time')
+            )
+            created, updated, skipped, failed = self.retry_batch(batch, checkpoint, progress, skip_existing,
+                                                                 completed, sync, e)
+            if failed:
+                self.stdout.write(
+                    self.style.WARNING(f"Could not import {len(failed)} foods (FDC ids: {', '.join(map(str, failed))})")
+                )
+        progress.created += created
+        progress.updated += updated
+        progress.skipped += skipped
+        batch.clear()
+        progress.write_time += time.perf_counter() - started
 
+    def retry_batch(self, batch, checkpoint, progress, skip_existing, completed, sync, batch_error):
+        """
+        Write the foods of a failed batch one by one and advance the checkpoint
+
+        Returns (created, updated, skipped, failed FDC ids).
+        """
+        created = updated = skipped = 0
+        failed = []
+        with transaction.atomic():
+            for fdc_id, row in batch.items():
+                try:
+                    with transaction.atomic():
+                        row_created, row_updated, row_skipped = self.write_batch({fdc_id: row}, skip_existing, sync)
+                except Exception:
+                    failed.append(fdc_id)
+                    continue
+                created += row_created
+                updated += row_updated
+                skipped += row_skipped
+            if len(failed) == len(batch):
+                raise CommandError(
+                    f'Import aborted, no food of the batch could be written ({batch_error}); '
+                    f'continue with --resume once the problem is fixed'
+                )
+
+            progress.errors += len(failed)
+            progress.failed_ids.extend(failed)
+            self.save_checkpoint(
+                checkpoint, progress, completed,
+                created=progress.created + created,
+                updated=progress.updated + updated,
+                skipped=progress.skipped + skipped,
+            )
+        return created, updated, skipped, failed
+
+    def save_checkpoint(self, checkpoint, progress, completed=False, created=None, updated=None, skipped=None):
+        checkpoint.offset = progress.offset
+        checkpoint.record_index = progress.record_index
+        checkpoint.created_count = progress.created if created is None else created
+        checkpoint.updated_count = progress.updated if updated is None else updated
+        checkpoint.skipped_count = progress.skipped if skipped is None else skipped
+        checkpoint.error_count = progress.errors
+        checkpoint.failed_fdc_ids = progress.failed_ids
+        if completed:
+            checkpoint.status = 'completed'
+            checkpoint.completed_at = timezone.now()
+        checkpoint.save()
+
+    def write_batch(self, batch, skip_existing=False, sync=False):
+        """
+        Upsert a batch of parsed foods ({usda_fdc_id: fields}) in one transaction
+
+        Existing ids and content hashes are fetched with a single query (to
+        count updates, honor --skip-existing and, with sync, leave foods with
+        an unchanged content hash untouched) and the rows are written with one
+        INSERT ... ON CONFLICT (usda_fdc_id) DO UPDATE.
+        Returns (created, updated, skipped).
+        """
+        existing = dict(
+            Food.objects.filter(usda_fdc_id__in=list(batch)).values_list('usda_fdc_id', 'content_hash')
+        )
+        if sync:
+            rows = [row for fdc_id, row in batch.items() if existing.get(fdc_id) != row['content_hash']]
+        elif skip_existing:
+            rows = [row for fdc_id, row in batch.items() if fdc_id not in existing]
+        else:
+            rows = list(batch.values())
+        skipped = len(batch) - len(rows)
+        if not rows:
+            return 0, 0, skipped
+
+        with transaction.atomic():
+            Food.objects.bulk_create(
+                [Food(**row) for row in rows],
+                update_conflicts=True,
+                unique_fields=['usda_fdc_id'],
+                update_fields=UPSERT_FIELDS,
+            )
+
+        created = sum(1 for row in rows if row['usda_fdc_id'] not in existing)
+        return created, len(rows) - created, skipped
+
+    def delete_retired_foods(self, seen_ids, data_types, batch_size=DEFAULT_BATCH_SIZE):
+        """
+        Delete USDA foods of the synced datasets that are missing from the release
+
+        Only foods whose usda_data_type was seen in the release are
+        considered, so syncing Foundation Foods leaves SR Legacy and foods
+        saved from the API alone. Foods still used by meals or recipes are
+        kept, since deleting them would cascade to user data.
+        Returns (deleted, kept).
+        """
+        data_types = data_types - {''}
+        if not data_types:
+            return 0, 0
+
+        retired = [
+            food_id
+            for food_id, fdc_id in Food.objects.filter(
+                data_source='usda', usda_data_type__in=data_types
+            ).values_list('id', 'usda_fdc_id').iterator(chunk_size=batch_size)
+            if fdc_id not in seen_ids
+        ]
+        deleted = 0
+        for start in range(0, len(retired), batch_size):
+            with transaction.atomic():
+                deleted += Food.objects.filter(
+                    id__in=retired[start:start + batch_size],
+                    meals__isnull=True,
+                    recipe_ingredients__isnull=True,
+                ).delete()[0]
+        return deleted, len(retired) - deleted
+
+    def parse_usda_food(self, usda_food):
+        """Parse USDA food data into our Food model format"""
+        return parse_usda_food(usda_food)
@@ -4,6 +4,7 @@ Management command to import foods from USDA FoodData Central API
 from django.core.management.base import BaseCommand
 from django.db import transaction
 from api.models import Food
+from api.usda_enrichment import wait_for_enrichment
 from api.usda_importer import USDADataImporter
 from decouple import config
 
@@ -40,8 +41,20 @@ class Command(BaseCommand):
             action='store_true',
             help='Skip foods that already exist in database',
         )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            help='Concurrent USDA API requests (default: USDA_FETCH_WORKERS setting)',
+        )
 
     def handle(self, *args, **options):
+        try:
+            self.import_foods(options)
+        finally:
+            # Foods queued for background enrichment are fetched before the process exits
+            wait_for_enrichment()
+
+    def import_foods(self, options):
         # Check for API key
         api_key = config('USDA_API_KEY', default='')
         if not api_key:
@@ -55,7 +68,10 @@ class Command(BaseCommand):
             return
 
         try:
-            importer = USDADataImporter(api_key)
+            # Bulk import: wait for the rate limiter instead of giving up
+            importer = USDADataImporter(api_key, wait_for_quota=True)
+            if options.get('workers'):
+                importer.workers = max(1, options['workers'])
         except ValueError as e:
             self.stdout.write(self.style.ERROR(str(e)))
             return
@@ -72,24 +88,10 @@ class Command(BaseCommand):
                     foods = search_results.get('foods', [])
                     self.stdout.write(f"  Found {len(foods)} results")
                     
-                    for food in foods[:options['limit']]:
-                        parsed = importer.parse_food_data(food)
-                        if parsed:
-                            imported_foods.append(parsed)
-                            self.stdout.write(f"    [OK] Parsed: {parsed['name']}")
-                        else:
-                            # Try to get detailed data
-                            fdc_id = food.get('fdcId')
-                            if fdc_id:
-                                try:
-                                    detailed = importer.get_food_details(fdc_id)
-                                    if detailed:
-                                        parsed = importer.parse_food_data(detailed)
-                                        if parsed:
-                                            imported_foods.append(parsed)
-                                            self.stdout.write(f"    [OK] Parsed (detailed): {parsed['name']}")
-                                except Exception as e:
-                                    self.stdout.write(f"    [SKIP] Could not get details for FDC {fdc_id}: {e}")
+                    # Foods without energy data are completed with one batched fetch
+                    for parsed in importer.parse_foods(foods[:options['limit']], fetch_missing=True):
+                        imported_foods.append(parsed)
+                        self.stdout.write(f"    [OK] Parsed: {parsed['name']}")
                 except Exception as e:
                     self.stdout.write(self.style.ERROR(f"  Error searching for {search_term}: {e}"))
                     continue
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-19 08:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_reportjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='USDAImportCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(help_text='Path of the imported dataset file', max_length=500)),
+                ('member', models.CharField(blank=True, help_text='JSON member of a zip archive (blank for plain and gzip files)', max_length=255)),
+                ('content_hash', models.CharField(help_text='SHA-256 of the dataset file', max_length=64)),
+                ('offset', models.BigIntegerField(default=0, help_text='Character offset in the decoded JSON just after the last committed record')),
+                ('record_index', models.PositiveIntegerField(default=0, help_text='Records read up to offset')),
+                ('created_count', models.PositiveIntegerField(default=0)),
+                ('updated_count', models.PositiveIntegerField(default=0)),
+                ('skipped_count', models.PositiveIntegerField(default=0)),
+                ('error_count', models.PositiveIntegerField(default=0)),
+                ('status', models.CharField(choices=[('running', 'Running'), ('completed', 'Completed')], default='running', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-updated_at'],
+                'unique_together': {('content_hash', 'member')},
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-19 08:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_usdaimportcheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='food',
+            name='content_hash',
+            field=models.CharField(blank=True, help_text='Hash of the imported fields, used to sync USDA dataset releases', max_length=32),
+        ),
+        migrations.AddField(
+            model_name='food',
+            name='usda_data_type',
+            field=models.CharField(blank=True, help_text='USDA dataset of the food, e.g. Foundation, SR Legacy, Branded', max_length=50),
+        ),
+    ]
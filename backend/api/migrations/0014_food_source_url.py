@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 08:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_food_usda_sync_fields'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='food',
+            name='source_url',
+            field=models.URLField(blank=True, db_index=True, help_text='Normalized URL of the page the food was imported from', max_length=500),
+        ),
+    ]
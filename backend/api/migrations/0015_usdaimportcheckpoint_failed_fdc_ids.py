@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_food_source_url'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usdaimportcheckpoint',
+            name='failed_fdc_ids',
+            field=models.JSONField(blank=True, default=list, help_text='FDC ids of records that could not be written'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 14:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_usdaimportcheckpoint_failed_fdc_ids'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportjob',
+            name='owner',
+            field=models.CharField(blank=True, help_text='host:pid of the process whose worker pool runs the job', max_length=300),
+        ),
+    ]
@@ -23,6 +23,9 @@ class Food(models.Model):
         ],
         default='manual'
     )
+    usda_data_type = models.CharField(max_length=50, blank=True, help_text="USDA dataset of the food, e.g. Foundation, SR Legacy, Branded")
+    content_hash = models.CharField(max_length=32, blank=True, help_text="Hash of the imported fields, used to sync USDA dataset releases")
+    source_url = models.URLField(max_length=500, blank=True, db_index=True, help_text="Normalized URL of the page the food was imported from")
     
     # Nutrition per 100g
     calories = models.FloatField(validators=[MinValueValidator(0)])
@@ -449,4 +452,68 @@ class FastingSettings(models.Model):
         verbose_name_plural = "Fasting Settings"
     
     def __str__(self):
-        return f"{self.user.username} - {self.protocol}"
\ No newline at end of file
+        return f"{self.user.username} - {self.protocol}"
+
+class ReportJob(models.Model):
+    """Background nutrition PDF report generation job"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='report_jobs')
+    start_date = models.DateField()
+    end_date = models.DateField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    file_path = models.CharField(max_length=500, blank=True, help_text="Path of the generated PDF on disk")
+    error = models.TextField(blank=True)
+    owner = models.CharField(max_length=300, blank=True, help_text="host:pid of the process whose worker pool runs the job")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'status']),
+        ]
+    
+    def __str__(self):
+        return f"{self.user.username} - report {self.start_date}..{self.end_date} ({self.status})"
+    
+    @property
+    def filename(self):
+        return f"nutrition_report_{self.start_date}_{self.end_date}.pdf"
+
+
+class USDAImportCheckpoint(models.Model):
+    """Progress of a USDA dataset import, used to resume an interrupted run"""
+    STATUS_CHOICES = [
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+    ]
+    
+    source = models.CharField(max_length=500, help_text="Path of the imported dataset file")
+    member = models.CharField(max_length=255, blank=True, help_text="JSON member of a zip archive (blank for plain and gzip files)")
+    content_hash = models.CharField(max_length=64, help_text="SHA-256 of the dataset file")
+    offset = models.BigIntegerField(default=0, help_text="Character offset in the decoded JSON just after the last committed record")
+    record_index = models.PositiveIntegerField(default=0, help_text="Records read up to offset")
+    created_count = models.PositiveIntegerField(default=0)
+    updated_count = models.PositiveIntegerField(default=0)
+    skipped_count = models.PositiveIntegerField(default=0)
+    error_count = models.PositiveIntegerField(default=0)
+    failed_fdc_ids = models.JSONField(default=list, blank=True, help_text="FDC ids of records that could not be written")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='running')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-updated_at']
+        unique_together = ['content_hash', 'member']
+    
+    def __str__(self):
+        name = f"{self.source}:{self.member}" if self.member else self.source
+        return f"{name} - {self.record_index} records ({self.status})"
@@ -3,6 +3,8 @@ PDF Report Generator for Nutrition Reports
 """
 from io import BytesIO
 from datetime import date, timedelta
+from threading import Lock
+from xml.sax.saxutils import escape
 from django.http import HttpResponse
 from reportlab.lib.pagesizes import A4
 from reportlab.lib import colors
@@ -14,6 +16,148 @@ from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.cidfonts import UnicodeCIDFont
 from .models import Meal, NutritionGoal
 
+MEAL_TYPE_LABELS = {
+    'breakfast': 'Breakfast',
+    'lunch': 'Lunch',
+    'dinner': 'Dinner',
+    'snack': 'Snack',
+}
+
+
+def _register_font():
+    """Register a Unicode font that supports Cyrillic, returning its name"""
+    for font_name in ('HeiseiMin-W3', 'HeiseiKakuGo-W5'):
+        try:
+            pdfmetrics.registerFont(UnicodeCIDFont(font_name))
+            return font_name
+        except Exception:
+            continue
+    # Fallback to standard font (may not support Cyrillic well)
+    return 'Helvetica'
+
+
+def _grid_table_style(font_name, header_color, font_size, padding):
+    return TableStyle([
+        ('FONTNAME', (0, 0), (-1, -1), font_name),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor(header_color)),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('FONTSIZE', (0, 0), (-1, -1), font_size),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), padding),
+        ('TOPPADDING', (0, 0), (-1, -1), padding),
+        ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#F5F5F5')]),
+    ])
+
+
+class ReportRenderContext:
+    """
+    Fonts, paragraph styles and table styles shared by all reports
+
+    Built once per process by get_render_context(); styles are immutable
+    after construction and safe to reuse across reports and threads.
+    """
+
+    def __init__(self):
+        self.font_name = font_name = _register_font()
+        styles = getSampleStyleSheet()
+
+        self.title_style = ParagraphStyle(
+            'CustomTitle',
+            parent=styles['Heading1'],
+            fontName=font_name,
+            fontSize=24,
+            textColor=colors.HexColor('#2E7D32'),
+            spaceAfter=30,
+            alignment=TA_CENTER,
+        )
+        self.heading_style = ParagraphStyle(
+            'CustomHeading',
+            parent=styles['Heading2'],
+            fontName=font_name,
+            fontSize=16,
+            textColor=colors.HexColor('#1976D2'),
+            spaceAfter=12,
+            spaceBefore=12,
+        )
+        self.normal_style = ParagraphStyle(
+            'Normal',
+            parent=styles['Normal'],
+            fontName=font_name,
+            fontSize=10,
+        )
+        self.label_style = ParagraphStyle(
+            'Label', parent=self.normal_style, fontName=font_name, fontSize=10, textColor=colors.black
+        )
+        self.date_style = ParagraphStyle(
+            'DateStyle', parent=self.normal_style, fontSize=12,
+            textColor=colors.HexColor('#1976D2'), fontName=font_name
+        )
+
+        # Body cell styles per table font size, for cells that need wrapping
+        self.cell_styles = {}
+        for font_size in (8, 9, 10):
+            self.cell_styles[font_size] = ParagraphStyle(
+                f'Cell{font_size}', parent=self.normal_style, fontName=font_name,
+                fontSize=font_size, textColor=colors.black, alignment=TA_CENTER
+            )
+
+        self.user_table_style = TableStyle([
+            ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#E3F2FD')),
+            ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+            ('TOPPADDING', (0, 0), (-1, -1), 8),
+            ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+        ])
+        self.summary_table_style = _grid_table_style(font_name, '#1976D2', 10, 8)
+        self.daily_table_style = _grid_table_style(font_name, '#1976D2', 9, 6)
+        self.meal_table_style = _grid_table_style(font_name, '#4CAF50', 8, 4)
+
+    def table_rows(self, rows, font_size, wrap_columns=()):
+        """
+        Prepare table rows for a grid table
+
+        Short cells (headers, numbers, dates) are drawn as plain strings using
+        the table style's font; only body cells in wrap_columns, which may hold
+        long free text, are escaped and laid out as Paragraphs.
+        """
+        if not wrap_columns:
+            return rows
+        cell_style = self.cell_styles[font_size]
+        return [rows[0]] + [
+            [para(escape(str(cell)), cell_style) if col in wrap_columns else cell for col, cell in enumerate(row)]
+            for row in rows[1:]
+        ]
+
+
+_render_context = None
+_render_context_lock = Lock()
+
+
+def get_render_context() -> ReportRenderContext:
+    """Return the process-wide report rendering context, building it on first use"""
+    global _render_context
+    if _render_context is None:
+        with _render_context_lock:
+            if _render_context is None:
+                _render_context = ReportRenderContext()
+    return _render_context
+
+
+def para(text, style):
+    """Create a Paragraph with proper text encoding"""
+    if isinstance(text, str):
+        try:
+            return Paragraph(text, style)
+        except Exception:
+            return Paragraph(str(text), style)
+    return Paragraph(str(text), style)
+
 
 def generate_nutrition_report(user, start_date, end_date):
     """
@@ -27,17 +171,29 @@ def generate_nutrition_report(user, start_date, end_date):
     Returns:
         HttpResponse with PDF content
     """
-    # Register Unicode fonts that support Cyrillic
-    try:
-        pdfmetrics.registerFont(UnicodeCIDFont('HeiseiMin-W3'))
-        font_name = 'HeiseiMin-W3'
-    except:
-        try:
-            pdfmetrics.registerFont(UnicodeCIDFont('HeiseiKakuGo-W5'))
-            font_name = 'HeiseiKakuGo-W5'
-        except:
-            # Fallback to standard font (may not support Cyrillic well)
-            font_name = 'Helvetica'
+    pdf = build_nutrition_report(user, start_date, end_date)
+    
+    # Create HTTP response
+    response = HttpResponse(content_type='application/pdf')
+    response['Content-Disposition'] = f'attachment; filename="nutrition_report_{start_date}_{end_date}.pdf"'
+    response.write(pdf)
+    
+    return response
+
+
+def build_nutrition_report(user, start_date, end_date):
+    """
+    Render PDF nutrition report for a user over a date range
+    
+    Args:
+        user: User object
+        start_date: Start date (date object)
+        end_date: End date (date object)
+    
+    Returns:
+        bytes with PDF content
+    """
+    ctx = get_render_context()
     
     # Create buffer for PDF
     buffer = BytesIO()
@@ -49,75 +205,26 @@ def generate_nutrition_report(user, start_date, end_date):
     # Container for PDF elements
     elements = []
     
-    # Styles
-    styles = getSampleStyleSheet()
-    
-    # Helper function to create Paragraph with proper encoding
-    def para(text, style):
-        """Create a Paragraph with proper text encoding"""
-        if isinstance(text, str):
-            try:
-                return Paragraph(text, style)
-            except:
-                return Paragraph(str(text), style)
-        return Paragraph(str(text), style)
-    
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontName=font_name,
-        fontSize=24,
-        textColor=colors.HexColor('#2E7D32'),
-        spaceAfter=30,
-        alignment=TA_CENTER,
-    )
-    heading_style = ParagraphStyle(
-        'CustomHeading',
-        parent=styles['Heading2'],
-        fontName=font_name,
-        fontSize=16,
-        textColor=colors.HexColor('#1976D2'),
-        spaceAfter=12,
-        spaceBefore=12,
-    )
-    normal_style = ParagraphStyle(
-        'Normal',
-        parent=styles['Normal'],
-        fontName=font_name,
-        fontSize=10,
-    )
-    
     # Title
-    elements.append(para("Nutrition Report", title_style))
+    elements.append(para("Nutrition Report", ctx.title_style))
     elements.append(Spacer(1, 0.2*inch))
     
     # User info
     user_name = user.get_full_name() or user.username
     user_info = [
-        ['User:', user_name],
+        ['User:', escape(user_name)],
         ['Period:', f"{start_date.strftime('%d.%m.%Y')} - {end_date.strftime('%d.%m.%Y')}"],
         ['Created:', date.today().strftime('%d.%m.%Y')],
     ]
     
     # Convert user_info to Paragraphs for proper text rendering
-    user_table_data = []
-    for row in user_info:
-        user_table_data.append([
-            para(row[0], ParagraphStyle('Label', parent=normal_style, fontName=font_name, fontSize=10, textColor=colors.black)),
-            para(row[1], ParagraphStyle('Value', parent=normal_style, fontName=font_name, fontSize=10, textColor=colors.black))
-        ])
+    user_table_data = [
+        [para(label, ctx.label_style), para(value, ctx.label_style)]
+        for label, value in user_info
+    ]
     
     user_table = Table(user_table_data, colWidths=[2*inch, 4*inch])
-    user_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#E3F2FD')),
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-        ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-    ]))
+    user_table.setStyle(ctx.user_table_style)
     elements.append(user_table)
     elements.append(Spacer(1, 0.3*inch))
     
@@ -126,7 +233,7 @@ def generate_nutrition_report(user, start_date, end_date):
         user=user,
         date__gte=start_date,
         date__lte=end_date
-    ).select_related('food').order_by('date', 'meal_type')
+    ).select_related('food', 'recipe').prefetch_related('recipe__ingredients__food').order_by('date', 'meal_type')
     
     # Calculate daily totals
     daily_totals = {}
@@ -148,7 +255,7 @@ def generate_nutrition_report(user, start_date, end_date):
         daily_totals[day_key]['meals'].append(meal)
     
     # Overall summary
-    elements.append(para("Overall Statistics", heading_style))
+    elements.append(para("Overall Statistics", ctx.heading_style))
     
     total_calories = sum(day['calories'] for day in daily_totals.values())
     total_protein = sum(day['protein'] for day in daily_totals.values())
@@ -183,38 +290,14 @@ def generate_nutrition_report(user, start_date, end_date):
          f"{goal_fat:.1f}" if goal_fat else '-'],
     ]
     
-    # Convert summary_data to Paragraphs
-    summary_table_data = []
-    for i, row in enumerate(summary_data):
-        table_row = []
-        for cell in row:
-            if i == 0:  # Header row
-                style = ParagraphStyle('Header', parent=normal_style, fontName=font_name, 
-                                      fontSize=10, textColor=colors.whitesmoke, alignment=TA_CENTER)
-            else:
-                style = ParagraphStyle('Cell', parent=normal_style, fontName=font_name, 
-                                      fontSize=10, textColor=colors.black, alignment=TA_CENTER)
-            table_row.append(para(cell, style))
-        summary_table_data.append(table_row)
-    
-    summary_table = Table(summary_table_data, colWidths=[2*inch, 1.5*inch, 1.5*inch, 1.5*inch])
-    summary_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1976D2')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-        ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#F5F5F5')]),
-    ]))
+    summary_table = Table(ctx.table_rows(summary_data, 10), colWidths=[2*inch, 1.5*inch, 1.5*inch, 1.5*inch])
+    summary_table.setStyle(ctx.summary_table_style)
     elements.append(summary_table)
     elements.append(Spacer(1, 0.3*inch))
     
     # Daily breakdown
     if daily_totals:
-        elements.append(para("Daily Breakdown", heading_style))
+        elements.append(para("Daily Breakdown", ctx.heading_style))
         
         # Create daily breakdown table
         daily_data = [['Date', 'Calories', 'Protein', 'Carbs', 'Fat', 'Meals']]
@@ -230,98 +313,38 @@ def generate_nutrition_report(user, start_date, end_date):
                 str(len(day['meals']))
             ])
         
-        # Convert daily_data to Paragraphs
-        daily_table_data = []
-        for i, row in enumerate(daily_data):
-            table_row = []
-            for cell in row:
-                if i == 0:  # Header row
-                    style = ParagraphStyle('Header', parent=normal_style, fontName=font_name, 
-                                          fontSize=9, textColor=colors.whitesmoke, alignment=TA_CENTER)
-                else:
-                    style = ParagraphStyle('Cell', parent=normal_style, fontName=font_name, 
-                                          fontSize=9, textColor=colors.black, alignment=TA_CENTER)
-                table_row.append(para(cell, style))
-            daily_table_data.append(table_row)
-        
-        daily_table = Table(daily_table_data, colWidths=[1.2*inch, 1*inch, 0.8*inch, 0.8*inch, 0.8*inch, 1*inch])
-        daily_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1976D2')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('FONTSIZE', (0, 0), (-1, -1), 9),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-            ('TOPPADDING', (0, 0), (-1, -1), 6),
-            ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#F5F5F5')]),
-        ]))
+        daily_table = Table(ctx.table_rows(daily_data, 9), colWidths=[1.2*inch, 1*inch, 0.8*inch, 0.8*inch, 0.8*inch, 1*inch])
+        daily_table.setStyle(ctx.daily_table_style)
         elements.append(daily_table)
         elements.append(Spacer(1, 0.3*inch))
         
         # Detailed meals (first 3 days to avoid too long report)
-        elements.append(para("Meal Details (First Days)", heading_style))
-        
-        meal_type_labels = {
-            'breakfast': 'Breakfast',
-            'lunch': 'Lunch',
-            'dinner': 'Dinner',
-            'snack': 'Snack',
-        }
+        elements.append(para("Meal Details (First Days)", ctx.heading_style))
         
-        days_shown = 0
         for day_key in sorted(daily_totals.keys())[:3]:  # Show first 3 days
             day = daily_totals[day_key]
-            date_style = ParagraphStyle('DateStyle', parent=normal_style, fontSize=12, 
-                                       textColor=colors.HexColor('#1976D2'), fontName=font_name)
             elements.append(para(
                 f"<b>{day['date'].strftime('%d.%m.%Y')}</b>",
-                date_style
+                ctx.date_style
             ))
             
             meal_data = [['Time', 'Food', 'Quantity', 'Calories', 'Protein', 'Carbs', 'Fat']]
             
             for meal in day['meals']:
-                food_name = meal.food.name[:30] if meal.food.name else 'Unknown'
                 meal_data.append([
-                    meal_type_labels.get(meal.meal_type, meal.meal_type),
-                    food_name,  # Truncate long names
-                    f"{meal.quantity:.0f}g",
+                    MEAL_TYPE_LABELS.get(meal.meal_type, meal.meal_type),
+                    meal.name[:30],  # Truncate long names
+                    f"{meal.quantity:.1f} serv." if meal.recipe else f"{meal.quantity:.0f}g",
                     f"{meal.total_calories:.0f}",
                     f"{meal.total_protein:.1f}",
                     f"{meal.total_carbs:.1f}",
                     f"{meal.total_fat:.1f}",
                 ])
             
-            # Convert meal_data to Paragraphs
-            meal_table_data = []
-            for i, row in enumerate(meal_data):
-                table_row = []
-                for cell in row:
-                    if i == 0:  # Header row
-                        style = ParagraphStyle('Header', parent=normal_style, fontName=font_name, 
-                                              fontSize=8, textColor=colors.whitesmoke, alignment=TA_CENTER)
-                    else:
-                        style = ParagraphStyle('Cell', parent=normal_style, fontName=font_name, 
-                                              fontSize=8, textColor=colors.black, alignment=TA_CENTER)
-                    table_row.append(para(cell, style))
-                meal_table_data.append(table_row)
-            
-            meal_table = Table(meal_table_data, colWidths=[0.8*inch, 1.5*inch, 0.7*inch, 0.7*inch, 0.6*inch, 0.6*inch, 0.6*inch])
-            meal_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4CAF50')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                ('FONTSIZE', (0, 0), (-1, -1), 8),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
-                ('TOPPADDING', (0, 0), (-1, -1), 4),
-                ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#F5F5F5')]),
-            ]))
+            meal_table = Table(ctx.table_rows(meal_data, 8, wrap_columns=(1,)), colWidths=[0.8*inch, 1.5*inch, 0.7*inch, 0.7*inch, 0.6*inch, 0.6*inch, 0.6*inch])
+            meal_table.setStyle(ctx.meal_table_style)
             elements.append(meal_table)
             elements.append(Spacer(1, 0.2*inch))
-            days_shown += 1
     
     # Build PDF
     doc.build(elements)
@@ -330,9 +353,4 @@ def generate_nutrition_report(user, start_date, end_date):
     pdf = buffer.getvalue()
     buffer.close()
     
-    # Create HTTP response
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="nutrition_report_{start_date}_{end_date}.pdf"'
-    response.write(pdf)
-    
-    return response
+    return pdf
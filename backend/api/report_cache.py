@@ -0,0 +1,200 @@
+"""
+Content-addressed on-disk cache of generated nutrition PDF reports
+
+Reports are stored under settings.REPORTS_DIR/cache/<user_id>/ and keyed by
+the requested date range plus a data version derived from the latest change
+to the user's meals (and the foods/recipes they reference) in that range and
+to the user's nutrition goals. A repeated download of an unchanged range is
+served from disk without re-querying meals or re-rendering the document.
+"""
+import hashlib
+import os
+import re
+from datetime import date
+from pathlib import Path
+from django.conf import settings
+from django.db.models import Count, Max
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from .models import Meal, NutritionGoal, ReportJob
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$', re.IGNORECASE)
+RANGE_CHUNK_SIZE = 64 * 1024
+
+
+def get_cache_dir(user) -> Path:
+    reports_dir = Path(getattr(settings, 'REPORTS_DIR', Path(settings.BASE_DIR) / 'reports'))
+    cache_dir = reports_dir / 'cache' / str(user.id)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    return cache_dir
+
+
+def report_data_version(user, start_date, end_date) -> str:
+    """
+    Compute a version string for the data shown in a report
+
+    Changes whenever a meal in the range is added, edited or deleted, when a
+    referenced food, recipe (including its ingredients, see signals.py) or
+    ingredient food is edited, or when the user's goals change.
+    The creation date and user name printed on the report are included too.
+    """
+    meal_stats = Meal.objects.filter(
+        user=user,
+        date__gte=start_date,
+        date__lte=end_date
+    ).aggregate(
+        count=Count('id', distinct=True),
+        meals_updated=Max('updated_at'),
+        foods_updated=Max('food__updated_at'),
+        recipes_updated=Max('recipe__updated_at'),
+        ingredient_foods_updated=Max('recipe__ingredients__food__updated_at'),
+    )
+    goal_updated = NutritionGoal.objects.filter(user=user).values_list('updated_at', flat=True).first()
+
+    parts = [
+        meal_stats['count'],
+        meal_stats['meals_updated'],
+        meal_stats['foods_updated'],
+        meal_stats['recipes_updated'],
+        meal_stats['ingredient_foods_updated'],
+        goal_updated,
+        user.get_full_name() or user.username,
+        date.today(),
+    ]
+    raw = '|'.join('' if part is None else str(part) for part in parts)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:16]
+
+
+def get_report_path(user, start_date, end_date) -> Path:
+    """Return the cache path for the current data version of a report"""
+    version = report_data_version(user, start_date, end_date)
+    return get_cache_dir(user) / f"{start_date}_{end_date}_{version}.pdf"
+
+
+def get_or_build_report(user, start_date, end_date) -> Path:
+    """
+    Return path of the cached report, rendering it first on a cache miss
+
+    Older versions of the same date range are removed after a new version
+    is written, except files a report job still serves.
+    """
+    from .pdf_generator import build_nutrition_report
+
+    file_path = get_report_path(user, start_date, end_date)
+    if file_path.exists():
+        return file_path
+
+    pdf = build_nutrition_report(user, start_date, end_date)
+    tmp_path = file_path.with_name(f"{file_path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(pdf)
+    os.replace(tmp_path, file_path)
+
+    stale_paths = [path for path in file_path.parent.glob(f"{start_date}_{end_date}_*.pdf") if path != file_path]
+    referenced = set(ReportJob.objects.filter(
+        file_path__in=[str(path) for path in stale_paths]
+    ).values_list('file_path', flat=True))
+    for stale in stale_paths:
+        if str(stale) not in referenced:
+            try:
+                stale.unlink()
+            except OSError:
+                pass
+
+    return file_path
+
+
+def _iter_file_range(path, offset, length):
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(RANGE_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _parse_range(range_header, size):
+    """
+    Parse a single 'bytes=start-end' range, returning (start, end)
+
+    Returns None for headers that are to be ignored (multiple ranges,
+    other units, invalid syntax), so the full file is sent with 200 as
+    RFC 9110 allows. Raises ValueError for a valid range that lies outside
+    the file (416 Range Not Satisfiable).
+    """
+    match = RANGE_RE.match(range_header.strip())
+    if not match:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # Suffix range: last N bytes
+        length = int(end)
+        if length == 0 or size == 0:
+            raise ValueError('Range not satisfiable')
+        return max(0, size - length), size - 1
+    start = int(start)
+    if end and int(end) < start:
+        return None
+    if start >= size:
+        raise ValueError('Range not satisfiable')
+    end = int(end) if end else size - 1
+    return start, min(end, size - 1)
+
+
+def serve_pdf_file(request, path, filename):
+    """
+    Serve a PDF file from disk
+
+    When settings.REPORTS_SENDFILE_HEADER is set (e.g. 'X-Accel-Redirect' for
+    nginx or 'X-Sendfile' for Apache), the transfer is delegated to the front
+    web server, which also handles byte ranges; REPORTS_SENDFILE_PREFIX maps
+    the path under REPORTS_DIR to the internal location. Otherwise the file is
+    streamed with FileResponse and single byte-range requests are answered
+    with 206 Partial Content; multi-range and other Range headers get the
+    whole file.
+    """
+    path = Path(path)
+    disposition = f'attachment; filename="{filename}"'
+
+    sendfile_header = getattr(settings, 'REPORTS_SENDFILE_HEADER', None)
+    if sendfile_header:
+        prefix = getattr(settings, 'REPORTS_SENDFILE_PREFIX', None)
+        if prefix is not None:
+            relative = path.resolve().relative_to(Path(settings.REPORTS_DIR).resolve())
+            location = f"{prefix.rstrip('/')}/{relative.as_posix()}"
+        else:
+            location = str(path)
+        response = HttpResponse(content_type='application/pdf')
+        response[sendfile_header] = location
+        response['Content-Disposition'] = disposition
+        return response
+
+    size = path.stat().st_size
+    range_header = request.META.get('HTTP_RANGE')
+    try:
+        byte_range = _parse_range(range_header, size) if range_header else None
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    if byte_range:
+        start, end = byte_range
+        length = end - start + 1
+        response = StreamingHttpResponse(
+            _iter_file_range(path, start, length),
+            status=206,
+            content_type='application/pdf'
+        )
+        response['Content-Length'] = str(length)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Accept-Ranges'] = 'bytes'
+        response['Content-Disposition'] = disposition
+        return response
+
+    response = FileResponse(open(path, 'rb'), as_attachment=True, filename=filename, content_type='application/pdf')
+    response['Accept-Ranges'] = 'bytes'
+    return response
@@ -0,0 +1,168 @@
+"""
+Background generation of nutrition PDF reports
+
+Report jobs are rendered by a per-process thread pool so web workers return
+immediately. The job row tracks status; the rendered PDF is stored in the
+on-disk report cache and served by the report job download endpoint.
+
+Jobs whose worker died with its process (e.g. on a restart) would stay
+pending or running forever, so they are marked failed: running jobs once
+settings.REPORT_JOB_TIMEOUT seconds have passed since they were picked up,
+and pending or running jobs as soon as the process that queued them (the
+job owner, host:pid) is known to be gone. A pending job only waiting its
+turn in a busy worker pool is left alone however long it waits. Owners on
+other hosts cannot be checked and are assumed alive. Finished jobs are
+deleted, along with PDF files no other job references, after
+settings.REPORT_JOB_RETENTION_DAYS.
+"""
+import logging
+import os
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from threading import Lock
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from .models import ReportJob
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = Lock()
+
+# Jobs queued by this process and not finished yet
+_queued = set()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Return the process-wide report worker pool, creating it on first use"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                workers = getattr(settings, 'REPORT_WORKERS', 2)
+                _executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='report')
+    return _executor
+
+
+def process_owner() -> str:
+    """host:pid of this process, recorded as the owner of the jobs it queues"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def is_owner_alive(owner: str, job_id: int) -> bool:
+    """Whether the process that queued a job may still run it"""
+    host, _, pid = owner.rpartition(':')
+    if host != socket.gethostname() or not pid.isdigit():
+        return True
+    if owner == process_owner():
+        # Same host and pid, but possibly an earlier process (e.g. pid 1 of a restarted container)
+        return job_id in _queued
+    if os.name == 'nt':
+        # os.kill(pid, 0) would send CTRL_C_EVENT on Windows
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # e.g. PermissionError: the process exists
+        pass
+    return True
+
+
+def create_report_job(user, start_date, end_date) -> ReportJob:
+    """Create a report job and queue it once the surrounding transaction commits"""
+    job = ReportJob.objects.create(user=user, start_date=start_date, end_date=end_date, owner=process_owner())
+    _queued.add(job.id)
+    transaction.on_commit(lambda: get_executor().submit(run_report_job, job.id))
+    transaction.on_commit(lambda: get_executor().submit(cleanup_report_jobs))
+    return job
+
+
+def expire_stale_jobs(queryset=None) -> int:
+    """
+    Mark interrupted jobs as failed
+
+    That is running jobs picked up more than REPORT_JOB_TIMEOUT seconds ago,
+    jobs whose owner process is gone, and old pending jobs without an owner
+    (queued before owners were recorded).
+    """
+    if queryset is None:
+        queryset = ReportJob.objects.all()
+    timeout = getattr(settings, 'REPORT_JOB_TIMEOUT', 600)
+    now = timezone.now()
+    unfinished = queryset.filter(status__in=('pending', 'running'))
+    orphaned = [
+        job_id for job_id, owner in unfinished.exclude(owner='').values_list('id', 'owner')
+        if not is_owner_alive(owner, job_id)
+    ]
+    cutoff = now - timedelta(seconds=timeout)
+    return unfinished.filter(
+        Q(id__in=orphaned)
+        | Q(status='running', updated_at__lt=cutoff)
+        | Q(status='pending', owner='', updated_at__lt=cutoff)
+    ).update(
+        status='failed', error='Report job was interrupted, please request the report again',
+        completed_at=now, updated_at=now
+    )
+
+
+def cleanup_report_jobs() -> int:
+    """Delete finished jobs past the retention period and their unreferenced PDF files"""
+    close_old_connections()
+    try:
+        expire_stale_jobs()
+        retention_days = getattr(settings, 'REPORT_JOB_RETENTION_DAYS', 7)
+        old_jobs = ReportJob.objects.filter(
+            status__in=('done', 'failed'),
+            completed_at__lt=timezone.now() - timedelta(days=retention_days),
+        )
+        file_paths = set(old_jobs.exclude(file_path='').values_list('file_path', flat=True))
+        deleted, _ = old_jobs.delete()
+
+        still_referenced = set(ReportJob.objects.filter(file_path__in=file_paths).values_list('file_path', flat=True))
+        for file_path in file_paths - still_referenced:
+            try:
+                os.remove(file_path)
+            except OSError:
+                pass
+        return deleted
+    except Exception as e:
+        logger.error(f"Error cleaning up report jobs: {e}", exc_info=True)
+        return 0
+    finally:
+        connection.close()
+
+
+def run_report_job(job_id: int):
+    """Render a queued report job to disk (runs in a worker thread)"""
+    from .report_cache import get_or_build_report
+
+    close_old_connections()
+    try:
+        # updated_at marks when the job was picked up, for REPORT_JOB_TIMEOUT
+        updated = ReportJob.objects.filter(id=job_id, status='pending').update(status='running', updated_at=timezone.now())
+        if not updated:
+            return
+        job = ReportJob.objects.select_related('user').get(id=job_id)
+
+        try:
+            file_path = get_or_build_report(job.user, job.start_date, job.end_date)
+        except Exception as e:
+            logger.error(f"Error generating PDF report for job {job_id}: {e}", exc_info=True)
+            ReportJob.objects.filter(id=job_id).update(
+                status='failed', error=str(e)[:1000],
+                completed_at=timezone.now(), updated_at=timezone.now()
+            )
+            return
+
+        ReportJob.objects.filter(id=job_id).update(
+            status='done', file_path=str(file_path),
+            completed_at=timezone.now(), updated_at=timezone.now()
+        )
+    finally:
+        _queued.discard(job_id)
+        connection.close()
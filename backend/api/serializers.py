@@ -1,6 +1,6 @@
 from rest_framework import serializers
 from datetime import date
-from .models import Food, Meal, NutritionGoal, WeightEntry, Notification, MealReminderSettings, WaterIntake, WaterSettings, Recipe, RecipeIngredient, FastingSession, FastingSettings
+from .models import Food, Meal, NutritionGoal, WeightEntry, Notification, MealReminderSettings, WaterIntake, WaterSettings, Recipe, RecipeIngredient, FastingSession, FastingSettings, ReportJob
 from users.serializers import UserSerializer
 
 
@@ -194,3 +194,10 @@ class FastingSettingsSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ('user', 'created_at', 'updated_at')
 
+
+
+class ReportJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ReportJob
+        fields = ('id', 'start_date', 'end_date', 'status', 'error', 'created_at', 'completed_at')
+        read_only_fields = fields
@@ -0,0 +1,16 @@
+"""
+Touch a recipe when its ingredients change
+
+Cached nutrition reports are versioned by recipe__updated_at, so adding,
+editing or removing an ingredient must bump the recipe's timestamp.
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from .models import Recipe, RecipeIngredient
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def touch_recipe(sender, instance, **kwargs):
+    Recipe.objects.filter(id=instance.recipe_id).update(updated_at=timezone.now())
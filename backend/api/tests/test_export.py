@@ -0,0 +1,89 @@
+import csv
+import io
+import json
+from datetime import date, datetime, timezone
+from asgiref.sync import sync_to_async
+from django.test import TestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+from api.export import CSV_COLUMNS, aiter_lines, iter_records, recipe_per_serving, stream_ndjson
+from api.models import FastingSession, Food, Meal, Recipe, RecipeIngredient, WaterIntake, WeightEntry
+from users.models import User
+
+
+class DiaryExportTests(TestCase):
+    """CSV and NDJSON framing of export/<format>/ and per-serving recipe rows"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='export_test', email='export@example.com', password='secret')
+        oats = Food.objects.create(name='Oats', calories=380, protein=13, carbs=60, fat=7)
+        milk = Food.objects.create(name='Milk, "whole"', calories=60, protein=3.2, carbs=4.8, fat=3.3)
+        cls.recipe = Recipe.objects.create(user=cls.user, name='Porridge', servings=3)
+        RecipeIngredient.objects.create(recipe=cls.recipe, food=oats, quantity=120)
+        RecipeIngredient.objects.create(recipe=cls.recipe, food=milk, quantity=450)
+        Meal.objects.create(user=cls.user, food=oats, date=date(2024, 3, 1), meal_type='breakfast', quantity=50)
+        Meal.objects.create(user=cls.user, food=milk, date=date(2024, 3, 1), meal_type='snack', quantity=200,
+                            notes='line one\nline two')
+        Meal.objects.create(user=cls.user, recipe=cls.recipe, date=date(2024, 3, 2), meal_type='breakfast', quantity=1.5)
+        WeightEntry.objects.create(user=cls.user, date=date(2024, 3, 1), weight=72.5)
+        WaterIntake.objects.create(user=cls.user, date=date(2024, 3, 1), amount_ml=1500)
+        FastingSession.objects.create(
+            user=cls.user, start_time=datetime(2024, 3, 1, 20, tzinfo=timezone.utc),
+            end_time=datetime(2024, 3, 2, 12, tzinfo=timezone.utc), duration_minutes=960, is_active=False,
+        )
+        cls.headers = {'Authorization': f'Bearer {RefreshToken.for_user(cls.user).access_token}'}
+
+    def export(self, export_format, query=''):
+        response = self.client.get(f'/api/export/{export_format}/{query}', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.is_async)
+        return response, b''.join(response.streaming_content).decode('utf-8')
+
+    def test_csv(self):
+        response, body = self.export('csv')
+        self.assertTrue(response['Content-Type'].startswith('text/csv'))
+        self.assertIn('attachment; filename="food_diary_', response['Content-Disposition'])
+        rows = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual(body.split('\r\n', 1)[0], ','.join(CSV_COLUMNS))
+        self.assertEqual([row['record_type'] for row in rows], ['meal', 'meal', 'meal', 'weight', 'water', 'fasting'])
+        self.assertEqual(rows[0]['calories'], '190.0')
+        # Quotes and newlines survive the round trip
+        self.assertEqual(rows[1]['name'], 'Milk, "whole"')
+        self.assertEqual(rows[1]['notes'], 'line one\nline two')
+        self.assertEqual(rows[5]['duration_minutes'], '960')
+
+    def test_ndjson(self):
+        response, body = self.export('ndjson', '?datasets=meals,water')
+        self.assertTrue(response['Content-Type'].startswith('application/x-ndjson'))
+        self.assertTrue(body.endswith('\n'))
+        records = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([record['record_type'] for record in records], ['meal', 'meal', 'meal', 'water'])
+        self.assertEqual(records[3], {'record_type': 'water', 'date': '2024-03-01', 'amount_ml': 1500.0})
+
+    def test_recipe_rows_per_serving(self):
+        per_serving = recipe_per_serving(Meal.objects.filter(user=self.user))
+        # (120 g oats + 450 g milk) / 3 servings
+        self.assertAlmostEqual(per_serving[self.recipe.id][0], (456 + 270) / 3)
+        _, body = self.export('ndjson', '?datasets=meals')
+        recipe_row = [json.loads(line) for line in body.splitlines()][2]
+        self.assertEqual(recipe_row['name'], 'Porridge')
+        for key, value in zip(('calories', 'protein', 'carbs', 'fat'), per_serving[self.recipe.id]):
+            self.assertEqual(recipe_row[key], round(value * 1.5, 2))
+
+    def test_unknown_dataset(self):
+        response = self.client.get('/api/export/csv/?datasets=meals,steps', headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+
+    async def test_asgi_streams_async_iterator(self):
+        _, expected = await sync_to_async(self.export)('csv')
+        response = await self.async_client.get('/api/export/csv/', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        # An async iterator is sent chunk by chunk instead of being read into a list first
+        self.assertTrue(response.is_async)
+        body = b''.join([chunk async for chunk in response.streaming_content]).decode('utf-8')
+        self.assertEqual(body, expected)
+
+    async def test_aiter_lines_batches(self):
+        lines = stream_ndjson(iter_records(self.user))
+        chunks = [chunk async for chunk in aiter_lines(lines, batch_size=4)]
+        self.assertEqual([chunk.count('\n') for chunk in chunks], [4, 2])
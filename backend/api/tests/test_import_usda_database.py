@@ -0,0 +1,194 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+from datetime import date, timedelta
+from unittest import mock
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from api.management.commands.import_usda_database import Command
+from api.models import Food, Meal, Recipe, RecipeIngredient, USDAImportCheckpoint
+from api.tests.test_usda_csv import write_csv_bundle
+from users.models import User
+
+
+def usda_food(fdc_id, calories, data_type='Foundation', protein=5.0):
+    return {
+        'fdcId': fdc_id,
+        'description': f'Food {fdc_id}',
+        'dataType': data_type,
+        'foodNutrients': [
+            {'nutrient': {'id': 1008, 'number': '208', 'name': 'Energy', 'unitName': 'kcal'}, 'amount': calories},
+            {'nutrient': {'id': 1003, 'number': '203', 'name': 'Protein', 'unitName': 'g'}, 'amount': protein},
+        ],
+    }
+
+
+class ImportCommandTestCase(TestCase):
+    """Runs import_usda_database on dataset files written to a temporary directory"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def write_release(self, foods, name='release.json'):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'FoundationFoods': foods}, f, indent=2)
+        return path
+
+    def run_import(self, path, **options):
+        stdout = io.StringIO()
+        call_command('import_usda_database', file=path, stdout=stdout, **options)
+        return stdout.getvalue()
+
+    def checkpoint(self, path):
+        return USDAImportCheckpoint.objects.get(source=path)
+
+    def calories(self):
+        return dict(Food.objects.values_list('usda_fdc_id', 'calories'))
+
+
+class UpsertTests(ImportCommandTestCase):
+    """Batched INSERT ... ON CONFLICT DO UPDATE of imported foods"""
+
+    def test_same_file_twice(self):
+        path = self.write_release([usda_food(fdc_id, 100 + fdc_id) for fdc_id in range(1, 8)])
+        self.run_import(path, batch_size=3)
+        self.assertEqual(Food.objects.count(), 7)
+        created_at = dict(Food.objects.values_list('usda_fdc_id', 'created_at'))
+
+        self.run_import(path, batch_size=3)
+        self.assertEqual(Food.objects.count(), 7)
+        checkpoint = self.checkpoint(path)
+        self.assertEqual((checkpoint.created_count, checkpoint.updated_count), (0, 7))
+        self.assertEqual(dict(Food.objects.values_list('usda_fdc_id', 'created_at')), created_at)
+
+    def test_new_release_updates_values(self):
+        self.run_import(self.write_release([usda_food(fdc_id, 100) for fdc_id in range(1, 6)]), batch_size=2)
+        path = self.write_release(
+            [usda_food(fdc_id, 200 + fdc_id, protein=7.5) for fdc_id in range(3, 9)], name='release2.json'
+        )
+        output = self.run_import(path, batch_size=2)
+        self.assertIn('Created: 3, Updated: 3', output)
+        self.assertEqual(self.calories(), {1: 100, 2: 100, 3: 203, 4: 204, 5: 205, 6: 206, 7: 207, 8: 208})
+        food = Food.objects.get(usda_fdc_id=4)
+        self.assertEqual((food.protein, food.data_source, food.usda_data_type), (7.5, 'usda', 'Foundation'))
+
+    def test_duplicate_in_batch_last_wins(self):
+        path = self.write_release([usda_food(1, 100), usda_food(2, 100), usda_food(1, 150)])
+        self.run_import(path, batch_size=10)
+        self.assertEqual(self.calories(), {1: 150, 2: 100})
+
+    def test_skip_existing(self):
+        self.run_import(self.write_release([usda_food(1, 100)]))
+        self.run_import(self.write_release([usda_food(1, 300), usda_food(2, 300)], name='release2.json'),
+                        skip_existing=True)
+        self.assertEqual(self.calories(), {1: 100, 2: 300})
+
+
+class ResumeTests(ImportCommandTestCase):
+    """An interrupted import continues after its last committed batch"""
+
+    foods = [usda_food(fdc_id, 100 + fdc_id) for fdc_id in range(1, 11)]
+
+    def interrupted_after(self, batches):
+        """Patch write_batch to stop the import (like Ctrl+C) when batch number batches + 1 is written"""
+        write_batch = Command.write_batch
+        self.written = []
+
+        def interrupting(command, batch, *args, **kwargs):
+            if len(self.written) == batches:
+                raise KeyboardInterrupt
+            self.written.append(sorted(batch))
+            return write_batch(command, batch, *args, **kwargs)
+
+        return mock.patch.object(Command, 'write_batch', interrupting)
+
+    def assert_resumes(self, path, source):
+        with self.interrupted_after(2), self.assertRaises(KeyboardInterrupt):
+            self.run_import(path, batch_size=3)
+        self.assertEqual(sorted(self.calories()), list(range(1, 7)))
+        checkpoint = USDAImportCheckpoint.objects.get(source=source)
+        self.assertEqual((checkpoint.record_index, checkpoint.status), (6, 'running'))
+
+        with self.interrupted_after(10):
+            output = self.run_import(path, batch_size=3, resume=True)
+        self.assertIn('Resuming after record 6', output)
+        # Only the foods after the checkpoint are written again
+        self.assertEqual(self.written, [[7, 8, 9], [10]])
+        self.assertEqual(self.calories(), {fdc_id: 100 + fdc_id for fdc_id in range(1, 11)})
+        checkpoint.refresh_from_db()
+        self.assertEqual(
+            (checkpoint.record_index, checkpoint.created_count, checkpoint.updated_count, checkpoint.status),
+            (10, 10, 0, 'completed'),
+        )
+
+    def test_json(self):
+        path = self.write_release(self.foods)
+        self.assert_resumes(path, path)
+
+    def test_csv_bundle(self):
+        write_csv_bundle(self.foods, self.directory)
+        self.assert_resumes(self.directory, self.directory)
+
+    def test_completed_import_not_repeated(self):
+        path = self.write_release(self.foods)
+        self.run_import(path, batch_size=3)
+        with self.interrupted_after(0):
+            output = self.run_import(path, batch_size=3, resume=True)
+        self.assertIn('Already imported (10 records), skipping', output)
+        self.assertEqual(self.written, [])
+
+    def test_limit_then_resume(self):
+        path = self.write_release(self.foods)
+        output = self.run_import(path, batch_size=3, limit=4)
+        self.assertIn('continue with --resume', output)
+        self.assertEqual(sorted(self.calories()), [1, 2, 3, 4])
+        self.run_import(path, batch_size=3, resume=True)
+        self.assertEqual(sorted(self.calories()), list(range(1, 11)))
+        self.assertEqual(self.checkpoint(path).created_count, 10)
+
+
+class SyncTests(ImportCommandTestCase):
+    """--sync applies a new release as a diff and deletes retired foods"""
+
+    def setUp(self):
+        super().setUp()
+        self.run_import(self.write_release([usda_food(fdc_id, 100) for fdc_id in range(1, 7)]))
+        # Another dataset and a food not from USDA are outside the synced release
+        self.run_import(self.write_release([usda_food(50, 100, data_type='SR Legacy')], name='sr_legacy.json'))
+        Food.objects.create(name='Homemade', calories=100, protein=1, carbs=1, fat=1)
+        user = User.objects.create_user(username='sync_test', email='sync@example.com', password='secret')
+        Meal.objects.create(user=user, food=Food.objects.get(usda_fdc_id=4), date=date(2024, 3, 1),
+                            meal_type='lunch', quantity=100)
+        recipe = Recipe.objects.create(user=user, name='Stew')
+        RecipeIngredient.objects.create(recipe=recipe, food=Food.objects.get(usda_fdc_id=5), quantity=100)
+        self.long_ago = timezone.now() - timedelta(days=30)
+        Food.objects.update(updated_at=self.long_ago)
+
+    def test_sync(self):
+        # 1 unchanged, 2 changed, 3-6 retired (4 used by a meal, 5 by a recipe), 7 new
+        release = [usda_food(1, 100), usda_food(2, 250), usda_food(7, 100)]
+        output = self.run_import(self.write_release(release, name='release2.json'), sync=True)
+        self.assertIn('Created: 1, Updated: 1, Skipped: 1', output)
+        self.assertIn('Deleted 2 foods no longer in the release', output)
+        self.assertIn('Kept 2 retired foods that are still used by meals or recipes', output)
+
+        self.assertEqual(sorted(Food.objects.filter(usda_data_type='Foundation').values_list('usda_fdc_id', flat=True)),
+                         [1, 2, 4, 5, 7])
+        self.assertTrue(Food.objects.filter(usda_fdc_id=50).exists())
+        self.assertTrue(Food.objects.filter(name='Homemade').exists())
+        self.assertEqual(Food.objects.get(usda_fdc_id=2).calories, 250)
+        # The unchanged food is not rewritten
+        self.assertEqual(Food.objects.get(usda_fdc_id=1).updated_at, self.long_ago)
+        self.assertGreater(Food.objects.get(usda_fdc_id=2).updated_at, self.long_ago)
+
+    def test_no_deletions_after_resume(self):
+        path = self.write_release([usda_food(1, 100), usda_food(2, 250)], name='release2.json')
+        self.run_import(path, sync=True, batch_size=1, limit=1)
+        output = self.run_import(path, sync=True, batch_size=1, resume=True)
+        self.assertIn('Deletions skipped', output)
+        self.assertEqual(Food.objects.filter(usda_data_type='Foundation').count(), 6)
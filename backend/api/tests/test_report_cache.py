@@ -0,0 +1,58 @@
+import shutil
+import tempfile
+from pathlib import Path
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from api.report_cache import serve_pdf_file
+
+CONTENT = b'%PDF-1.4 ' + bytes(range(256)) * 4
+
+
+@override_settings(REPORTS_SENDFILE_HEADER=None)
+class ServePDFRangeTests(SimpleTestCase):
+    """Byte ranges of served reports (RFC 9110)"""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = Path(directory) / 'report.pdf'
+        self.path.write_bytes(CONTENT)
+
+    def get(self, range_header=None):
+        headers = {'HTTP_RANGE': range_header} if range_header is not None else {}
+        response = serve_pdf_file(RequestFactory().get('/report.pdf', **headers), self.path, 'report.pdf')
+        self.addCleanup(response.close)
+        return response, b''.join(response.streaming_content) if response.streaming else response.content
+
+    def test_single_range(self):
+        size = len(CONTENT)
+        for header, start, end in (
+            ('bytes=0-99', 0, 99),
+            ('bytes=100-', 100, size - 1),
+            ('bytes=-50', size - 50, size - 1),
+            ('bytes=1000-99999', 1000, size - 1),
+        ):
+            with self.subTest(header):
+                response, body = self.get(header)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(response['Content-Range'], f'bytes {start}-{end}/{size}')
+                self.assertEqual(body, CONTENT[start:end + 1])
+
+    def test_unsupported_range_sends_whole_file(self):
+        for header in ('bytes=0-9,20-29', 'items=0-9', 'bytes=9-0', 'bytes=-', 'bytes=abc'):
+            with self.subTest(header):
+                response, body = self.get(header)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(body, CONTENT)
+
+    def test_unsatisfiable_range(self):
+        for header in (f'bytes={len(CONTENT)}-', 'bytes=99999-100000', 'bytes=-0'):
+            with self.subTest(header):
+                response, _ = self.get(header)
+                self.assertEqual(response.status_code, 416)
+                self.assertEqual(response['Content-Range'], f'bytes */{len(CONTENT)}')
+
+    def test_no_range(self):
+        response, body = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(body, CONTENT)
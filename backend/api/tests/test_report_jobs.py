@@ -0,0 +1,80 @@
+import socket
+import subprocess
+import sys
+from datetime import date, timedelta
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from api import report_jobs
+from api.models import ReportJob
+from api.report_jobs import expire_stale_jobs, process_owner
+from users.models import User
+
+
+@override_settings(REPORT_JOB_TIMEOUT=600)
+class ExpireStaleJobsTests(TestCase):
+    """Only interrupted jobs are failed, not ones waiting their turn in the pool"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='report_test', email='report@example.com', password='secret')
+        process = subprocess.Popen([sys.executable, '-c', 'pass'])
+        process.wait()
+        cls.dead_owner = f"{socket.gethostname()}:{process.pid}"
+
+    def job(self, status, owner, age):
+        job = ReportJob.objects.create(
+            user=self.user, start_date=date(2024, 1, 1), end_date=date(2024, 1, 7), status=status, owner=owner,
+        )
+        ReportJob.objects.filter(id=job.id).update(updated_at=timezone.now() - timedelta(seconds=age))
+        return job
+
+    def queued_job(self, age):
+        job = self.job('pending', process_owner(), age)
+        report_jobs._queued.add(job.id)
+        self.addCleanup(report_jobs._queued.discard, job.id)
+        return job
+
+    def assertExpired(self, job, expired):
+        job.refresh_from_db()
+        self.assertEqual(job.status == 'failed', expired)
+
+    def test_queued_job_waits_however_long(self):
+        job = self.queued_job(age=3600)
+        self.assertEqual(expire_stale_jobs(), 0)
+        self.assertExpired(job, False)
+
+    def test_running_job_times_out_from_pickup(self):
+        stale = self.job('running', process_owner(), age=601)
+        recent = self.job('running', process_owner(), age=60)
+        report_jobs._queued.update({stale.id, recent.id})
+        self.addCleanup(report_jobs._queued.difference_update, {stale.id, recent.id})
+        self.assertEqual(expire_stale_jobs(), 1)
+        self.assertExpired(stale, True)
+        self.assertExpired(recent, False)
+
+    def test_jobs_of_dead_process_fail_at_once(self):
+        pending = self.job('pending', self.dead_owner, age=5)
+        running = self.job('running', self.dead_owner, age=5)
+        self.assertEqual(expire_stale_jobs(), 2)
+        self.assertExpired(pending, True)
+        self.assertExpired(running, True)
+
+    def test_earlier_process_with_same_pid(self):
+        # Owned by this host and pid but not queued here: a restarted process reused the pid
+        job = self.job('pending', process_owner(), age=5)
+        self.assertEqual(expire_stale_jobs(), 1)
+        self.assertExpired(job, True)
+
+    def test_other_host_and_legacy_jobs(self):
+        other_host = self.job('pending', 'other-host:1234', age=3600)
+        legacy_old = self.job('pending', '', age=601)
+        legacy_recent = self.job('pending', '', age=60)
+        self.assertEqual(expire_stale_jobs(), 1)
+        self.assertExpired(other_host, False)
+        self.assertExpired(legacy_old, True)
+        self.assertExpired(legacy_recent, False)
+
+    def test_queryset_scope(self):
+        job = self.job('pending', self.dead_owner, age=5)
+        self.assertEqual(expire_stale_jobs(ReportJob.objects.exclude(id=job.id)), 0)
+        self.assertExpired(job, False)
@@ -0,0 +1,152 @@
+import json
+from unittest import mock
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from api import usda_cache
+from api.models import Food
+from api.url_import import extract_food_from_html, normalize_url
+from users.models import User
+
+
+def json_ld_page(data):
+    return (
+        '<html><head><title>Page title</title>'
+        f'<script type="application/ld+json">{json.dumps(data)}</script>'
+        '</head><body><p>Lots of text</p></body></html>'
+    ).encode('utf-8')
+
+
+RECIPE = {
+    '@context': 'https://schema.org',
+    '@type': 'Recipe',
+    'name': 'Chickpea curry',
+    'nutrition': {
+        '@type': 'NutritionInformation',
+        'servingSize': '200 g',
+        'calories': '500 kcal',
+        'proteinContent': '20 g',
+        'carbohydrateContent': '60 g',
+        'fatContent': '10 g',
+        'sodiumContent': '400 mg',
+    },
+}
+
+MICRODATA_PAGE = '''
+<html><head><title>Soups</title></head><body>
+<div itemscope itemtype="https://schema.org/Recipe">
+  <h1 itemprop="name">Lentil soup</h1>
+  <div itemprop="nutrition" itemscope itemtype="https://schema.org/NutritionInformation">
+    Serving: <span itemprop="servingSize">250 g</span>
+    <span itemprop="calories">300 calories</span>
+    <meta itemprop="proteinContent" content="15 g">
+    <span itemprop="fatContent">5 g</span>
+  </div>
+</div>
+</body></html>
+'''.encode('utf-8')
+
+
+class NormalizeURLTests(SimpleTestCase):
+
+    def test_tracking_parameters_removed(self):
+        self.assertEqual(
+            normalize_url('https://example.com/r/curry?utm_source=news&id=7&fbclid=abc&UTM_Medium=mail&gclid=x'),
+            'https://example.com/r/curry?id=7',
+        )
+
+    def test_canonical_form(self):
+        self.assertEqual(
+            normalize_url(' HTTPS://Example.COM:443/r/curry?b=2&a=1#nutrition '),
+            'https://example.com/r/curry?a=1&b=2',
+        )
+        self.assertEqual(normalize_url('http://example.com:8080'), 'http://example.com:8080/')
+
+    def test_only_http(self):
+        for url in ('ftp://example.com/food', 'file:///etc/passwd', 'example.com/food'):
+            with self.assertRaises(ValueError):
+                normalize_url(url)
+
+
+class ExtractFoodTests(SimpleTestCase):
+
+    def test_json_ld_scaled_per_100g(self):
+        food = extract_food_from_html(json_ld_page(RECIPE))
+        self.assertEqual(food['name'], 'Chickpea curry')
+        self.assertEqual(
+            {field: food[field] for field in ('calories', 'protein', 'carbs', 'fat', 'sodium')},
+            {'calories': 250, 'protein': 10, 'carbs': 30, 'fat': 5, 'sodium': 200},
+        )
+
+    def test_json_ld_without_serving_size(self):
+        nutrition = {key: value for key, value in RECIPE['nutrition'].items() if key != 'servingSize'}
+        food = extract_food_from_html(json_ld_page({**RECIPE, 'nutrition': nutrition}))
+        self.assertEqual((food['calories'], food['protein']), (500, 20))
+
+    def test_json_ld_graph(self):
+        page = json_ld_page({'@context': 'https://schema.org', '@graph': [
+            {'@type': 'WebPage', 'name': 'Recipes'},
+            RECIPE,
+        ]})
+        self.assertEqual(extract_food_from_html(page)['name'], 'Chickpea curry')
+
+    def test_microdata_fallback(self):
+        food = extract_food_from_html(MICRODATA_PAGE)
+        self.assertEqual(food['name'], 'Lentil soup')
+        self.assertEqual((food['calories'], food['protein'], food['fat']), (120, 6, 2))
+
+    def test_no_nutrition(self):
+        page = b'<html><head><title>About us</title></head><body><p>No food here</p></body></html>'
+        self.assertIsNone(extract_food_from_html(page))
+
+
+@override_settings(
+    USDA_CACHE_BACKEND='django',
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'url-import-tests'}},
+)
+class ImportFoodFromURLTests(TestCase):
+    """foods/import-url/ deduplicates on the normalized URL"""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(username='url_import', email='url@example.com', password='secret')
+        cls.headers = {'Authorization': f'Bearer {RefreshToken.for_user(user).access_token}'}
+
+    def setUp(self):
+        usda_cache._caches.clear()
+        self.addCleanup(usda_cache._caches.clear)
+        patcher = mock.patch('api.views.fetch_page', mock.AsyncMock(return_value=json_ld_page(RECIPE)))
+        self.fetch_page = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def post(self, url):
+        return await self.async_client.post(
+            '/api/foods/import-url/', {'url': url}, content_type='application/json', headers=self.headers,
+        )
+
+    async def test_second_import_returns_existing_food(self):
+        response = await self.post('https://example.com/r/curry?utm_source=news')
+        self.assertEqual(response.status_code, 201)
+        food = response.json()['food']
+        self.assertEqual((food['name'], food['calories']), ('Chickpea curry', 250))
+        self.fetch_page.assert_awaited_once_with('https://example.com/r/curry')
+
+        response = await self.post('https://EXAMPLE.com/r/curry?utm_campaign=spring#nutrition')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['message'], 'Food already exists in database')
+        self.assertEqual(response.json()['food']['id'], food['id'])
+        self.assertEqual(self.fetch_page.await_count, 1)
+        self.assertEqual(await Food.objects.filter(source_url='https://example.com/r/curry').acount(), 1)
+        self.assertEqual(await Food.objects.acount(), 1)
+
+    async def test_page_without_nutrition_cached(self):
+        self.fetch_page.return_value = b'<html><head><title>About</title></head><body></body></html>'
+        for _ in range(2):
+            response = await self.post('https://example.com/about')
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.fetch_page.await_count, 1)
+        self.assertEqual(await Food.objects.acount(), 0)
+
+    async def test_invalid_url(self):
+        response = await self.post('ftp://example.com/food')
+        self.assertEqual(response.status_code, 400)
+        self.fetch_page.assert_not_awaited()
@@ -0,0 +1,58 @@
+import shutil
+import tempfile
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+from api.usda_cache import DjangoUSDACache, SQLiteUSDACache, make_cache_key
+
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'usda-cache-tests'}}
+
+
+@override_settings(CACHES=LOCMEM)
+class DjangoCacheNamespaceTests(SimpleTestCase):
+    """clear() of one namespace leaves the other namespaces and unrelated keys alone"""
+
+    def setUp(self):
+        caches['default'].clear()
+        self.usda = DjangoUSDACache(namespace='usda')
+        self.pages = DjangoUSDACache(namespace='pages')
+        self.key = make_cache_key('food', 1)
+
+    def test_namespaces_are_separate(self):
+        self.usda.set(self.key, {'fdcId': 1})
+        self.assertEqual(self.usda.get(self.key), ({'fdcId': 1}, True))
+        self.assertEqual(self.pages.get(self.key), (None, False))
+
+    def test_clear_only_own_namespace(self):
+        caches['default'].set('session:abc', 'kept')
+        self.usda.set(self.key, {'fdcId': 1})
+        self.pages.set(self.key, {'food': None})
+        self.pages.clear()
+        self.assertEqual(self.pages.get(self.key), (None, False))
+        self.assertEqual(self.usda.get(self.key), ({'fdcId': 1}, True))
+        self.assertEqual(caches['default'].get('session:abc'), 'kept')
+        # Other instances (processes) of the namespace see the clear too
+        self.assertEqual(DjangoUSDACache(namespace='pages').get(self.key), (None, False))
+        self.pages.set(self.key, {'food': 2})
+        self.assertEqual(self.pages.get(self.key), ({'food': 2}, True))
+
+    def test_evicted_generation_leaves_no_old_entry(self):
+        self.usda.set(self.key, {'fdcId': 1})
+        caches['default'].delete('usda:generation')
+        self.assertEqual(self.usda.get(self.key), (None, False))
+
+
+class SQLiteCacheNamespaceTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.usda = SQLiteUSDACache(f'{directory}/cache.sqlite3', namespace='usda')
+        self.ai = SQLiteUSDACache(f'{directory}/cache.sqlite3', namespace='ai')
+
+    def test_clear_only_own_namespace(self):
+        key = make_cache_key('food', 1)
+        self.usda.set(key, {'fdcId': 1})
+        self.ai.set(key, {'answer': 1})
+        self.ai.clear()
+        self.assertEqual(self.ai.get(key), (None, False))
+        self.assertEqual(self.usda.get(key), ({'fdcId': 1}, True))
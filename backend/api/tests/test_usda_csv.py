@@ -0,0 +1,54 @@
+import csv
+import json
+import os
+import tempfile
+import zipfile
+from django.conf import settings
+from django.test import SimpleTestCase
+from api.usda_csv import iter_csv_foods
+from api.usda_parser import parse_usda_food
+
+FOUNDATION_ZIP = os.path.join(settings.BASE_DIR, 'data', 'usda', 'foundation_foods.zip')
+
+
+def write_csv_bundle(foods, directory):
+    """Write JSON foods as a FoodData Central CSV bundle (food, food_nutrient, nutrient)"""
+    nutrients = {}
+    with open(os.path.join(directory, 'food.csv'), 'w', newline='', encoding='utf-8') as food_file, \
+            open(os.path.join(directory, 'food_nutrient.csv'), 'w', newline='', encoding='utf-8') as nutrient_file:
+        food_writer = csv.writer(food_file, quoting=csv.QUOTE_ALL)
+        nutrient_writer = csv.writer(nutrient_file, quoting=csv.QUOTE_ALL)
+        food_writer.writerow(['fdc_id', 'data_type', 'description', 'food_category_id', 'publication_date'])
+        nutrient_writer.writerow(['id', 'fdc_id', 'nutrient_id', 'amount'])
+        for food in foods:
+            food_writer.writerow([food['fdcId'], 'foundation_food', food['description'], '', ''])
+            # Sample records of the full download are not imported
+            food_writer.writerow([food['fdcId'] + 5_000_000, 'sub_sample_food', food['description'], '', ''])
+            for entry in food.get('foodNutrients', []):
+                info = entry['nutrient']
+                nutrients[info['id']] = info
+                nutrient_writer.writerow([entry.get('id', ''), food['fdcId'], info['id'], entry.get('amount', '')])
+    with open(os.path.join(directory, 'nutrient.csv'), 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f, quoting=csv.QUOTE_ALL)
+        writer.writerow(['id', 'name', 'unit_name', 'nutrient_nbr', 'rank'])
+        for info in nutrients.values():
+            writer.writerow([info['id'], info['name'], info.get('unitName', ''), info.get('number', ''), ''])
+
+
+class CsvJsonParityTests(SimpleTestCase):
+    """Both distributions of a release must store identical Food rows"""
+
+    def test_foundation_foods(self):
+        with zipfile.ZipFile(FOUNDATION_ZIP) as archive:
+            foods = json.loads(archive.read('foundationDownload.json'))['FoundationFoods']
+
+        with tempfile.TemporaryDirectory() as directory:
+            write_csv_bundle(foods, directory)
+            csv_foods = [food for _, food in iter_csv_foods(directory)]
+
+        json_foods = [parse_usda_food(food) for food in foods]
+        self.assertEqual(len(csv_foods), len(json_foods))
+        for json_food, csv_food in zip(json_foods, csv_foods):
+            with self.subTest(fdc_id=json_food['usda_fdc_id']):
+                self.assertEqual(csv_food, json_food)
+                self.assertEqual(csv_food['content_hash'], json_food['content_hash'])
@@ -0,0 +1,68 @@
+import os
+from unittest import mock
+from django.test import TransactionTestCase
+from api import usda_enrichment
+from api.models import Food
+from api.tests.usda_stub import USDAStubTestMixin
+from api.usda_enrichment import schedule_enrichment, wait_for_enrichment
+from api.usda_importer import USDADataImporter
+
+
+def search_hit(fdc_id):
+    """Search result of a food without energy data"""
+    return {'fdcId': fdc_id, 'description': f'Food {fdc_id}', 'dataType': 'Foundation', 'foodNutrients': []}
+
+
+# The enrichment thread has its own database connection, so the rows must be committed
+class EnrichmentTests(USDAStubTestMixin, TransactionTestCase):
+    """Deferred, batched completion of foods without energy data"""
+
+    def setUp(self):
+        super().setUp()
+        for patcher in (
+            mock.patch.dict(os.environ, {'USDA_API_KEY': 'test'}),
+            mock.patch.object(usda_enrichment, 'ENRICH_BATCH_DELAY', 0.05),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(wait_for_enrichment)
+        for fdc_id in (501, 502, 503):
+            Food.objects.create(name=f'Food {fdc_id}', usda_fdc_id=fdc_id, data_source='usda',
+                                calories=0, protein=0, carbs=0, fat=0)
+
+    def test_scheduled_ids_fetched_in_one_batch(self):
+        schedule_enrichment([501, 502])
+        schedule_enrichment([502, 503, 504])
+        wait_for_enrichment()
+        self.assertEqual([request[3]['fdcIds'] for request in self.stub.calls('/foods')], [[501, 502, 503, 504]])
+        self.assertEqual(
+            dict(Food.objects.values_list('usda_fdc_id', 'calories')),
+            {501: 501, 502: 502, 503: 503},
+        )
+        self.assertEqual(Food.objects.get(usda_fdc_id=501).protein, 2.5)
+        self.assertEqual(usda_enrichment._pending, set())
+        self.assertFalse(usda_enrichment._flush_scheduled)
+
+    def test_parse_schedules_and_uses_fetched_details(self):
+        importer = USDADataImporter()
+        self.assertEqual(importer.parse_food_data(search_hit(501))['calories'], 0)
+        wait_for_enrichment()
+        self.assertEqual(Food.objects.get(usda_fdc_id=501).calories, 501)
+        # Later searches parse the cached details without another request
+        self.assertEqual(importer.parse_food_data(search_hit(501))['calories'], 501)
+        wait_for_enrichment()
+        self.assertEqual(len(self.stub.calls('/foods')), 1)
+
+    def test_ids_without_details_not_fetched_again(self):
+        self.stub.omitted_ids = {503}
+        importer = USDADataImporter()
+        importer.parse_foods([search_hit(fdc_id) for fdc_id in (502, 503)])
+        wait_for_enrichment()
+        self.assertEqual(Food.objects.get(usda_fdc_id=502).calories, 502)
+        self.assertEqual(Food.objects.get(usda_fdc_id=503).calories, 0)
+        self.assertTrue(importer.is_missing_details(503))
+
+        importer.parse_foods([search_hit(503)])
+        wait_for_enrichment()
+        self.assertEqual(len(self.stub.calls('/foods')), 1)
+        self.assertEqual(usda_enrichment._pending, set())
@@ -0,0 +1,137 @@
+from django.test import SimpleTestCase
+from api.tests.usda_stub import USDAStubTestMixin, food_details
+from api.usda_cache import cache_get, make_cache_key
+from api.usda_importer import USDADataImporter, get_rate_limiter
+
+
+class USDAClientTests(USDAStubTestMixin, SimpleTestCase):
+    """Pooled session and token bucket of the importer against a local stub API"""
+
+    usda_settings = {
+        'USDA_RATE_LIMIT_PER_HOUR': 36000,  # 10 requests per second
+        'USDA_RATE_LIMIT_BURST': 3,
+        'USDA_RATE_LIMIT_MAX_WAIT': 5,
+    }
+
+    def test_requests_reuse_one_connection(self):
+        importer = USDADataImporter(api_key='test')
+        for query in ('apple', 'pear', 'plum'):
+            result = importer.search_foods(query, use_cache=False)
+            self.assertEqual(result['totalHits'], 1)
+        importer.get_food_details(42, use_cache=False)
+        self.assertEqual(len(self.stub.calls('/foods/search')), 3)
+        self.assertEqual(len(self.stub.client_ports()), 1)
+
+    def test_bucket_throttles_after_burst(self):
+        bucket = get_rate_limiter()
+        self.assertAlmostEqual(bucket.rate, 10)
+        self.assertEqual(bucket.capacity, 3)
+
+        importer = USDADataImporter(api_key='test')
+        for page in range(1, 6):
+            importer.search_foods('apple', page_number=page)
+        times = [request[0] for request in self.stub.calls('/foods/search')]
+        self.assertEqual(len(times), 5)
+        # The burst goes out at once, then one request per 0.1 s
+        self.assertLess(times[2] - times[0], 0.08)
+        self.assertGreaterEqual(times[4] - times[0], 0.18)
+
+    def test_cached_search_takes_no_token(self):
+        importer = USDADataImporter(api_key='test')
+        for _ in range(5):
+            importer.search_foods('apple')
+        self.assertEqual(len(self.stub.calls('/foods/search')), 1)
+        self.assertGreaterEqual(get_rate_limiter().tokens, 1)
+
+
+class USDARateLimitTests(USDAStubTestMixin, SimpleTestCase):
+    """Calls give up once the bucket has no token within USDA_RATE_LIMIT_MAX_WAIT"""
+
+    usda_settings = {
+        'USDA_RATE_LIMIT_PER_HOUR': 3600,  # one request per second
+        'USDA_RATE_LIMIT_BURST': 1,
+        'USDA_RATE_LIMIT_MAX_WAIT': 0.05,
+    }
+
+    def test_rate_limit_exceeded_after_max_wait(self):
+        importer = USDADataImporter(api_key='test')
+        self.assertEqual(importer.search_foods('apple', use_cache=False)['totalHits'], 1)
+        with self.assertLogs('api.usda_importer', 'WARNING'):
+            result = importer.search_foods('pear', use_cache=False)
+            self.assertEqual(result, {'foods': [], 'totalHits': 0, 'error': 'rate_limit_exceeded'})
+            self.assertEqual(len(self.stub.calls('/foods/search')), 1)
+            self.assertIsNone(importer.get_food_details(42))
+        self.assertEqual(self.stub.calls('/food/42'), [])
+
+    def test_stale_cache_served_when_rate_limited(self):
+        importer = USDADataImporter(api_key='test')
+        fresh = importer.search_foods('apple')
+        with self.assertLogs('api.usda_importer', 'WARNING'):
+            self.assertEqual(importer.search_foods('apple', use_cache=False), fresh)
+        self.assertEqual(len(self.stub.calls('/foods/search')), 1)
+
+    def test_server_429_drains_bucket(self):
+        self.stub.status = 429
+        importer = USDADataImporter(api_key='test')
+        with self.assertLogs('api.usda_importer', 'WARNING'):
+            self.assertEqual(importer.search_foods('apple')['error'], 'rate_limit_exceeded')
+        self.assertLess(get_rate_limiter().tokens, 1)
+
+    async def test_async_search_rate_limited(self):
+        importer = USDADataImporter(api_key='test')
+        self.assertEqual((await importer.asearch_foods('apple', use_cache=False))['totalHits'], 1)
+        with self.assertLogs('api.usda_importer', 'WARNING'):
+            result = await importer.asearch_foods('pear', use_cache=False)
+        self.assertEqual(result['error'], 'rate_limit_exceeded')
+        self.assertEqual(len(self.stub.calls('/foods/search')), 1)
+
+
+class FoodsDetailsBatchTests(USDAStubTestMixin, SimpleTestCase):
+    """get_foods_details: POST /foods fan-out in batches of FOODS_BATCH_SIZE"""
+
+    usda_settings = {'USDA_RATE_LIMIT_BURST': 100, 'USDA_FETCH_WORKERS': 4}
+
+    def batches(self):
+        return sorted((request[3]['fdcIds'] for request in self.stub.calls('/foods')), key=lambda ids: ids[0])
+
+    def test_batches_of_20(self):
+        importer = USDADataImporter(api_key='test')
+        fdc_ids = list(range(1000, 1045))
+        details = importer.get_foods_details(fdc_ids + [1000, '1001'])
+        self.assertEqual(sorted(details), fdc_ids)
+        self.assertEqual(details[1007], food_details(1007))
+        self.assertEqual(self.batches(), [fdc_ids[:20], fdc_ids[20:40], fdc_ids[40:]])
+
+    def test_cache_write_through(self):
+        importer = USDADataImporter(api_key='test')
+        importer.get_foods_details(range(1000, 1030))
+        for fdc_id in (1000, 1029):
+            self.assertEqual(cache_get(make_cache_key('food', fdc_id)), (food_details(fdc_id), True))
+        # Cached foods are not requested again, only the new ones
+        details = importer.get_foods_details(range(1020, 1035))
+        self.assertEqual(sorted(details), list(range(1020, 1035)))
+        self.assertEqual(self.batches()[-1], list(range(1030, 1035)))
+        self.assertEqual(len(self.stub.calls('/foods')), 3)
+        self.assertIsNotNone(importer.get_food_details(1025))
+        self.assertEqual(self.stub.calls('/food/1025'), [])
+
+    def test_partial_failure(self):
+        self.stub.failing_ids = {1025}
+        self.stub.omitted_ids = {1003}
+        importer = USDADataImporter(api_key='test')
+        with self.assertLogs('api.usda_importer', 'ERROR'):
+            details = importer.get_foods_details(range(1000, 1045))
+        # The failed batch is left out; the other batches still arrive
+        expected = [fdc_id for fdc_id in range(1000, 1045) if fdc_id != 1003 and not 1020 <= fdc_id < 1040]
+        self.assertEqual(sorted(details), expected)
+        self.assertEqual(len(self.stub.calls('/foods')), 3)
+        # Only an ID a successful batch left out counts as having no details
+        self.assertTrue(importer.is_missing_details(1003))
+        self.assertFalse(importer.is_missing_details(1025))
+        self.assertFalse(importer.is_missing_details(1030))
+        # The failed batch is requested again on the next call
+        self.stub.failing_ids = set()
+        details = importer.get_foods_details(range(1000, 1045))
+        self.assertEqual(len(details), 44)
+        retried = sorted(fdc_id for request in self.stub.calls('/foods')[3:] for fdc_id in request[3]['fdcIds'])
+        self.assertEqual(retried, [1003] + list(range(1020, 1040)))
@@ -0,0 +1,62 @@
+import io
+import json
+from django.test import SimpleTestCase
+from api.usda_parser import iter_parsed_foods_parallel, parse_usda_food, pool_context
+from api.usda_stream import decode_array_piece, iter_json_array, iter_json_array_pieces
+
+
+def make_foods(count):
+    return [
+        {
+            'fdcId': 100000 + i,
+            'description': f'Food {i}, raw {{"[,\\n{{',
+            'dataType': 'Foundation',
+            'foodNutrients': [
+                {'nutrient': {'id': 1008, 'number': '208', 'name': 'Energy'}, 'amount': 50.0 + i},
+                {'nutrient': {'id': 1003, 'number': '203', 'name': 'Protein'}, 'amount': 1.5},
+                {'nutrient': {'id': 1005, 'number': '205', 'name': 'Carbohydrate, by difference'}, 'amount': 12},
+            ],
+            'foodPortions': [{'measureUnit': {'id': 1000, 'name': 'cup'}, 'gramWeight': 128}],
+        }
+        for i in range(count)
+    ]
+
+
+class JsonArrayPiecesTests(SimpleTestCase):
+    """Pieces cut for parser workers must hold exactly the elements of the array"""
+
+    foods = make_foods(40)
+    layouts = {
+        'compact': json.dumps({'FoundationFoods': foods}, separators=(',', ':')),
+        'indent=0': json.dumps({'FoundationFoods': foods}, indent=0),
+        'indent=2': json.dumps({'FoundationFoods': foods}, indent=2),
+        'line per food': '{"FoundationFoods": [\n' + ',\n'.join(json.dumps(food) for food in foods) + '\n]}',
+    }
+
+    def test_serial_reader(self):
+        for layout, text in self.layouts.items():
+            with self.subTest(layout=layout):
+                self.assertEqual(list(iter_json_array(io.StringIO(text), chunk_size=256)), self.foods)
+
+    def test_pieces(self):
+        for layout, text in self.layouts.items():
+            for chunk_size in (256, 4096, 1024 * 1024):
+                with self.subTest(layout=layout, chunk_size=chunk_size):
+                    items = []
+                    for _, piece in iter_json_array_pieces(io.StringIO(text), chunk_size=chunk_size):
+                        items.extend(decode_array_piece(piece))
+                    self.assertEqual(items, self.foods)
+
+    def test_worker_processes(self):
+        expected = [parse_usda_food(food) for food in self.foods]
+        for layout, text in self.layouts.items():
+            with self.subTest(layout=layout):
+                parsed = iter_parsed_foods_parallel(io.StringIO(text), workers=2)
+                try:
+                    self.assertEqual([food for _, food in parsed], expected)
+                finally:
+                    parsed.close()
+
+    def test_worker_processes_not_forked(self):
+        # The pool starts its processes from the reader thread
+        self.assertIn(pool_context().get_start_method(), ('forkserver', 'spawn'))
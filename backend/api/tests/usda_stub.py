@@ -0,0 +1,129 @@
+"""
+Local stand-in for the USDA FoodData Central API, for importer tests
+
+USDAStubTestMixin starts a threaded HTTP/1.1 server on a free port, points
+USDA_API_BASE_URL at it and gives each test a fresh HTTP session, rate
+limiter and an empty USDA cache in a temporary directory.
+"""
+import json
+import shutil
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from django.test import override_settings
+from api import usda_cache, usda_importer
+
+
+def food_details(fdc_id):
+    """Details of a stub food: energy equal to its FDC id"""
+    return {
+        'fdcId': fdc_id,
+        'description': f'Food {fdc_id}',
+        'dataType': 'Foundation',
+        'foodNutrients': [
+            {'nutrient': {'id': 1008, 'number': '208', 'name': 'Energy', 'unitName': 'kcal'}, 'amount': fdc_id},
+            {'nutrient': {'id': 1003, 'number': '203', 'name': 'Protein', 'unitName': 'g'}, 'amount': 2.5},
+        ],
+    }
+
+
+class USDAStubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), USDAStubHandler)
+        self.requests = []  # (time, method, path, JSON body, client port)
+        self.lock = threading.Lock()
+        self.omitted_ids = set()  # left out of POST /foods responses
+        self.failing_ids = set()  # POST /foods batches containing one of these answer 500
+        self.status = 200  # status of foods/search
+
+    @property
+    def base_url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    def calls(self, path):
+        with self.lock:
+            return [request for request in self.requests if request[2].split('?')[0] == path]
+
+    def client_ports(self):
+        with self.lock:
+            return {request[4] for request in self.requests}
+
+
+class USDAStubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive
+
+    def send_json(self, body, status=200):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def record(self, body=None):
+        with self.server.lock:
+            self.server.requests.append((time.monotonic(), self.command, self.path, body, self.client_address[1]))
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = json.loads(self.rfile.read(length) or b'{}')
+        self.record(body)
+        path = self.path.split('?')[0]
+        if path == '/foods/search':
+            if self.server.status != 200:
+                return self.send_json({'error': 'stub'}, self.server.status)
+            return self.send_json({'totalHits': 1, 'foods': [food_details(1)]})
+        if path == '/foods':
+            fdc_ids = body.get('fdcIds', [])
+            if self.server.failing_ids.intersection(fdc_ids):
+                return self.send_json({'error': 'stub failure'}, 500)
+            return self.send_json([food_details(fdc_id) for fdc_id in fdc_ids if fdc_id not in self.server.omitted_ids])
+        self.send_json({'error': 'not found'}, 404)
+
+    def do_GET(self):
+        self.record()
+        fdc_id = int(self.path.split('?')[0].rsplit('/', 1)[-1])
+        self.send_json(food_details(fdc_id))
+
+    def log_message(self, format, *args):
+        pass
+
+
+class USDAStubTestMixin:
+    """Runs each test against a fresh USDAStubServer (self.stub)"""
+
+    usda_settings = {}
+
+    def setUp(self):
+        super().setUp()
+        self.stub = USDAStubServer()
+        thread = threading.Thread(target=self.stub.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(self.stub.server_close)
+        self.addCleanup(self.stub.shutdown)
+
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
+        overrides = override_settings(**{
+            'USDA_API_BASE_URL': self.stub.base_url,
+            'USDA_CACHE_BACKEND': 'sqlite',
+            'USDA_CACHE_PATH': f'{cache_dir}/usda.sqlite3',
+            **self.usda_settings,
+        })
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.reset_clients()
+        self.addCleanup(self.reset_clients)
+
+    @staticmethod
+    def reset_clients():
+        """Drop the process-wide session, rate limiter and cache stores so they pick up the settings"""
+        if usda_importer._session is not None:
+            usda_importer._session.close()
+        usda_importer._session = None
+        usda_importer._rate_limiter = None
+        usda_cache._caches.clear()
@@ -26,6 +26,10 @@ urlpatterns = [
     path('check-notifications/', views.check_notifications, name='check-notifications'),
     path('calculate-nutrition/', views.calculate_nutrition, name='calculate-nutrition'),
     path('nutrition-report-pdf/', views.nutrition_report_pdf, name='nutrition-report-pdf'),
+    path('report-jobs/', views.report_jobs, name='report-jobs'),
+    path('report-jobs/<int:job_id>/', views.report_job_detail, name='report-job-detail'),
+    path('report-jobs/<int:job_id>/download/', views.report_job_download, name='report-job-download'),
+    path('export/<str:export_format>/', views.export_diary, name='export-diary'),
     path('', include(router.urls)),
 ]
 
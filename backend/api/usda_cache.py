@@ -0,0 +1,220 @@
+"""
+Shared cache of USDA FoodData Central API responses
+
+search_foods and get_food_details responses are cached in a store shared by
+all worker processes, so the 1000 requests/hour USDA quota is spent once per
+query rather than once per process, and survives restarts. Two backends are
+available, selected with settings.USDA_CACHE_BACKEND:
+
+- 'sqlite' (default): a WAL-mode SQLite file at settings.USDA_CACHE_PATH,
+  with TTL expiry and LRU eviction by last access time
+- 'django': a Django cache (settings.USDA_CACHE_ALIAS), e.g. Redis or
+  Memcached, which does its own eviction
+
+Entries stay readable as stale for USDA_CACHE_STALE_TTL after they expire, so
+the importer can still answer when the API is rate limited or unavailable.
+Cache errors are logged and treated as misses, never raised to callers.
+Async views use acache_get/acache_set, which run the blocking store access
+in a worker thread.
+
+Other data reuses the store under its own namespace (a separate table in
+the SQLite file, a key prefix in a Django cache), so it never mixes with
+USDA responses: 'pages' holds the foods extracted by import from URL and
+'ai' the cached AI responses (ai/response_cache.py).
+"""
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 24 * 3600
+DEFAULT_STALE_TTL = 7 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 10000
+
+_caches = {}
+_cache_lock = threading.Lock()
+
+
+def make_cache_key(kind, *parts):
+    """Cache key for a request; hashed so any backend accepts it"""
+    raw = '|'.join(str(part) for part in parts)
+    return f"{kind}:{hashlib.sha256(raw.encode('utf-8')).hexdigest()}"
+
+
+class SQLiteUSDACache:
+    """Response cache in a table of an SQLite file shared by all processes"""
+
+    # Evict once per this many writes instead of on every write
+    EVICT_EVERY = 100
+
+    def __init__(self, path, ttl=DEFAULT_TTL, stale_ttl=DEFAULT_STALE_TTL, max_entries=DEFAULT_MAX_ENTRIES,
+                 namespace='usda'):
+        self.path = Path(path)
+        self.table = f'{namespace}_cache'
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._writes = 0
+
+    def _connection(self):
+        """Per-thread connection (sqlite3 connections are not thread-safe)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                f'CREATE TABLE IF NOT EXISTS {self.table} ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+                'stored_at REAL NOT NULL, accessed_at REAL NOT NULL)'
+            )
+            conn.execute(f'CREATE INDEX IF NOT EXISTS {self.table}_accessed ON {self.table} (accessed_at)')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        """Return (value, fresh); (None, False) on a miss"""
+        conn = self._connection()
+        row = conn.execute(f'SELECT value, stored_at FROM {self.table} WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None, False
+        value, stored_at = row
+        now = time.time()
+        age = now - stored_at
+        if age >= self.ttl + self.stale_ttl:
+            return None, False
+        conn.execute(f'UPDATE {self.table} SET accessed_at = ? WHERE key = ?', (now, key))
+        return json.loads(value), age < self.ttl
+
+    def set(self, key, value):
+        conn = self._connection()
+        now = time.time()
+        conn.execute(
+            f'INSERT OR REPLACE INTO {self.table} (key, value, stored_at, accessed_at) VALUES (?, ?, ?, ?)',
+            (key, json.dumps(value), now, now),
+        )
+        self._writes += 1
+        if self._writes % self.EVICT_EVERY == 1:
+            self.evict(now)
+
+    def evict(self, now=None):
+        """Drop entries past their stale TTL, then least recently used ones over max_entries"""
+        conn = self._connection()
+        now = now or time.time()
+        conn.execute(f'DELETE FROM {self.table} WHERE stored_at < ?', (now - self.ttl - self.stale_ttl,))
+        cutoff = conn.execute(
+            f'SELECT accessed_at FROM {self.table} ORDER BY accessed_at DESC LIMIT 1 OFFSET ?',
+            (self.max_entries,),
+        ).fetchone()
+        if cutoff:
+            conn.execute(f'DELETE FROM {self.table} WHERE accessed_at <= ?', cutoff)
+
+    def clear(self):
+        self._connection().execute(f'DELETE FROM {self.table}')
+
+
+class DjangoUSDACache:
+    """
+    Response cache in a Django cache backend (eviction left to the backend)
+
+    Keys are prefixed with the namespace and its generation, a number kept
+    in the cache itself; clear() starts a new generation instead of clearing
+    the whole cache, which other namespaces or e.g. sessions may share.
+    """
+
+    def __init__(self, alias='default', ttl=DEFAULT_TTL, stale_ttl=DEFAULT_STALE_TTL, namespace='usda'):
+        from django.core.cache import caches
+        self.cache = caches[alias]
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.namespace = namespace
+        self.generation_key = f'{namespace}:generation'
+
+    def _prefix(self):
+        generation = self.cache.get(self.generation_key)
+        if generation is None:
+            # First use, or the backend evicted it: a new generation leaves no old entry readable
+            self.cache.add(self.generation_key, time.time_ns(), timeout=None)
+            generation = self.cache.get(self.generation_key)
+        return f'{self.namespace}:{generation}:'
+
+    def get(self, key):
+        """Return (value, fresh); (None, False) on a miss"""
+        entry = self.cache.get(self._prefix() + key)
+        if entry is None:
+            return None, False
+        value, stored_at = entry
+        return value, time.time() - stored_at < self.ttl
+
+    def set(self, key, value):
+        self.cache.set(self._prefix() + key, (value, time.time()), timeout=self.ttl + self.stale_ttl)
+
+    def clear(self):
+        """Drop the entries of this namespace only (they expire in the backend on their own)"""
+        self.cache.set(self.generation_key, time.time_ns(), timeout=None)
+
+
+def build_usda_cache(namespace='usda', ttl=None, stale_ttl=None):
+    """
+    Create the cache backend configured in settings for a namespace
+
+    ttl and stale_ttl default to USDA_CACHE_TTL and USDA_CACHE_STALE_TTL.
+    """
+    backend = getattr(settings, 'USDA_CACHE_BACKEND', 'sqlite')
+    if ttl is None:
+        ttl = getattr(settings, 'USDA_CACHE_TTL', DEFAULT_TTL)
+    if stale_ttl is None:
+        stale_ttl = getattr(settings, 'USDA_CACHE_STALE_TTL', DEFAULT_STALE_TTL)
+    if backend == 'django':
+        return DjangoUSDACache(getattr(settings, 'USDA_CACHE_ALIAS', 'default'), ttl, stale_ttl, namespace)
+    if backend == 'sqlite':
+        path = getattr(settings, 'USDA_CACHE_PATH', Path(settings.BASE_DIR) / 'cache' / 'usda.sqlite3')
+        max_entries = getattr(settings, 'USDA_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES)
+        return SQLiteUSDACache(path, ttl, stale_ttl, max_entries, namespace)
+    raise ValueError(f"Unknown USDA_CACHE_BACKEND: {backend!r} (expected 'sqlite' or 'django')")
+
+
+def get_usda_cache(namespace='usda', ttl=None, stale_ttl=None):
+    """Process-wide cache instance of a namespace, created on first use with the given TTLs"""
+    cache = _caches.get(namespace)
+    if cache is None:
+        with _cache_lock:
+            cache = _caches.get(namespace)
+            if cache is None:
+                cache = _caches[namespace] = build_usda_cache(namespace, ttl, stale_ttl)
+    return cache
+
+
+def cache_get(key, namespace='usda'):
+    """Cached (value, fresh) for key; cache failures count as a miss"""
+    try:
+        return get_usda_cache(namespace).get(key)
+    except Exception as e:
+        logger.warning(f"{namespace} cache read failed: {e}")
+        return None, False
+
+
+def cache_set(key, value, namespace='usda'):
+    try:
+        get_usda_cache(namespace).set(key, value)
+    except Exception as e:
+        logger.warning(f"{namespace} cache write failed: {e}")
+
+
+async def acache_get(key, namespace='usda'):
+    """cache_get for async code, off the event loop"""
+    return await sync_to_async(cache_get, thread_sensitive=False)(key, namespace)
+
+
+async def acache_set(key, value, namespace='usda'):
+    """cache_set for async code, off the event loop"""
+    await sync_to_async(cache_set, thread_sensitive=False)(key, value, namespace)
@@ -0,0 +1,201 @@
+"""
+Importer for the CSV distribution of USDA FoodData Central
+
+The bundle (a directory or the downloaded zip) holds food.csv (one row per
+food), nutrient.csv (nutrient definitions) and food_nutrient.csv, a long
+table with one row per food and nutrient. food_nutrient.csv is streamed
+row by row from the csv reader into float arrays (one per Food nutrient
+field and match kind), indexed by the position of the food in food.csv, so
+neither the file nor per-food objects are held in memory while scanning
+the largest file. Nutrients are matched like
+extract_nutrients() matches the entries of a JSON food, and foods are
+emitted in food.csv order with the same normalization as the JSON importer
+(build_food_fields), so both formats of a release store identical rows.
+"""
+import csv
+import hashlib
+import io
+import math
+import os
+import zipfile
+from array import array
+from contextlib import contextmanager
+from .usda_parser import NUTRIENT_FIELDS, NUTRIENT_FIELDS_BY_ID, build_food_fields, nutrient_field_for_name
+from .usda_stream import file_content_hash
+
+BUNDLE_FILES = ('food.csv', 'food_nutrient.csv', 'nutrient.csv')
+
+# food.csv data types imported as foods, with the dataType labels of the JSON
+# dumps (sample and acquisition records of the full download are skipped)
+CSV_DATA_TYPES = {
+    'foundation_food': 'Foundation',
+    'sr_legacy_food': 'SR Legacy',
+    'branded_food': 'Branded',
+    'survey_fndds_food': 'Survey (FNDDS)',
+}
+
+
+def _find_member(names, filename):
+    for name in names:
+        if name == filename or name.endswith('/' + filename):
+            return name
+    return None
+
+
+def is_csv_bundle(path):
+    """Whether path is a directory or zip archive holding a food.csv"""
+    if os.path.isdir(path):
+        return os.path.exists(os.path.join(path, 'food.csv'))
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            return _find_member(archive.namelist(), 'food.csv') is not None
+    return False
+
+
+@contextmanager
+def open_bundle_file(path, filename):
+    """Open one CSV file of a bundle directory or zip archive as text"""
+    if os.path.isdir(path):
+        with open(os.path.join(path, filename), newline='', encoding='utf-8') as f:
+            yield f
+        return
+
+    with zipfile.ZipFile(path) as archive:
+        member = _find_member(archive.namelist(), filename)
+        if member is None:
+            raise FileNotFoundError(f'{filename} not found in {path}')
+        with archive.open(member) as raw, io.TextIOWrapper(raw, encoding='utf-8', newline='') as f:
+            yield f
+
+
+def bundle_content_hash(path):
+    """SHA-256 identifying a bundle release (of the zip, or of the directory's files)"""
+    if not os.path.isdir(path):
+        return file_content_hash(path)
+    digest = hashlib.sha256()
+    for filename in BUNDLE_FILES:
+        file_path = os.path.join(path, filename)
+        if os.path.exists(file_path):
+            digest.update(file_content_hash(file_path).encode('ascii'))
+    return digest.hexdigest()
+
+
+def _column_indexes(header, *names):
+    missing = [name for name in names if name not in header]
+    if missing:
+        raise ValueError(f"Missing CSV column(s): {', '.join(missing)}")
+    return [header.index(name) for name in names]
+
+
+def load_nutrient_fields(path):
+    """
+    Map nutrient ids of the bundle (as strings) to (Food field, keyed)
+
+    Resolved as extract_nutrients() resolves a JSON nutrient entry: by FDC
+    id or full legacy nutrient number through NUTRIENT_FIELDS (keyed=True),
+    otherwise by nutrient name, e.g. "Energy (Atwater General Factors)"
+    (keyed=False; energy in kJ is left out). Without nutrient.csv only the
+    known FoodData Central ids are mapped.
+    """
+    fields = {str(nutrient_id): (field, True) for nutrient_id, field in NUTRIENT_FIELDS_BY_ID.items()}
+    try:
+        with open_bundle_file(path, 'nutrient.csv') as f:
+            reader = csv.reader(f)
+            id_col, number_col, name_col, unit_col = _column_indexes(
+                next(reader), 'id', 'nutrient_nbr', 'name', 'unit_name'
+            )
+            for row in reader:
+                nutrient_id = row[id_col]
+                field = NUTRIENT_FIELDS.get(nutrient_id) or NUTRIENT_FIELDS.get(row[number_col])
+                if field:
+                    fields[nutrient_id] = (field, True)
+                    continue
+                field = nutrient_field_for_name(row[name_col]) if row[name_col] else None
+                if field and not (field == 'calories' and row[unit_col].lower() == 'kj'):
+                    fields[nutrient_id] = (field, False)
+    except FileNotFoundError:
+        pass
+    return fields
+
+
+def load_food_index(path):
+    """Position of every importable food in food.csv, keyed by fdc_id string"""
+    index = {}
+    with open_bundle_file(path, 'food.csv') as f:
+        reader = csv.reader(f)
+        fdc_col, type_col = _column_indexes(next(reader), 'fdc_id', 'data_type')
+        for row in reader:
+            if row[type_col] in CSV_DATA_TYPES and row[fdc_col] not in index:
+                index[row[fdc_col]] = len(index)
+    return index
+
+
+def pivot_nutrients(path, index, nutrient_fields):
+    """
+    Pivot food_nutrient.csv into columns per Food nutrient field
+
+    Returns {(field, keyed): array('d')} aligned with index; NaN marks
+    foods without a value. As in extract_nutrients(), a later keyed row
+    overrides an earlier one, only the first name-matched row of a field
+    counts, and zero amounts are ignored. Rows of other nutrients and foods
+    are dropped with one dict lookup each.
+    """
+    columns = {key: array('d', [math.nan]) * len(index) for key in set(nutrient_fields.values())}
+    targets = {nutrient_id: (columns[key], key[1]) for nutrient_id, key in nutrient_fields.items()}
+
+    with open_bundle_file(path, 'food_nutrient.csv') as f:
+        reader = csv.reader(f)
+        fdc_col, nutrient_col, amount_col = _column_indexes(next(reader), 'fdc_id', 'nutrient_id', 'amount')
+        for row in reader:
+            target = targets.get(row[nutrient_col])
+            if target is None:
+                continue
+            position = index.get(row[fdc_col])
+            if position is None or not row[amount_col]:
+                continue
+            try:
+                amount = float(row[amount_col])
+            except ValueError:
+                continue
+            column, keyed = target
+            if amount and (keyed or math.isnan(column[position])):
+                column[position] = amount
+    return columns
+
+
+def iter_csv_foods(path, resume_offset=0):
+    """
+    Yield (foods read, parsed food) for a CSV bundle in food.csv order
+
+    parsed food is None for records without an fdc_id or description. The
+    count of foods read can be passed back as resume_offset to continue
+    after that food.
+    """
+    index = load_food_index(path)
+    # Name-matched columns first, so keyed values override them
+    columns = sorted(
+        pivot_nutrients(path, index, load_nutrient_fields(path)).items(),
+        key=lambda item: item[0][1]
+    )
+
+    with open_bundle_file(path, 'food.csv') as f:
+        reader = csv.reader(f)
+        fdc_col, type_col, description_col = _column_indexes(next(reader), 'fdc_id', 'data_type', 'description')
+        for row in reader:
+            position = index.get(row[fdc_col])
+            if position is None or position < (resume_offset or 0):
+                continue
+            description = row[description_col]
+            try:
+                fdc_id = int(row[fdc_col])
+            except ValueError:
+                fdc_id = None
+            if not fdc_id or not description:
+                yield position + 1, None
+                continue
+            nutrients = {
+                field: column[position]
+                for (field, keyed), column in columns
+                if not math.isnan(column[position])
+            }
+            yield position + 1, build_food_fields(fdc_id, description, nutrients, CSV_DATA_TYPES[row[type_col]])
@@ -0,0 +1,99 @@
+"""
+Deferred, batched completion of USDA search results without energy data
+
+Search hits sometimes lack the energy nutrient. Instead of fetching each
+one's details inline while a search request waits, parse_food_data returns
+the partial result and queues the fdcId here. A per-process background
+thread collects the IDs queued within a short window, fetches them with one
+batched get_foods_details call (which stores the details in the shared USDA
+cache, so later searches parse complete data) and updates the nutrients of
+matching USDA foods already in the Food table.
+
+Management commands call wait_for_enrichment() before exiting, since the
+thread would otherwise be stopped by interpreter shutdown mid-fetch.
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from django.db import close_old_connections, connection
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait for more IDs before fetching a batch
+ENRICH_BATCH_DELAY = 0.5
+
+# Nutrient fields refreshed on Food rows from the fetched details
+ENRICHED_FIELDS = ('calories', 'protein', 'carbs', 'fat', 'fiber', 'sugar', 'sodium', 'content_hash')
+
+_executor = None
+_lock = Lock()
+_pending = set()
+_flush_scheduled = False
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Return the process-wide enrichment thread, creating it on first use"""
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='usda-enrich')
+    return _executor
+
+
+def schedule_enrichment(fdc_ids):
+    """Queue foods for a batched background detail fetch"""
+    global _flush_scheduled
+    executor = get_executor()
+    with _lock:
+        _pending.update(int(fdc_id) for fdc_id in fdc_ids)
+        if _flush_scheduled or not _pending:
+            return
+        _flush_scheduled = True
+    executor.submit(run_enrichment)
+
+
+def wait_for_enrichment():
+    """Finish the queued enrichment, blocking until the background thread is done"""
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+
+
+def run_enrichment():
+    """Fetch details of the queued foods in one batch (runs in the enrichment thread)"""
+    global _flush_scheduled
+    from .models import Food
+    from .usda_importer import USDADataImporter
+
+    time.sleep(ENRICH_BATCH_DELAY)
+    with _lock:
+        fdc_ids = sorted(_pending)
+        _pending.clear()
+        _flush_scheduled = False
+    if not fdc_ids:
+        return
+
+    close_old_connections()
+    try:
+        importer = USDADataImporter()
+        details = importer.get_foods_details(fdc_ids)
+        saved_ids = set(
+            Food.objects.filter(usda_fdc_id__in=list(details), data_source='usda')
+            .values_list('usda_fdc_id', flat=True)
+        )
+        updated = 0
+        for fdc_id in saved_ids:
+            parsed = importer.parse_food_data(details[fdc_id], enrich=False)
+            if parsed:
+                updated += Food.objects.filter(usda_fdc_id=fdc_id, data_source='usda').update(
+                    **{field: parsed[field] for field in ENRICHED_FIELDS}
+                )
+        logger.info(f"USDA enrichment: fetched {len(details)}/{len(fdc_ids)} foods, updated {updated}")
+    except Exception as e:
+        logger.warning(f"USDA enrichment of {len(fdc_ids)} foods failed: {e}")
+    finally:
+        connection.close()
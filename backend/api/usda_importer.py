@@ -2,53 +2,220 @@
 USDA FoodData Central API importer
 Imports food data from USDA FoodData Central API
 """
+import asyncio
+import logging
+import threading
+import weakref
+import httpx
 import requests
+from concurrent.futures import ThreadPoolExecutor
 import time
 from typing import List, Dict, Optional
+from asgiref.sync import sync_to_async
 from decouple import config
-from functools import lru_cache
-from datetime import datetime, timedelta
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from .usda_cache import acache_get, cache_get, cache_set, make_cache_key
+from .usda_parser import build_food_fields, extract_nutrients
 
-# Simple in-memory cache for USDA search results
-_usda_cache = {}
-_cache_ttl = timedelta(hours=24)  # Cache for 24 hours
+logger = logging.getLogger(__name__)
+
+_session = None
+_async_clients = weakref.WeakKeyDictionary()  # event loop -> httpx.AsyncClient
+_rate_limiter = None
+_client_lock = threading.Lock()
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket rate limiter
+
+    Holds up to capacity tokens, refilled continuously at rate tokens per
+    second. acquire() takes a token and only sleeps when the bucket is empty;
+    acquire_async() does the same without blocking the event loop.
+    """
+    
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def _take(self) -> float:
+        """Take a token if there is one; return 0, or the seconds until the next token"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+    
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """Take a token, waiting for one at most timeout seconds; False if none came"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self._take()
+            if not wait:
+                return True
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+    
+    async def acquire_async(self, timeout: Optional[float] = None) -> bool:
+        """acquire() for async code: waits with asyncio.sleep"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self._take()
+            if not wait:
+                return True
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            await asyncio.sleep(wait)
+    
+    def drain(self):
+        """Empty the bucket, e.g. after the server answered 429"""
+        with self.lock:
+            self.tokens = 0
+            self.updated = time.monotonic()
+
+
+def get_http_session() -> requests.Session:
+    """Process-wide session with a pooled keep-alive connection to the USDA API"""
+    global _session
+    if _session is None:
+        with _client_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=2,
+                    pool_maxsize=getattr(settings, 'USDA_HTTP_POOL_SIZE', 10),
+                )
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+    return _session
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """
+    Pooled keep-alive async client for the running event loop
+    
+    httpx clients are bound to the loop they were first used on, so one
+    client is kept per loop: under ASGI that is one per process.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        pool_size = getattr(settings, 'USDA_HTTP_POOL_SIZE', 10)
+        client = httpx.AsyncClient(limits=httpx.Limits(
+            max_connections=pool_size,
+            max_keepalive_connections=pool_size,
+        ))
+        _async_clients[loop] = client
+    return client
+
+
+def get_rate_limiter() -> TokenBucket:
+    """Process-wide token bucket matched to the USDA quota (settings.USDA_RATE_LIMIT_PER_HOUR)"""
+    global _rate_limiter
+    if _rate_limiter is None:
+        with _client_lock:
+            if _rate_limiter is None:
+                per_hour = getattr(settings, 'USDA_RATE_LIMIT_PER_HOUR', 1000)
+                burst = getattr(settings, 'USDA_RATE_LIMIT_BURST', 20)
+                _rate_limiter = TokenBucket(rate=per_hour / 3600, capacity=burst)
+    return _rate_limiter
 
 
 class USDADataImporter:
     """Importer for USDA FoodData Central API"""
     
     BASE_URL = "https://api.nal.usda.gov/fdc/v1"
-    RATE_LIMIT_DELAY = 0.1  # Delay between requests to respect rate limits (1000/hour = ~3.6 sec/request)
+    FOODS_BATCH_SIZE = 20  # Max fdcIds per POST /foods request
+    MISSING_DETAILS_TTL = 3600  # Seconds an ID left out by POST /foods is not requested again
     
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, wait_for_quota: bool = False):
+        """
+        Args:
+            api_key: USDA API key (default: USDA_API_KEY from the environment)
+            wait_for_quota: Wait for the rate limiter as long as needed instead of
+                at most USDA_RATE_LIMIT_MAX_WAIT seconds (for bulk imports)
+        """
         self.api_key = api_key or config('USDA_API_KEY', default='')
         if not self.api_key:
             raise ValueError("USDA_API_KEY not found in environment variables")
+        self.base_url = getattr(settings, 'USDA_API_BASE_URL', None) or self.BASE_URL
+        self.session = get_http_session()
+        self.rate_limiter = get_rate_limiter()
+        # Longest a call waits for the rate limiter before giving up
+        self.max_wait = None if wait_for_quota else getattr(settings, 'USDA_RATE_LIMIT_MAX_WAIT', 10)
+        # Concurrent requests of the bulk import methods
+        self.workers = getattr(settings, 'USDA_FETCH_WORKERS', 4)
     
     def search_foods(self, query: str, page_size: int = 50, page_number: int = 1, use_cache: bool = True) -> Dict:
         """
-        Search for foods in USDA database with caching
+        Search for foods in USDA database with caching (see api.usda_cache)
         
         Args:
             query: Search query (food name)
             page_size: Number of results per page (max 200)
             page_number: Page number
-            use_cache: Whether to use cached results
+            use_cache: Whether to use and store cached results (a stale
+                cached result is still returned if the API fails)
             
         Returns:
             Dictionary with search results
         """
         # Check cache first
-        cache_key = f"{query.lower()}_{page_size}_{page_number}"
-        if use_cache and cache_key in _usda_cache:
-            cached_result, cached_time = _usda_cache[cache_key]
-            if datetime.now() - cached_time < _cache_ttl:
-                import logging
-                logger = logging.getLogger(__name__)
-                logger.info(f"USDA cache hit for '{query}'")
-                return cached_result
+        cache_key = make_cache_key('search', query.lower(), page_size, page_number)
+        cached_result, fresh = cache_get(cache_key)
+        if use_cache and fresh:
+            logger.info(f"USDA cache hit for '{query}'")
+            return cached_result
+        
+        url, data, params = self._search_request(query, page_size, page_number)
+        try:
+            response = None
+            if self.rate_limiter.acquire(timeout=self.max_wait):
+                response = self.session.post(url, json=data, params=params, timeout=10)
+            return self._search_result(query, response, cache_key, cached_result, use_cache)
+        except requests.exceptions.Timeout as e:
+            return self._search_failed(query, e, cached_result, timed_out=True)
+        except requests.exceptions.RequestException as e:
+            return self._search_failed(query, e, cached_result)
+    
+    async def asearch_foods(self, query: str, page_size: int = 50, page_number: int = 1,
+                            use_cache: bool = True) -> Dict:
+        """
+        search_foods for async views: same caching and rate limiting, non-blocking HTTP
+        
+        Cache access and response decoding run in a worker thread.
+        """
+        cache_key = make_cache_key('search', query.lower(), page_size, page_number)
+        cached_result, fresh = await acache_get(cache_key)
+        if use_cache and fresh:
+            logger.info(f"USDA cache hit for '{query}'")
+            return cached_result
         
-        url = f"{self.BASE_URL}/foods/search"
+        url, data, params = self._search_request(query, page_size, page_number)
+        try:
+            response = None
+            if await self.rate_limiter.acquire_async(timeout=self.max_wait):
+                response = await get_async_http_client().post(url, json=data, params=params, timeout=10)
+            return await sync_to_async(self._search_result, thread_sensitive=False)(
+                query, response, cache_key, cached_result, use_cache
+            )
+        except httpx.TimeoutException as e:
+            return self._search_failed(query, e, cached_result, timed_out=True)
+        except httpx.HTTPError as e:
+            return self._search_failed(query, e, cached_result)
+    
+    def _search_request(self, query: str, page_size: int, page_number: int):
+        """URL, JSON body and query params of a foods/search call"""
+        url = f"{self.base_url}/foods/search"
         data = {
             'query': query,
             'pageSize': min(page_size, 200),
@@ -57,95 +224,256 @@ class USDADataImporter:
         params = {
             'api_key': self.api_key,
         }
+        return url, data, params
+    
+    def _search_result(self, query, response, cache_key, cached_result, use_cache) -> Dict:
+        """Handle a foods/search response (None if the rate limiter refused the call)"""
+        rate_limited = response is None or response.status_code == 429
+        if response is not None and rate_limited:
+            self.rate_limiter.drain()
         
-        try:
-            response = requests.post(url, json=data, params=params, timeout=10)
-            
-            # Handle rate limit gracefully
-            if response.status_code == 429:
-                import logging
-                logger = logging.getLogger(__name__)
-                logger.warning(f"USDA rate limit exceeded for query: {query}")
-                # Return cached result if available, even if expired
-                if cache_key in _usda_cache:
-                    logger.info(f"Returning stale cache for '{query}' due to rate limit")
-                    return _usda_cache[cache_key][0]
-                return {'foods': [], 'totalHits': 0, 'error': 'rate_limit_exceeded'}
-            
-            response.raise_for_status()
-            result = response.json()
-            
-            # Cache successful results
-            if use_cache and 'error' not in result:
-                _usda_cache[cache_key] = (result, datetime.now())
-                # Limit cache size to prevent memory issues
-                if len(_usda_cache) > 1000:
-                    # Remove oldest entries
-                    oldest_key = min(_usda_cache.keys(), key=lambda k: _usda_cache[k][1])
-                    del _usda_cache[oldest_key]
-            
-            # Log search results for debugging
-            import logging
-            logger = logging.getLogger(__name__)
-            logger.info(f"USDA search '{query}': {result.get('totalHits', 0)} total hits, {len(result.get('foods', []))} foods returned")
-            
-            # Reduced delay for faster response
-            time.sleep(0.1)  # Slightly increased to respect rate limits
-            return result
-        except requests.exceptions.Timeout:
-            import logging
-            logger = logging.getLogger(__name__)
+        # Handle rate limit gracefully
+        if rate_limited:
+            logger.warning(f"USDA rate limit exceeded for query: {query}")
+            # Return cached result if available, even if expired
+            if cached_result is not None:
+                logger.info(f"Returning stale cache for '{query}' due to rate limit")
+                return cached_result
+            return {'foods': [], 'totalHits': 0, 'error': 'rate_limit_exceeded'}
+        
+        response.raise_for_status()
+        result = response.json()
+        
+        # Cache successful results
+        if use_cache and 'error' not in result:
+            cache_set(cache_key, result)
+        
+        # Log search results for debugging
+        logger.info(f"USDA search '{query}': {result.get('totalHits', 0)} total hits, {len(result.get('foods', []))} foods returned")
+        return result
+    
+    def _search_failed(self, query, e, cached_result, timed_out=False) -> Dict:
+        """Result of a failed foods/search call: the cached result if any, else an error"""
+        if timed_out:
             logger.warning(f"USDA API timeout for query: {query}")
             # Return cached result if available
-            if cache_key in _usda_cache:
+            if cached_result is not None:
                 logger.info(f"Returning cached result for '{query}' due to timeout")
-                return _usda_cache[cache_key][0]
+                return cached_result
             return {'foods': [], 'totalHits': 0, 'error': 'timeout'}
-        except requests.exceptions.RequestException as e:
-            import logging
-            logger = logging.getLogger(__name__)
-            logger.error(f"Error searching USDA: {e}")
-            if hasattr(e, 'response') and e.response is not None:
-                logger.error(f"Response status: {e.response.status_code}")
-                logger.error(f"Response text: {e.response.text[:200]}")
-            # Return cached result if available
-            if cache_key in _usda_cache:
-                logger.info(f"Returning cached result for '{query}' due to error")
-                return _usda_cache[cache_key][0]
-            return {'foods': [], 'totalHits': 0, 'error': str(e)}
+        
+        logger.error(f"Error searching USDA: {e}")
+        response = getattr(e, 'response', None)
+        if response is not None:
+            logger.error(f"Response status: {response.status_code}")
+            logger.error(f"Response text: {response.text[:200]}")
+        # Return cached result if available
+        if cached_result is not None:
+            logger.info(f"Returning cached result for '{query}' due to error")
+            return cached_result
+        return {'foods': [], 'totalHits': 0, 'error': str(e)}
     
-    def get_food_details(self, fdc_id: int) -> Optional[Dict]:
+    def get_food_details(self, fdc_id: int, use_cache: bool = True) -> Optional[Dict]:
         """
-        Get detailed information about a specific food
+        Get detailed information about a specific food (cached like search_foods)
         
         Args:
             fdc_id: USDA FoodData Central ID
+            use_cache: Whether to use and store cached results
             
         Returns:
             Dictionary with food details or None
         """
-        url = f"{self.BASE_URL}/food/{fdc_id}"
+        cache_key = make_cache_key('food', fdc_id)
+        cached_result, fresh = cache_get(cache_key)
+        if use_cache and fresh:
+            return cached_result
+        
+        url = f"{self.base_url}/food/{fdc_id}"
         params = {
             'api_key': self.api_key,
         }
         
+        if not self.rate_limiter.acquire(timeout=self.max_wait):
+            logger.warning(f"USDA rate limit reached, not fetching food {fdc_id}")
+            return cached_result
+        
         try:
-            response = requests.get(url, params=params, timeout=15)
-            response.raise_for_status()
-            time.sleep(self.RATE_LIMIT_DELAY)
-            return response.json()
+            response = self.session.get(url, params=params, timeout=15)
+            return self._food_details_result(response, cache_key, use_cache)
         except requests.exceptions.RequestException as e:
-            print(f"Error fetching food {fdc_id}: {e}")
-            if hasattr(e, 'response') and e.response is not None:
-                print(f"Response status: {e.response.status_code}")
+            return self._food_details_failed(fdc_id, e, cached_result)
+    
+    async def aget_food_details(self, fdc_id: int, use_cache: bool = True) -> Optional[Dict]:
+        """
+        get_food_details for async views: same caching and rate limiting, non-blocking HTTP
+        
+        Cache access and response decoding run in a worker thread.
+        """
+        cache_key = make_cache_key('food', fdc_id)
+        cached_result, fresh = await acache_get(cache_key)
+        if use_cache and fresh:
+            return cached_result
+        
+        if not await self.rate_limiter.acquire_async(timeout=self.max_wait):
+            logger.warning(f"USDA rate limit reached, not fetching food {fdc_id}")
+            return cached_result
+        
+        try:
+            response = await get_async_http_client().get(
+                f"{self.base_url}/food/{fdc_id}", params={'api_key': self.api_key}, timeout=15
+            )
+            return await sync_to_async(self._food_details_result, thread_sensitive=False)(
+                response, cache_key, use_cache
+            )
+        except httpx.HTTPError as e:
+            return self._food_details_failed(fdc_id, e, cached_result)
+    
+    def _food_details_result(self, response, cache_key, use_cache) -> Dict:
+        """Handle a food/{fdcId} response"""
+        if response.status_code == 429:
+            self.rate_limiter.drain()
+        response.raise_for_status()
+        result = response.json()
+        if use_cache:
+            cache_set(cache_key, result)
+        return result
+    
+    def _food_details_failed(self, fdc_id, e, cached_result) -> Optional[Dict]:
+        """Result of a failed food/{fdcId} call: the cached details if any, else None"""
+        logger.exception(f"Error fetching food {fdc_id}: {e}")
+        response = getattr(e, 'response', None)
+        if response is not None:
+            logger.error(f"Response status: {response.status_code}")
+        if cached_result is not None:
+            logger.info(f"Returning cached details for FDC {fdc_id}")
+            return cached_result
+        return None
+    
+    def get_foods_details(self, fdc_ids: List[int], use_cache: bool = True) -> Dict[int, Dict]:
+        """
+        Get detailed information about many foods
+        
+        Cached foods are served from the cache; the rest are requested with
+        POST /foods, FOODS_BATCH_SIZE IDs per call, several calls at a time
+        (self.workers), each taking a token from the rate limiter.
+        
+        Args:
+            fdc_ids: USDA FoodData Central IDs
+            use_cache: Whether to use and store cached results
+            
+        Returns:
+            Dictionary mapping FDC ID to food details (IDs not found are left out)
+        
+        IDs a successful call does not return are remembered for
+        MISSING_DETAILS_TTL seconds (see is_missing_details).
+        """
+        details = {}
+        stale = {}
+        missing = []
+        for fdc_id in dict.fromkeys(int(fdc_id) for fdc_id in fdc_ids):
+            cached_result, fresh = cache_get(make_cache_key('food', fdc_id))
+            if use_cache and fresh:
+                details[fdc_id] = cached_result
+                continue
+            if cached_result is not None:
+                stale[fdc_id] = cached_result
+            missing.append(fdc_id)
+        
+        batches = [missing[i:i + self.FOODS_BATCH_SIZE] for i in range(0, len(missing), self.FOODS_BATCH_SIZE)]
+        if batches:
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(batches))) as pool:
+                for batch, foods in zip(batches, pool.map(self._fetch_foods_batch, batches)):
+                    if foods is None:
+                        continue
+                    for food in foods:
+                        fdc_id = food.get('fdcId')
+                        if not fdc_id:
+                            continue
+                        details[fdc_id] = food
+                        if use_cache:
+                            cache_set(make_cache_key('food', fdc_id), food)
+                    if use_cache:
+                        for fdc_id in batch:
+                            if fdc_id not in details:
+                                cache_set(make_cache_key('food-missing', fdc_id), time.time())
+        
+        # Fall back to expired cache entries for foods that could not be fetched
+        for fdc_id, cached_result in stale.items():
+            details.setdefault(fdc_id, cached_result)
+        return details
+    
+    def _fetch_foods_batch(self, fdc_ids: List[int]) -> Optional[List[Dict]]:
+        """Request details of up to FOODS_BATCH_SIZE foods with one POST /foods call (None if it failed)"""
+        if not self.rate_limiter.acquire(timeout=self.max_wait):
+            logger.warning(f"USDA rate limit reached, not fetching {len(fdc_ids)} foods")
+            return None
+        
+        url = f"{self.base_url}/foods"
+        params = {
+            'api_key': self.api_key,
+        }
+        try:
+            response = self.session.post(url, json={'fdcIds': fdc_ids}, params=params, timeout=30)
+            if response.status_code == 429:
+                self.rate_limiter.drain()
+            response.raise_for_status()
+            foods = response.json()
+            if not isinstance(foods, list):
+                raise ValueError(f"unexpected response: {type(foods).__name__}")
+            return [food for food in foods if isinstance(food, dict)]
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logger.exception(f"Error fetching foods {fdc_ids[0]}..{fdc_ids[-1]}: {e}")
             return None
     
-    def parse_food_data(self, usda_food: Dict) -> Optional[Dict]:
+    def is_missing_details(self, fdc_id: int) -> bool:
+        """Whether POST /foods left fdc_id out within the last MISSING_DETAILS_TTL seconds"""
+        missing_at, _ = cache_get(make_cache_key('food-missing', fdc_id))
+        return missing_at is not None and time.time() - missing_at < self.MISSING_DETAILS_TTL
+    
+    def prefetch_missing_details(self, usda_foods: List[Dict]):
+        """
+        Fetch details of the foods without energy data with one batched call
+        
+        The details land in the USDA cache, where parse_food_data picks them up.
+        """
+        missing = [
+            food.get('fdcId') for food in usda_foods
+            if food.get('fdcId') and 'calories' not in extract_nutrients(food.get('foodNutrients') or [])
+        ]
+        if missing:
+            self.get_foods_details(missing)
+    
+    def parse_foods(self, usda_foods: List[Dict], fetch_missing: bool = False) -> List[Dict]:
+        """
+        Parse many foods (e.g. one page of search results)
+        
+        Args:
+            usda_foods: Food data from USDA API
+            fetch_missing: Complete foods without energy data right away with
+                one batched get_foods_details call (for imports) instead of
+                leaving them to the background enrichment
+            
+        Returns:
+            List of parsed food data dictionaries
+        """
+        if fetch_missing:
+            self.prefetch_missing_details(usda_foods)
+        parsed_foods = (self.parse_food_data(food) for food in usda_foods)
+        return [parsed for parsed in parsed_foods if parsed]
+    
+    def parse_food_data(self, usda_food: Dict, enrich: bool = True) -> Optional[Dict]:
         """
         Parse USDA food data into our Food model format
         
+        Never calls the API: a food without energy data (common in search
+        results) is completed from cached details if there are any, otherwise
+        it is returned as is and queued for a batched background fetch
+        (see api.usda_enrichment) unless the API recently had no details.
+        
         Args:
             usda_food: Food data from USDA API
+            enrich: Whether to complete foods without energy data
             
         Returns:
             Dictionary with parsed food data or None
@@ -158,111 +486,22 @@ class USDADataImporter:
                 return None
             
             # Extract nutrients - handle both search results and detailed food data
-            nutrients = {}
-            food_nutrients = usda_food.get('foodNutrients', [])
-            
-            # Handle different response formats - sometimes nutrients are nested differently
-            if not food_nutrients and 'foodNutrients' in usda_food:
-                food_nutrients = usda_food['foodNutrients']
-            
-            for nutrient in food_nutrients:
-                # Handle different response formats
-                if isinstance(nutrient, dict):
-                    nutrient_info = nutrient.get('nutrient', {})
-                    if not nutrient_info:
-                        nutrient_info = nutrient
-                    
-                    # Try multiple ways to get nutrient ID
-                    nutrient_id = (
-                        nutrient_info.get('id') or 
-                        nutrient_info.get('number') or 
-                        nutrient_info.get('nutrientId') or
-                        nutrient.get('nutrientId') or
-                        nutrient.get('id')
-                    )
-                    
-                    # Try multiple ways to get amount
-                    amount = (
-                        nutrient.get('amount') or 
-                        nutrient.get('value') or
-                        nutrient_info.get('amount') or
-                        nutrient_info.get('value')
-                    )
-                    
-                    if not nutrient_id or amount is None:
-                        continue
-                    
-                    try:
-                        amount = float(amount)
-                    except (ValueError, TypeError):
-                        continue
-                    
-                    # Map USDA nutrient IDs to our fields
-                    # 208 = Energy (kcal), 203 = Protein, 204 = Fat, 205 = Carbs, 291 = Fiber
-                    # Also check nutrient name as fallback
-                    nutrient_name = (nutrient_info.get('name') or nutrient.get('name') or '').lower()
-                    
-                    # Map by ID first (most reliable)
-                    if str(nutrient_id) == '208' or 'energy' in nutrient_name:
-                        nutrients['calories'] = amount
-                    elif str(nutrient_id) == '203' or 'protein' in nutrient_name:
-                        nutrients['protein'] = amount
-                    elif str(nutrient_id) == '204' or ('total fat' in nutrient_name and 'saturated' not in nutrient_name):
-                        nutrients['fat'] = amount
-                    elif str(nutrient_id) == '205' or ('carbohydrate' in nutrient_name and 'fiber' not in nutrient_name and 'sugar' not in nutrient_name):
-                        nutrients['carbs'] = amount
-                    elif str(nutrient_id) == '291' or 'fiber' in nutrient_name:
-                        nutrients['fiber'] = amount
-                    elif str(nutrient_id) == '269' or ('sugar' in nutrient_name and 'total' in nutrient_name):
-                        nutrients['sugar'] = amount
-                    elif str(nutrient_id) == '307' or 'sodium' in nutrient_name:
-                        nutrients['sodium'] = amount
-            
-            # Be very lenient - if no calories found, try to get detailed data
-            # Otherwise, use default values
-            if 'calories' not in nutrients:
-                # Try to get detailed food data if search result doesn't have calories
-                detailed = self.get_food_details(fdc_id)
-                if detailed:
-                    return self.parse_food_data(detailed)
-                # If we can't get details, use 0 as default (better than nothing)
-                nutrients['calories'] = 0
+            nutrients = extract_nutrients(usda_food.get('foodNutrients') or [])
             
-            # Set defaults for missing nutrients
-            if 'protein' not in nutrients:
-                nutrients['protein'] = 0
-            if 'carbs' not in nutrients:
-                nutrients['carbs'] = 0
-            if 'fat' not in nutrients:
-                nutrients['fat'] = 0
-            if 'fiber' not in nutrients:
-                nutrients['fiber'] = 0
+            # Be very lenient - if no calories found, use detailed data when
+            # available, otherwise default values until it has been fetched
+            if 'calories' not in nutrients and enrich:
+                detailed, _ = cache_get(make_cache_key('food', fdc_id))
+                if detailed is not None:
+                    detailed_nutrients = extract_nutrients(detailed.get('foodNutrients') or [])
+                    if 'calories' in detailed_nutrients:
+                        nutrients = detailed_nutrients
+                elif not self.is_missing_details(fdc_id):
+                    from .usda_enrichment import schedule_enrichment
+                    schedule_enrichment([fdc_id])
             
-            # Clean description (remove brand info if present)
-            name = description.split(',')[0].strip() if ',' in description else description.strip()
-            brand = ''
-            if ',' in description:
-                parts = description.split(',')
-                if len(parts) > 1:
-                    brand = parts[-1].strip()
-            
-            return {
-                'name': name[:200],  # Limit to model max_length
-                'brand': brand[:100] if brand else '',
-                'description': description[:500] if description else '',
-                'usda_fdc_id': fdc_id,
-                'data_source': 'usda',
-                'calories': max(0, nutrients.get('calories', 0)),
-                'protein': max(0, nutrients.get('protein', 0)),
-                'carbs': max(0, nutrients.get('carbs', 0)),
-                'fat': max(0, nutrients.get('fat', 0)),
-                'fiber': max(0, nutrients.get('fiber', 0)),
-                'sugar': nutrients.get('sugar') if nutrients.get('sugar') else None,
-                'sodium': nutrients.get('sodium') if nutrients.get('sodium') else None,
-            }
+            return build_food_fields(fdc_id, description, nutrients, usda_food.get('dataType') or '')
         except Exception as e:
-            import logging
-            logger = logging.getLogger(__name__)
             logger.warning(f"Error parsing food data: {e}")
             logger.debug(f"Food data: {usda_food.get('fdcId')} - {usda_food.get('description', '')[:50]}")
             return None
@@ -271,6 +510,9 @@ class USDADataImporter:
         """
         Import popular foods by searching for them
         
+        Searches run concurrently (self.workers at a time), paced by the rate
+        limiter; results are parsed in the order of food_names.
+        
         Args:
             food_names: List of food names to search for
             max_per_food: Maximum number of results to import per food name
@@ -279,25 +521,27 @@ class USDADataImporter:
             List of parsed food data dictionaries
         """
         imported_foods = []
+        if not food_names:
+            return imported_foods
+        
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(food_names))) as pool:
+            all_results = list(pool.map(lambda name: self.search_foods(name, page_size=max_per_food), food_names))
         
-        for food_name in food_names:
+        # Foods without energy data are completed with one batched fetch for all searches
+        found = [search_results.get('foods', [])[:max_per_food] for search_results in all_results]
+        self.prefetch_missing_details([food for foods in found for food in foods])
+        
+        for food_name, foods in zip(food_names, found):
             print(f"Searching for: {food_name}")
-            search_results = self.search_foods(food_name, page_size=max_per_food)
-            
-            foods = search_results.get('foods', [])
-            for food in foods[:max_per_food]:
-                parsed = self.parse_food_data(food)
-                if parsed:
-                    imported_foods.append(parsed)
-                    print(f"  ✓ Parsed: {parsed['name']}")
-            
-            time.sleep(0.5)  # Additional delay between searches
+            for parsed in self.parse_foods(foods):
+                imported_foods.append(parsed)
+                print(f"  ✓ Parsed: {parsed['name']}")
         
         return imported_foods
     
     def import_by_fdc_ids(self, fdc_ids: List[int]) -> List[Dict]:
         """
-        Import foods by their FDC IDs
+        Import foods by their FDC IDs (fetched in batches, see get_foods_details)
         
         Args:
             fdc_ids: List of USDA FDC IDs
@@ -307,13 +551,16 @@ class USDADataImporter:
         """
         imported_foods = []
         
+        print(f"Fetching {len(fdc_ids)} FDC IDs")
+        details = self.get_foods_details(fdc_ids)
         for fdc_id in fdc_ids:
-            print(f"Fetching FDC ID: {fdc_id}")
-            food_data = self.get_food_details(fdc_id)
-            if food_data:
-                parsed = self.parse_food_data(food_data)
-                if parsed:
-                    imported_foods.append(parsed)
-                    print(f"  ✓ Parsed: {parsed['name']}")
+            food_data = details.get(int(fdc_id))
+            if not food_data:
+                print(f"  ✗ Not found: {fdc_id}")
+                continue
+            parsed = self.parse_food_data(food_data, enrich=False)
+            if parsed:
+                imported_foods.append(parsed)
+                print(f"  ✓ Parsed: {parsed['name']}")
         
         return imported_foods
@@ -0,0 +1,273 @@
+"""
+Parsing of USDA FoodData Central food records into Food model fields
+
+Kept free of Django imports so parser worker processes of the dataset
+importer can load it cheaply under any multiprocessing start method.
+"""
+import hashlib
+import multiprocessing
+import queue
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from .usda_stream import decode_array_piece, iter_json_array_pieces
+
+_END = object()
+
+# USDA nutrient ids (FoodData Central) and legacy nutrient numbers of the
+# nutrients stored on Food, per 100 g
+NUTRIENT_FIELDS_BY_ID = {
+    1008: 'calories',  # Energy, kcal
+    1003: 'protein',
+    1004: 'fat',  # Total lipid (fat)
+    1005: 'carbs',  # Carbohydrate, by difference
+    1079: 'fiber',  # Fiber, total dietary
+    2000: 'sugar',  # Sugars, total including NLEA
+    1093: 'sodium',  # Sodium, Na (mg)
+}
+NUTRIENT_FIELDS_BY_NUMBER = {
+    '208': 'calories',
+    '203': 'protein',
+    '204': 'fat',
+    '205': 'carbs',
+    '291': 'fiber',
+    '269': 'sugar',
+    '307': 'sodium',
+}
+
+# Every key form a nutrient entry can carry (FDC id or legacy number, as
+# int or str) resolved to its Food field with a single dict lookup
+NUTRIENT_FIELDS = {
+    **{nutrient_id: field for nutrient_id, field in NUTRIENT_FIELDS_BY_ID.items()},
+    **{str(nutrient_id): field for nutrient_id, field in NUTRIENT_FIELDS_BY_ID.items()},
+    **NUTRIENT_FIELDS_BY_NUMBER,
+    **{int(number): field for number, field in NUTRIENT_FIELDS_BY_NUMBER.items()},
+}
+
+# Name fallback for entries whose id/number is unknown, one group per field
+_NUTRIENT_NAME_RE = re.compile(
+    r'(?P<calories>energy\b)'
+    r'|(?P<protein>protein\b)'
+    r'|(?P<fat>total (?:lipid|fat)\b)'
+    r'|(?P<carbs>carbohydrate(?!.*(?:fiber|sugar)))'
+    r'|(?P<fiber>fiber\b)'
+    r'|(?P<sugar>(?:sugars?, total|total sugars?)\b)'
+    r'|(?P<sodium>sodium\b)',
+    re.IGNORECASE,
+)
+
+# Fields covered by Food.content_hash
+CONTENT_HASH_FIELDS = (
+    'name', 'brand', 'description', 'usda_data_type',
+    'calories', 'protein', 'carbs', 'fat', 'fiber', 'sugar', 'sodium',
+)
+
+
+@lru_cache(maxsize=1024)
+def nutrient_field_for_name(name):
+    """Food field for a USDA nutrient name, or None (name fallback)"""
+    match = _NUTRIENT_NAME_RE.match(name.strip())
+    return match.lastgroup if match else None
+
+
+def extract_nutrients(food_nutrients):
+    """
+    Map the foodNutrients entries of a USDA food to Food nutrient fields
+
+    Handles the detailed format ({"nutrient": {"id", "number", "name"},
+    "amount"}), abridged and search results ({"nutrientId",
+    "nutrientNumber", "value"}). Entries are matched by FDC id or legacy
+    nutrient number through NUTRIENT_FIELDS; the name is only consulted for
+    entries with an unknown key, and such matches never override a keyed
+    one (e.g. "Energy (Atwater General Factors)" vs. Energy, id 1008).
+    """
+    nutrients = {}
+    by_name = {}
+    for nutrient in food_nutrients:
+        if not isinstance(nutrient, dict):
+            continue
+        nutrient_info = nutrient.get('nutrient') or nutrient
+
+        field = (
+            NUTRIENT_FIELDS.get(nutrient_info.get('id')) or
+            NUTRIENT_FIELDS.get(nutrient_info.get('number')) or
+            NUTRIENT_FIELDS.get(nutrient.get('nutrientId')) or
+            NUTRIENT_FIELDS.get(nutrient.get('nutrientNumber')) or
+            NUTRIENT_FIELDS.get(nutrient.get('id'))
+        )
+        keyed = field is not None
+        if not keyed:
+            name = nutrient_info.get('name') or nutrient.get('nutrientName') or nutrient.get('name')
+            field = nutrient_field_for_name(name) if name else None
+            if not field or field in by_name:
+                continue
+            unit = nutrient_info.get('unitName') or nutrient.get('unitName') or ''
+            if field == 'calories' and unit.lower() == 'kj':
+                continue
+
+        amount = (
+            nutrient.get('amount') or
+            nutrient.get('value') or
+            nutrient_info.get('amount') or
+            nutrient_info.get('value')
+        )
+        if amount is None:
+            continue
+        try:
+            amount = float(amount)
+        except (ValueError, TypeError):
+            continue
+
+        if keyed:
+            nutrients[field] = amount
+        else:
+            by_name[field] = amount
+
+    for field, amount in by_name.items():
+        nutrients.setdefault(field, amount)
+    return nutrients
+
+
+def parse_usda_food(usda_food):
+    """Parse USDA food data into our Food model format"""
+    try:
+        fdc_id = usda_food.get('fdcId')
+        description = usda_food.get('description', '')
+        
+        if not fdc_id or not description:
+            return None
+        
+        nutrients = extract_nutrients(usda_food.get('foodNutrients', []))
+        return build_food_fields(fdc_id, description, nutrients, usda_food.get('dataType') or '')
+    except Exception as e:
+        return None
+
+
+def build_food_fields(fdc_id, description, nutrients, data_type=''):
+    """
+    Normalize a USDA food into Food model fields
+
+    nutrients maps Food nutrient fields to amounts per 100 g; shared by the
+    JSON and CSV importers so both store identical rows.
+    """
+    # Set defaults for missing nutrients
+    if 'calories' not in nutrients:
+        nutrients['calories'] = 0
+    if 'protein' not in nutrients:
+        nutrients['protein'] = 0
+    if 'carbs' not in nutrients:
+        nutrients['carbs'] = 0
+    if 'fat' not in nutrients:
+        nutrients['fat'] = 0
+    if 'fiber' not in nutrients:
+        nutrients['fiber'] = 0
+    
+    # Clean description
+    name = description.split(',')[0].strip() if ',' in description else description.strip()
+    brand = ''
+    if ',' in description:
+        parts = description.split(',')
+        if len(parts) > 1:
+            brand = parts[-1].strip()
+    
+    fields = {
+        'name': name[:200],
+        'brand': brand[:100] if brand else '',
+        'description': description[:500] if description else '',
+        'usda_fdc_id': fdc_id,
+        'data_source': 'usda',
+        'calories': max(0, nutrients.get('calories', 0)),
+        'protein': max(0, nutrients.get('protein', 0)),
+        'carbs': max(0, nutrients.get('carbs', 0)),
+        'fat': max(0, nutrients.get('fat', 0)),
+        'fiber': max(0, nutrients.get('fiber', 0)),
+        'sugar': nutrients.get('sugar') if nutrients.get('sugar') else None,
+        'sodium': nutrients.get('sodium') if nutrients.get('sodium') else None,
+        'usda_data_type': data_type[:50],
+    }
+    fields['content_hash'] = food_content_hash(fields)
+    return fields
+
+
+def food_content_hash(fields):
+    """Hash of the imported Food fields, compared by sync to find changed rows"""
+    raw = '|'.join(repr(fields.get(field)) for field in CONTENT_HASH_FIELDS)
+    return hashlib.blake2b(raw.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def pool_context():
+    """Start method of the parser processes: forkserver where available, else spawn (e.g. on Windows)"""
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context('spawn')
+
+
+def parse_food_piece(piece):
+    """
+    Decode and parse a piece of the food array (parser worker entry point)
+
+    Returns one entry per food: the parsed fields, or None if it was skipped.
+    """
+    return [parse_usda_food(food) for food in decode_array_piece(piece)]
+
+
+def iter_parsed_foods_parallel(fp, workers, queue_size=None, resume_offset=None):
+    """
+    Parse the food array of a text stream with a pool of worker processes
+
+    Pipeline: a reader thread cuts the stream into pieces and submits them
+    to the pool; the pending results travel in file order through a bounded
+    queue to the caller, which acts as the single database writer. At most
+    queue_size pieces (default 2 per worker) are in flight, so memory stays
+    bounded however far the reader could run ahead.
+
+    Yields (end offset, parsed food) in file order, parsed food being None
+    for skipped records. Only the last food of each piece carries an end
+    offset (see iter_json_array_pieces); the others have None. Closing the
+    generator stops the reader and shuts down the pool.
+
+    The pool starts its processes on the first submit, from the reader
+    thread, so they are not forked: a child forked while other threads hold
+    locks (the queue, the file, logging) could inherit them held and hang.
+    """
+    results = queue.Queue(maxsize=queue_size or workers * 2)
+    stop = threading.Event()
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=pool_context())
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                results.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def read():
+        try:
+            for end, piece in iter_json_array_pieces(fp, resume_offset=resume_offset):
+                if stop.is_set():
+                    return
+                put((end, pool.submit(parse_food_piece, piece)))
+            put(_END)
+        except BaseException as e:
+            put(e)
+
+    reader = threading.Thread(target=read, name='usda-import-reader', daemon=True)
+    reader.start()
+    try:
+        while True:
+            item = results.get()
+            if item is _END:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            end, future = item
+            foods = future.result()
+            for food in foods[:-1]:
+                yield None, food
+            yield end, foods[-1]
+    finally:
+        stop.set()
+        reader.join()
+        pool.shutdown(cancel_futures=True)
@@ -0,0 +1,302 @@
+"""
+Incremental reader for USDA FoodData Central JSON dumps
+
+The dumps are a single object holding one large array, e.g.
+{"FoundationFoods": [...]}, {"SRLegacyFoods": [...]} or {"BrandedFoods": [...]}.
+Instead of json.load() on the whole file, the reader walks the top-level
+structure token by token and decodes one array element at a time from a
+buffered window of the file, so memory is bounded by the largest single
+food record rather than by the file size.
+
+Positions are reported as character offsets into the decoded text, so an
+interrupted import can resume right after its last committed record
+without decoding the records before it again.
+
+Dataset files can be read as downloaded: JSON members are streamed straight
+out of .zip archives, and gzip-compressed and plain JSON files are supported.
+"""
+import gzip
+import hashlib
+import io
+import json
+import re
+import zipfile
+
+READ_CHUNK_SIZE = 1024 * 1024
+
+_WHITESPACE_RE = re.compile(r'[ \t\n\r]*')
+_NUMBER_CHARS_RE = re.compile(r'[-+0-9.eE]*')
+_STRING_RE = re.compile(r'"(?:[^"\\]|\\.)*"')
+_decoder = json.JSONDecoder()
+_GZIP_MAGIC = b'\x1f\x8b'
+
+
+class _StreamBuffer:
+    """Sliding text window over a file-like object"""
+
+    def __init__(self, fp, chunk_size=READ_CHUNK_SIZE):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.buf = ''
+        self.pos = 0
+        self.base = 0  # offset of buf[0] in the whole text
+        self.eof = False
+
+    @property
+    def offset(self):
+        """Absolute character offset of the current position"""
+        return self.base + self.pos
+
+    def fill(self, size=None):
+        """Append the next chunk to the window; return False at end of input"""
+        if self.eof:
+            return False
+        chunk = self.fp.read(size or self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        # Drop the consumed prefix so the window does not grow with the file
+        self.base += self.pos
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def skip_to(self, offset):
+        """Discard input up to an absolute character offset without decoding it"""
+        while self.base + len(self.buf) < offset:
+            self.base += len(self.buf)
+            self.buf = self.fp.read(self.chunk_size)
+            self.pos = 0
+            if not self.buf:
+                self.eof = True
+                raise json.JSONDecodeError('Resume offset is past the end of the input', '', 0)
+        self.pos = offset - self.base
+
+    def peek(self):
+        """Skip whitespace and return the next character ('' at end of input)"""
+        while True:
+            self.pos = _WHITESPACE_RE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, chars):
+        """Consume the next character, which must be one of chars"""
+        char = self.peek()
+        if not char or char not in chars:
+            found = repr(char) if char else 'end of input'
+            raise json.JSONDecodeError(f"Expected one of {chars!r}, found {found}", self.buf, self.pos)
+        self.pos += 1
+        return char
+
+    def decode(self, raw=False):
+        """
+        Decode one complete JSON value starting at the current position
+
+        With raw=True the source text of the value is returned instead.
+        """
+        if self.peek() in '-0123456789':
+            # Numbers are the only values without a closing delimiter: make
+            # sure the whole literal is in the window before decoding it
+            while _NUMBER_CHARS_RE.match(self.buf, self.pos).end() == len(self.buf) and self.fill():
+                pass
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                # Value is cut off at the end of the window: read more and
+                # retry, growing the window geometrically so a value larger
+                # than one chunk is re-scanned only a few times
+                if self.fill(max(self.chunk_size, len(self.buf) - self.pos)):
+                    continue
+                raise
+            text = self.buf[self.pos:end] if raw else None
+            self.pos = end
+            return text if raw else value
+
+
+def _start_array(stream, resume_offset=None):
+    """
+    Position the stream at the first element to read; False if there is none
+
+    resume_offset is an end offset reported for a previously read element;
+    reading continues with the element after it.
+    """
+    if resume_offset:
+        stream.skip_to(resume_offset)
+        return stream.expect(',]') == ','
+    if not _seek_array(stream):
+        return False
+    stream.expect('[')
+    return stream.peek() != ']'
+
+
+def _seek_array(stream):
+    """
+    Position the stream at the opening bracket of the food array
+
+    A bare top-level array is used directly; for a top-level object the
+    first array-valued key is used (values before it are decoded and
+    skipped). Returns False if the document holds no array.
+    """
+    first = stream.peek()
+    if first == '[':
+        return True
+    if first != '{':
+        raise json.JSONDecodeError('Expected a JSON object or array', stream.buf, stream.pos)
+
+    stream.pos += 1
+    if stream.peek() == '}':
+        return False
+    while True:
+        key = stream.decode()
+        if not isinstance(key, str):
+            raise json.JSONDecodeError('Expected an object key', stream.buf, stream.pos)
+        stream.expect(':')
+        if stream.peek() == '[':
+            return True
+        stream.decode()
+        if stream.expect(',}') == '}':
+            return False
+
+
+def iter_json_array_items(fp, chunk_size=READ_CHUNK_SIZE, resume_offset=None):
+    """
+    Yield (end offset, element) for the food array in a JSON dump
+
+    fp is a text file-like object holding a bare array or an object such as
+    {"FoundationFoods": [...]}. The end offset can be passed back as
+    resume_offset to continue after that element.
+    """
+    stream = _StreamBuffer(fp, chunk_size)
+    if not _start_array(stream, resume_offset):
+        return
+    while True:
+        value = stream.decode()
+        yield stream.offset, value
+        if stream.expect(',]') == ']':
+            return
+
+
+def iter_json_array(fp, chunk_size=READ_CHUNK_SIZE):
+    """Yield the elements of the food array in a JSON dump one at a time"""
+    for _, value in iter_json_array_items(fp, chunk_size):
+        yield value
+
+
+def iter_json_array_pieces(fp, chunk_size=READ_CHUNK_SIZE, resume_offset=None):
+    """
+    Yield (end offset, piece) for the food array, a piece holding one or more
+    complete elements
+
+    Each piece is a comma-separated run of elements without the enclosing
+    brackets, decoded elsewhere with decode_array_piece(); this lets parser
+    processes share the JSON decoding, which dominates import time. The end
+    offset follows the last element of the piece (see iter_json_array_items).
+
+    USDA dumps put every food on its own line, and a raw newline can never
+    occur inside a JSON string, so pieces are cut before a line starting
+    with "{" that follows a ","; finding those needs no tokenizing here.
+    Such a line can also open a nested object (e.g. json.dump(indent=0)),
+    so a cut is only taken if its brackets balance (see _is_balanced).
+    Input where a cut fails that check or that has no such line breaks
+    (minified or pretty-printed), and the last element of the array, are
+    delimited one element at a time with raw_decode instead.
+    """
+    stream = _StreamBuffer(fp, chunk_size)
+    if not _start_array(stream, resume_offset):
+        return
+
+    line_mode = True
+    pending = []
+    pending_size = 0
+    while True:
+        # stream.pos is at the start of an element
+        if line_mode:
+            cut = stream.buf.rfind('\n{', stream.pos + 1)
+            if cut != -1:
+                piece = stream.buf[stream.pos:cut].rstrip()
+                if piece.endswith(',') and not _is_balanced(piece):
+                    # The line opens a nested object: not one food per line
+                    line_mode = False
+                elif piece.endswith(','):
+                    end = stream.offset + len(piece) - 1
+                    stream.pos = cut + 1
+                    if pending:
+                        yield pending_end, ','.join(pending)
+                        pending = []
+                        pending_size = 0
+                    yield end, piece[:-1]
+                    continue
+            if line_mode and len(stream.buf) - stream.pos <= 4 * chunk_size and stream.fill():
+                continue
+            # No element break within a few chunks: not one food per line
+            line_mode = line_mode and stream.eof
+
+        text = stream.decode(raw=True)
+        pending.append(text)
+        pending_size += len(text)
+        pending_end = stream.offset
+        end_of_array = stream.expect(',]') == ']'
+        if end_of_array or pending_size >= chunk_size:
+            yield pending_end, ','.join(pending)
+            pending = []
+            pending_size = 0
+        if end_of_array:
+            return
+        stream.peek()
+
+
+def _is_balanced(piece):
+    """
+    Whether a run of text starting at an element holds only complete elements
+
+    Strings are blanked first, so this costs a few regex passes instead of
+    a full decode. Every closing bracket of a valid prefix matches an
+    opening one, so equal counts mean the run ends at array level.
+    """
+    text = _STRING_RE.sub('""', piece)
+    return text.count('{') == text.count('}') and text.count('[') == text.count(']')
+
+
+def decode_array_piece(piece):
+    """Decode a piece from iter_json_array_pieces into a list of elements"""
+    return json.loads(f'[{piece}]')
+
+
+def file_content_hash(path):
+    """SHA-256 of a dataset file, identifying a release across runs"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(READ_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def iter_dataset_streams(path):
+    """
+    Yield (member name, text stream) for each JSON document in a dataset file
+
+    Zip archives yield one stream per .json member, decompressed on the fly
+    without extracting to disk; gzip and plain files yield a single stream
+    with an empty member name. Each stream is closed when the generator
+    advances to the next one.
+    """
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or not info.filename.lower().endswith('.json'):
+                    continue
+                with archive.open(info) as raw, io.TextIOWrapper(raw, encoding='utf-8') as stream:
+                    yield info.filename, stream
+        return
+
+    with open(path, 'rb') as f:
+        is_gzip = f.read(2) == _GZIP_MAGIC
+    if is_gzip:
+        with gzip.open(path, 'rt', encoding='utf-8') as stream:
+            yield '', stream
+    else:
+        with open(path, 'r', encoding='utf-8') as stream:
+            yield '', stream
@@ -4,21 +4,32 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from django.db.models import Sum, Q
 from django.utils import timezone
+from django.urls import reverse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from asgiref.sync import sync_to_async
+import os
 from datetime import date, timedelta
 from collections import defaultdict
-from .models import Food, Meal, NutritionGoal, WeightEntry, Notification, MealReminderSettings, WaterIntake, WaterSettings, Recipe, RecipeIngredient, FastingSession, FastingSettings
+from .models import Food, Meal, NutritionGoal, WeightEntry, Notification, MealReminderSettings, WaterIntake, WaterSettings, Recipe, RecipeIngredient, FastingSession, FastingSettings, ReportJob
 from .serializers import (
     FoodSerializer, MealSerializer, NutritionGoalSerializer,
     WeightEntrySerializer, NotificationSerializer, MealReminderSettingsSerializer,
     WaterIntakeSerializer, WaterSettingsSerializer, RecipeSerializer, RecipeIngredientSerializer,
-    FastingSessionSerializer, FastingSettingsSerializer
+    FastingSessionSerializer, FastingSettingsSerializer, ReportJobSerializer
 )
 from .notification_service import check_and_create_daily_notifications
 from .utils import (
     calculate_bmr, calculate_tdee, calculate_daily_calories,
     calculate_macros, calculate_age_from_birthdate
 )
+from .async_api import async_api_view
 from .usda_importer import USDADataImporter
+from .usda_cache import acache_get, acache_set, make_cache_key
+from .url_import import extract_food_from_html, fetch_page, normalize_url
+from .report_jobs import create_report_job, expire_stale_jobs
+from .report_cache import get_or_build_report, serve_pdf_file
+from .export import EXPORT_DATASETS, aiter_lines, iter_records, stream_csv, stream_ndjson
 
 
 class FoodViewSet(viewsets.ReadOnlyModelViewSet):
@@ -702,10 +713,12 @@ def unified_food_search(request):
             error_msg = search_results.get('error')
             if not error_msg:
                 foods_to_parse = search_results.get('foods', [])[:limit]
+                # Existence check scoped to the returned IDs, not the whole catalog
+                result_fdc_ids = [food.get('fdcId') for food in foods_to_parse if food.get('fdcId')]
                 existing_fdc_ids = set(
-                    Food.objects.filter(usda_fdc_id__isnull=False)
+                    Food.objects.filter(usda_fdc_id__in=result_fdc_ids).order_by()
                     .values_list('usda_fdc_id', flat=True)
-                )
+                ) if result_fdc_ids else set()
                 
                 for food in foods_to_parse:
                     fdc_id = food.get('fdcId')
@@ -727,9 +740,8 @@ def unified_food_search(request):
     return Response(results)
 
 
-@api_view(['GET'])
-@permission_classes([IsAuthenticated])
-def usda_search(request):
+@async_api_view(['GET'], permission_classes=[IsAuthenticated])
+async def usda_search(request):
     """Search for foods in USDA FoodData Central database (legacy endpoint)"""
     query = request.query_params.get('query', '')
     page_size = int(request.query_params.get('page_size', 50))
@@ -743,16 +755,15 @@ def usda_search(request):
     
     try:
         importer = USDADataImporter()
-        search_results = importer.search_foods(query, page_size=page_size, page_number=page_number)
+        search_results = await importer.asearch_foods(query, page_size=page_size, page_number=page_number)
         
-        # Parse each food result
-        parsed_foods = []
-        for food in search_results.get('foods', []):
-            parsed = importer.parse_food_data(food)
-            if parsed:
-                # Add FDC ID for saving
-                parsed['fdc_id'] = food.get('fdcId')
-                parsed_foods.append(parsed)
+        # Parse each food result (reads cached details: keep it off the event loop)
+        parsed_foods = await sync_to_async(importer.parse_foods, thread_sensitive=False)(
+            search_results.get('foods', [])
+        )
+        for parsed in parsed_foods:
+            # Add FDC ID for saving
+            parsed['fdc_id'] = parsed['usda_fdc_id']
         
         return Response({
             'foods': parsed_foods,
@@ -775,9 +786,8 @@ def usda_search(request):
         )
 
 
-@api_view(['POST'])
-@permission_classes([IsAuthenticated])
-def import_food_from_url(request):
+@async_api_view(['POST'], permission_classes=[IsAuthenticated])
+async def import_food_from_url(request):
     """Import food from URL (supports various food database URLs)"""
     url = request.data.get('url', '').strip()
     
@@ -788,86 +798,57 @@ def import_food_from_url(request):
         )
     
     try:
-        import requests
-        from bs4 import BeautifulSoup
-        import re
-        
-        # Fetch the URL
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        }
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        
-        # Parse HTML
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        # Try to extract food information
-        # This is a basic implementation - can be extended for specific sites
-        food_data = {
-            'name': '',
-            'brand': '',
-            'description': '',
-            'calories': 0,
-            'protein': 0,
-            'carbs': 0,
-            'fat': 0,
-            'data_source': 'manual',
-        }
+        import httpx
         
-        # Try to find nutrition facts table or similar
-        # Look for common patterns
-        text = soup.get_text()
-        
-        # Try to extract name from title or h1
-        title_tag = soup.find('title') or soup.find('h1')
-        if title_tag:
-            food_data['name'] = title_tag.get_text().strip()[:200]
-        
-        # Try to find nutrition values using regex patterns
-        # Calories
-        cal_match = re.search(r'(\d+)\s*(?:калорий|calories|kcal|ккал)', text, re.IGNORECASE)
-        if cal_match:
-            food_data['calories'] = float(cal_match.group(1))
-        
-        # Protein
-        protein_match = re.search(r'белк[а-я]*[:\s]+(\d+[.,]?\d*)', text, re.IGNORECASE) or \
-                        re.search(r'protein[:\s]+(\d+[.,]?\d*)', text, re.IGNORECASE)
-        if protein_match:
-            food_data['protein'] = float(protein_match.group(1).replace(',', '.'))
+        try:
+            url = normalize_url(url)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Carbs
-        carbs_match = re.search(r'углевод[а-я]*[:\s]+(\d+[.,]?\d*)', text, re.IGNORECASE) or \
-                     re.search(r'carb[а-я]*[:\s]+(\d+[.,]?\d*)', text, re.IGNORECASE)
-        if carbs_match:
-            food_data['carbs'] = float(carbs_match.group(1).replace(',', '.'))
+        # A page already imported is not fetched again
+        existing_food = await Food.objects.filter(source_url=url).afirst()
+        if existing_food:
+            return Response({
+                'message': 'Food already exists in database',
+                'food': FoodSerializer(existing_food).data
+            }, status=status.HTTP_200_OK)
         
-        # Fat
-        fat_match = re.search(r'жир[а-я]*[:\s]+(\d+[.,]?\d*)', text, re.IGNORECASE) or \
-                   re.search(r'fat[:\s]+(\d+[.,]?\d*)', text, re.IGNORECASE)
-        if fat_match:
-            food_data['fat'] = float(fat_match.group(1).replace(',', '.'))
+        # Extraction results (including pages without nutrition data) are cached per URL
+        cache_key = make_cache_key('page', url)
+        cached, fresh = await acache_get(cache_key, namespace='pages')
+        if fresh:
+            food_data = cached.get('food')
+        else:
+            content = await fetch_page(url)
+            # Parsing is CPU-bound: keep it off the event loop
+            food_data = await sync_to_async(extract_food_from_html, thread_sensitive=False)(content)
+            await acache_set(cache_key, {'food': food_data}, namespace='pages')
         
         # If we couldn't extract enough data, return error
-        if not food_data['name'] or (food_data['calories'] == 0 and food_data['protein'] == 0):
+        if not food_data:
             return Response(
                 {'error': 'Could not extract food information from URL. Please enter manually.'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
         # Create food
-        food = Food.objects.create(**food_data)
+        food, created = await Food.objects.aget_or_create(source_url=url, defaults=food_data)
         
         return Response({
-            'message': 'Food imported successfully',
+            'message': 'Food imported successfully' if created else 'Food already exists in database',
             'food': FoodSerializer(food).data
-        }, status=status.HTTP_201_CREATED)
+        }, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
         
-    except requests.RequestException as e:
+    except httpx.HTTPError as e:
         return Response(
             {'error': f'Failed to fetch URL: {str(e)}'},
             status=status.HTTP_400_BAD_REQUEST
         )
+    except ValueError as e:
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_400_BAD_REQUEST
+        )
     except Exception as e:
         import logging
         logger = logging.getLogger(__name__)
@@ -878,9 +859,8 @@ def import_food_from_url(request):
         )
 
 
-@api_view(['POST'])
-@permission_classes([IsAuthenticated])
-def usda_save_food(request):
+@async_api_view(['POST'], permission_classes=[IsAuthenticated])
+async def usda_save_food(request):
     """Save a USDA food to the database"""
     fdc_id = request.data.get('fdc_id')
     
@@ -892,7 +872,7 @@ def usda_save_food(request):
     
     try:
         # Check if food already exists
-        existing_food = Food.objects.filter(usda_fdc_id=fdc_id).first()
+        existing_food = await Food.objects.filter(usda_fdc_id=fdc_id).afirst()
         if existing_food:
             return Response({
                 'message': 'Food already exists in database',
@@ -906,7 +886,7 @@ def usda_save_food(request):
         
         # Try to get from cache or search results if we have the data
         # For now, always fetch details to ensure we have complete data
-        food_data = importer.get_food_details(fdc_id)
+        food_data = await importer.aget_food_details(fdc_id)
         
         if not food_data:
             return Response(
@@ -915,7 +895,7 @@ def usda_save_food(request):
             )
         
         # Parse food data
-        parsed_data = importer.parse_food_data(food_data)
+        parsed_data = await sync_to_async(importer.parse_food_data, thread_sensitive=False)(food_data)
         if not parsed_data:
             return Response(
                 {'error': 'Failed to parse food data'},
@@ -923,7 +903,7 @@ def usda_save_food(request):
             )
         
         # Create food in database
-        food = Food.objects.create(**parsed_data)
+        food = await Food.objects.acreate(**parsed_data)
         
         return Response({
             'message': 'Food saved successfully',
@@ -945,14 +925,15 @@ def usda_save_food(request):
         )
 
 
-@api_view(['GET'])
-@permission_classes([IsAuthenticated])
-def nutrition_report_pdf(request):
-    """Generate PDF nutrition report for a date range"""
-    from .pdf_generator import generate_nutrition_report
+def _parse_report_range(params):
+    """
+    Parse and validate report start_date/end_date query or body parameters
     
-    start_date_str = request.query_params.get('start_date', None)
-    end_date_str = request.query_params.get('end_date', None)
+    Returns:
+        Tuple of (start_date, end_date, error_response)
+    """
+    start_date_str = params.get('start_date', None)
+    end_date_str = params.get('end_date', None)
     
     # Default to last 7 days if not specified
     if not start_date_str or not end_date_str:
@@ -963,27 +944,39 @@ def nutrition_report_pdf(request):
             start_date = date.fromisoformat(start_date_str)
             end_date = date.fromisoformat(end_date_str)
         except ValueError:
-            return Response(
+            return None, None, Response(
                 {'error': 'Invalid date format. Use YYYY-MM-DD'},
                 status=status.HTTP_400_BAD_REQUEST
             )
     
     # Validate date range
     if start_date > end_date:
-        return Response(
+        return None, None, Response(
             {'error': 'Start date must be before end date'},
             status=status.HTTP_400_BAD_REQUEST
         )
     
     # Limit to 90 days max
     if (end_date - start_date).days > 90:
-        return Response(
+        return None, None, Response(
             {'error': 'Date range cannot exceed 90 days'},
             status=status.HTTP_400_BAD_REQUEST
         )
     
+    return start_date, end_date, None
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def nutrition_report_pdf(request):
+    """Generate PDF nutrition report for a date range (served from the report cache when unchanged)"""
+    start_date, end_date, error_response = _parse_report_range(request.query_params)
+    if error_response:
+        return error_response
+    
     try:
-        return generate_nutrition_report(request.user, start_date, end_date)
+        file_path = get_or_build_report(request.user, start_date, end_date)
+        return serve_pdf_file(request, file_path, f"nutrition_report_{start_date}_{end_date}.pdf")
     except Exception as e:
         import logging
         logger = logging.getLogger(__name__)
@@ -994,6 +987,99 @@ def nutrition_report_pdf(request):
         )
 
 
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated])
+def report_jobs(request):
+    """List report jobs or queue a new background PDF report job"""
+    if request.method == 'GET':
+        expire_stale_jobs(ReportJob.objects.filter(user=request.user))
+        jobs = ReportJob.objects.filter(user=request.user)[:20]
+        return Response(ReportJobSerializer(jobs, many=True).data)
+    
+    start_date, end_date, error_response = _parse_report_range(request.data)
+    if error_response:
+        return error_response
+    
+    job = create_report_job(request.user, start_date, end_date)
+    return Response(ReportJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def report_job_detail(request, job_id):
+    """Get status of a background PDF report job"""
+    try:
+        job = ReportJob.objects.get(id=job_id, user=request.user)
+    except ReportJob.DoesNotExist:
+        return Response({'error': 'Report job not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    if job.status in ('pending', 'running') and expire_stale_jobs(ReportJob.objects.filter(id=job.id)):
+        job.refresh_from_db()
+    
+    data = ReportJobSerializer(job).data
+    if job.status == 'done':
+        data['download_url'] = request.build_absolute_uri(
+            reverse('report-job-download', kwargs={'job_id': job.id})
+        )
+    return Response(data)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def report_job_download(request, job_id):
+    """Download the PDF produced by a finished report job"""
+    try:
+        job = ReportJob.objects.get(id=job_id, user=request.user)
+    except ReportJob.DoesNotExist:
+        return Response({'error': 'Report job not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    if job.status != 'done':
+        return Response(
+            {'error': f'Report is not ready (status: {job.status})'},
+            status=status.HTTP_409_CONFLICT
+        )
+    
+    if not os.path.exists(job.file_path):
+        return Response({'error': 'Report file is no longer available'}, status=status.HTTP_410_GONE)
+    
+    return serve_pdf_file(request, job.file_path, job.filename)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_diary(request, export_format):
+    """
+    Stream the user's full diary (meals, weight, water, fasting) as CSV or NDJSON
+    Optional ?datasets=meals,weight limits the exported record types
+    """
+    if export_format not in ('csv', 'ndjson'):
+        return Response(
+            {'error': 'Unsupported export format. Use csv or ndjson'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    datasets_param = request.query_params.get('datasets', '')
+    datasets = [d.strip() for d in datasets_param.split(',') if d.strip()] or list(EXPORT_DATASETS)
+    unknown = [d for d in datasets if d not in EXPORT_DATASETS]
+    if unknown:
+        return Response(
+            {'error': f"Unknown datasets: {', '.join(unknown)}. Available: {', '.join(EXPORT_DATASETS)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    records = iter_records(request.user, datasets)
+    if export_format == 'csv':
+        lines, content_type = stream_csv(records), 'text/csv; charset=utf-8'
+    else:
+        lines, content_type = stream_ndjson(records), 'application/x-ndjson; charset=utf-8'
+    if isinstance(request._request, ASGIRequest):
+        # A sync iterator would be read to the end before sending under ASGI
+        lines = aiter_lines(lines)
+    response = StreamingHttpResponse(lines, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="food_diary_{date.today()}.{export_format}"'
+    return response
+
+
 class RecipeViewSet(viewsets.ModelViewSet):
     """ViewSet for custom recipes"""
     serializer_class = RecipeSerializer
@@ -1,5 +1,9 @@
 """
 ASGI config for food_diary project.
+
+Serve with an ASGI server (e.g. uvicorn food_diary.asgi:application) so the
+async views that wait on USDA, AI providers and Google do not hold a worker
+thread while they wait.
 """
 
 import os
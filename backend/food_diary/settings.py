@@ -150,3 +150,50 @@ EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'  # For developm
 DEFAULT_FROM_EMAIL = 'noreply@fooddiary.com'
 SERVER_EMAIL = 'noreply@fooddiary.com'
 
+
+# Nutrition PDF reports
+# Generated PDFs are stored on disk and served by the report job endpoints
+REPORTS_DIR = BASE_DIR / 'reports'
+# Number of background threads rendering report jobs per process
+REPORT_WORKERS = int(os.environ.get('REPORT_WORKERS', 2))
+# Jobs still running this many seconds after a worker picked them up are marked failed
+REPORT_JOB_TIMEOUT = int(os.environ.get('REPORT_JOB_TIMEOUT', 600))
+# Finished jobs and their PDF files are deleted after this many days
+REPORT_JOB_RETENTION_DAYS = int(os.environ.get('REPORT_JOB_RETENTION_DAYS', 7))
+# Optional: delegate report downloads to the front web server, e.g.
+# REPORTS_SENDFILE_HEADER = 'X-Accel-Redirect' and REPORTS_SENDFILE_PREFIX = '/protected-reports/'
+REPORTS_SENDFILE_HEADER = os.environ.get('REPORTS_SENDFILE_HEADER') or None
+REPORTS_SENDFILE_PREFIX = os.environ.get('REPORTS_SENDFILE_PREFIX') or None
+
+
+# USDA FoodData Central API response cache, shared by all worker processes
+# 'sqlite' (file at USDA_CACHE_PATH) or 'django' (the Django cache USDA_CACHE_ALIAS)
+USDA_CACHE_BACKEND = os.environ.get('USDA_CACHE_BACKEND', 'sqlite')
+USDA_CACHE_PATH = BASE_DIR / 'cache' / 'usda.sqlite3'
+USDA_CACHE_ALIAS = os.environ.get('USDA_CACHE_ALIAS', 'default')
+# Responses are fresh for USDA_CACHE_TTL seconds, then served only as a
+# fallback when the API fails for another USDA_CACHE_STALE_TTL seconds
+USDA_CACHE_TTL = int(os.environ.get('USDA_CACHE_TTL', 24 * 3600))
+USDA_CACHE_STALE_TTL = int(os.environ.get('USDA_CACHE_STALE_TTL', 7 * 24 * 3600))
+USDA_CACHE_MAX_ENTRIES = int(os.environ.get('USDA_CACHE_MAX_ENTRIES', 10000))
+
+# USDA API client: requests share one pooled keep-alive session per process
+# and a per-process token bucket (the USDA quota is 1000 requests/hour per
+# key, so divide by the number of worker processes)
+USDA_API_BASE_URL = os.environ.get('USDA_API_BASE_URL') or None  # e.g. a local stub server
+USDA_HTTP_POOL_SIZE = int(os.environ.get('USDA_HTTP_POOL_SIZE', 10))
+USDA_RATE_LIMIT_PER_HOUR = float(os.environ.get('USDA_RATE_LIMIT_PER_HOUR', 1000))
+USDA_RATE_LIMIT_BURST = int(os.environ.get('USDA_RATE_LIMIT_BURST', 20))
+# Seconds a call may wait for the rate limiter before answering rate_limit_exceeded
+USDA_RATE_LIMIT_MAX_WAIT = float(os.environ.get('USDA_RATE_LIMIT_MAX_WAIT', 10))
+# Concurrent requests of bulk imports (import_by_fdc_ids, import_popular_foods)
+USDA_FETCH_WORKERS = int(os.environ.get('USDA_FETCH_WORKERS', 4))
+
+# Cache of AI responses for prompts determined by user data (analyze_behavior,
+# generate_meal_plan), kept in the USDA cache backend; AI_CACHE_TTL = 0 disables it
+AI_CACHE_TTL = int(os.environ.get('AI_CACHE_TTL', 12 * 3600))
+
+# Import from URL: pages are read up to URL_IMPORT_MAX_BYTES (extraction
+# results are cached per normalized URL in the USDA cache store)
+URL_IMPORT_MAX_BYTES = int(os.environ.get('URL_IMPORT_MAX_BYTES', 2 * 1024 * 1024))
+URL_IMPORT_TIMEOUT = float(os.environ.get('URL_IMPORT_TIMEOUT', 10))
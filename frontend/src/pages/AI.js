@@ -106,14 +106,49 @@ const AI = () => {
         content: msg.content
       }));
 
-      const response = await api.post('/api/ai/chat/', {
-        message: userMessage,
-        history: history
+      // Stream the answer: show text as soon as the first chunk arrives
+      const apiUrl = process.env.REACT_APP_API_URL || 'http://localhost:8000';
+      const response = await fetch(`${apiUrl}/api/ai/chat/stream/`, {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+          'Authorization': `Bearer ${localStorage.getItem('accessToken')}`,
+        },
+        body: JSON.stringify({ message: userMessage, history: history }),
       });
+      if (!response.ok || !response.body) {
+        throw new Error(`Chat stream failed: ${response.status}`);
+      }
 
-      // Add AI response to chat
-      const aiMessage = { role: 'assistant', content: response.data.response };
-      setChatMessages(prev => [...prev, aiMessage]);
+      // Add an empty AI message and append chunks to it
+      setChatMessages(prev => [...prev, { role: 'assistant', content: '' }]);
+      const appendChunk = (text) => setChatMessages(prev => {
+        const last = prev[prev.length - 1];
+        return [...prev.slice(0, -1), { ...last, content: last.content + text }];
+      });
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        // Server-sent events are separated by a blank line
+        const events = buffer.split('\n\n');
+        buffer = events.pop();
+        events.forEach((event) => {
+          if (event.startsWith('event: error')) {
+            // The answer broke off part way: say so after the text received
+            const data = event.split('\n').find(line => line.startsWith('data: '));
+            if (data) appendChunk(`\n\n${JSON.parse(data.slice(6)).error}`);
+            return;
+          }
+          if (event.startsWith('event:')) return; // "done" event
+          const data = event.replace(/^data: /, '');
+          if (data) appendChunk(JSON.parse(data).delta || '');
+        });
+      }
     } catch (err) {
       console.error('Chat error:', err);
       const errorMessage = { role: 'assistant', content: 'Извините, произошла ошибка. Попробуйте позже.' };